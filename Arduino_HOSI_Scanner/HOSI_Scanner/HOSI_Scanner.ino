@@ -11,6 +11,11 @@ _________________________HOSI Arduino Firmware_____________________________
  manual integration time: send "t" followed by microsecond number
  radiance measurement: send "r" and it will take a radiance measurement
  shutter control: send "open" to open shutter, "close" to close shutter, "shutter" to report status
+ terminated commands: send "newline" and the reply is "newline:1"; from then on every command must end with a newline
+ and is acted on as soon as it arrives, instead of after the 1 s Serial.readString timeout
+ (no command starts with "n", so older firmware ignores the request)
+ binary frames: send "bin" (reply "bin:1") to get each measurement as a binary frame instead of a CSV line,
+ "ascii" (reply "bin:0") to switch back; the frame layout is described in hosi/frames.py
  hyperspectral measurement: send "h" followed by comma-delineated values as follows:
  panLeft,panRight,panResolution,tiltBottom,tiltTop,tiltResolution,maxIntegrationTime(microseconds),boxcar,darkRepeatTimer(milliseconds)
  e.g.: "h-200,200,10,400,600,10,2000000,2,120000"
@@ -74,6 +79,14 @@ long darkRepeat = 30000;// repeat dark measurement every few seconds/minutes
 // Add stop flag for interrupting operations
 bool stopRequested = false;
 
+// Newline-terminated commands (enabled by the "newline" command), read without waiting for the stream timeout
+bool termMode = false;
+#define TERM_TIMEOUT 50 // ms to wait for the rest of a command line
+
+// Binary spectrum frames instead of CSV lines (enabled by the "bin" command, "ascii" switches back)
+bool binMode = false;
+uint16_t frameCRC;
+
 AccelStepper stepper_pan(4, PAN_IN1, PAN_IN3, PAN_IN2, PAN_IN4); // 8=HALF4WIRE, then input pin 1, 2, 3, 4
 AccelStepper stepper_tilt(4, ROLL_IN1, ROLL_IN3, ROLL_IN2, ROLL_IN4); // 8=HALF4WIRE, then input pin 1, 2, 3, 4
 
@@ -188,6 +201,45 @@ void switchDim(){
     dataLoc = 0;
 }
 
+// write one byte of a binary frame, updating the CRC-16/CCITT-FALSE
+void frameByte(uint8_t b){
+  Serial.write(b);
+  frameCRC ^= (uint16_t)b << 8;
+  for(int k = 0; k < 8; k++)
+    frameCRC = (frameCRC & 0x8000) ? (frameCRC << 1) ^ 0x1021 : frameCRC << 1;
+}
+
+void frameValue(uint32_t v, int bytes){ // little-endian
+  for(int k = 0; k < bytes; k++)
+    frameByte((v >> (8*k)) & 0xFF);
+}
+
+// binary version of the measurement line: sync, header, boxcar sums, CRC (layout in hosi/frames.py)
+void sendFrame(){
+  int nVals = (nSites + boxcar - 1) / boxcar;
+  int width = (boxcar * 1023L > 65535) ? 4 : 2; // uint32 counts only if the sums can overflow uint16
+  Serial.write(0xA5);
+  Serial.write(0x5A);
+  frameCRC = 0xFFFF;
+  frameValue(width == 4 ? 1 : 0, 1);
+  frameValue((uint32_t)panVal, 4);
+  frameValue((uint32_t)tiltVal, 4);
+  frameValue(darkLight, 1);
+  frameValue(prevIntTime, 4);
+  frameValue(prevSatN, 2);
+  frameValue(nVals, 2);
+  for (int i = 0; i < nSites; i+=boxcar){
+    uint32_t tSum = 0;
+    for(int j = 0; j < boxcar; j++)
+      if(i+j < nSites)
+        tSum += data[i+j][dataLoc];
+    frameValue(tSum, width);
+  }
+  uint16_t crc = frameCRC;
+  Serial.write(crc & 0xFF);
+  Serial.write(crc >> 8);
+}
+
 void radianceMeasure(){
 
   // reset all data
@@ -232,16 +284,20 @@ void radianceMeasure(){
     prevIntTime = intTime;
   }
  
-  Serial.print(String(panVal) + "," + String(tiltVal) + "," + String(darkLight) + "," + String(prevIntTime) + "," + String(prevSatN) );
-
-  for (int i = 0; i < nSites; i+=boxcar){
-    int tSum = 0;
-    for(int j = 0; j < boxcar; j++)
-      if(i+j <= nSites)
-          tSum += data[i+j][dataLoc];
-    Serial.print("," + String(tSum));
+  if(binMode){
+    sendFrame();
+  } else {
+    Serial.print(String(panVal) + "," + String(tiltVal) + "," + String(darkLight) + "," + String(prevIntTime) + "," + String(prevSatN) );
+
+    for (int i = 0; i < nSites; i+=boxcar){
+      int tSum = 0;
+      for(int j = 0; j < boxcar; j++)
+        if(i+j < nSites)
+            tSum += data[i+j][dataLoc];
+      Serial.print("," + String(tSum));
+    }
+    Serial.print("\n");
   }
-  Serial.print("\n");
   delay(1);
  
 }
@@ -327,10 +383,22 @@ void startMeasure(){
 }
 
 
+// read one command: a whole line in terminated mode, otherwise everything until the 1 s stream timeout
+String readCommand(){
+  String cmd;
+  if(termMode)
+    cmd = Serial.readStringUntil('\n');
+  else
+    cmd = Serial.readString();
+  cmd.trim();
+  return cmd;
+}
+
 void loop() {
 
-  
-  String arg = Serial.readString();
+  String arg;
+  if(Serial.available())
+    arg = readCommand();
 
   if (arg != NULL){
 
@@ -352,8 +420,22 @@ void loop() {
       return;
     }
 
+    // switch to newline-terminated commands
+    if(arg == "newline"){
+      termMode = true;
+      Serial.setTimeout(TERM_TIMEOUT);
+      Serial.println("newline:1");
+
+    // binary spectrum frames
+    } else if(arg == "bin"){
+      binMode = true;
+      Serial.println("bin:1");
+    } else if(arg == "ascii"){
+      binMode = false;
+      Serial.println("bin:0");
+
     // manually set integration time
-    if(arg.startsWith("t") == true){
+    } else if(arg.startsWith("t") == true){
       arg.replace("t", "");
       manIntTime = (long) arg.toFloat();
       if(manIntTime > maxIntTime)
@@ -451,7 +533,7 @@ void loop() {
         
         // Check for stop command during scanning
         if(Serial.available()) {
-          String stopCmd = Serial.readString();
+          String stopCmd = readCommand();
           if(stopCmd == "stop") {
             stopRequested = true;
             break;
@@ -488,7 +570,7 @@ void loop() {
             
             // Check for stop command during panning
             if(Serial.available()) {
-              String stopCmd = Serial.readString();
+              String stopCmd = readCommand();
               if(stopCmd == "stop") {
                 stopRequested = true;
                 break;
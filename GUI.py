@@ -10,6 +10,23 @@ import string, time, os, sys, math
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 
+from hosi.engine import previewPlanes
+from hosi.serialio import SerialReader
+from hosi.scanfile import iterRawLines, readLeValues
+from hosi.archive import loadArchive
+from hosi.journal import ScanJournal, resumePoint, RESUME_MARKER
+from hosi.simulator import SimulatedScanner
+from hosi.commands import CommandChannel, TERM_COMMAND, TERM_REPLY
+from hosi.frames import BIN_COMMAND, BIN_REPLY
+from hosi.seriallog import SerialLog, logPath
+from hosi.capture import CaptureSerial, ReplaySerial, capturePath
+from hosi.scan import ScanProcessor, scanCommand, scanPath, degreesToSteps
+from hosi.calibration import CalibrationStore
+from hosi.receptors import exportReceptors
+from hosi.preview import PreviewRenderer
+from hosi.scheduler import RenderScheduler
+from hosi.specview import SpectrumView
+
 # Suppress Tk deprecation warning on macOS
 if sys.platform == 'darwin':
     os.environ['TK_SILENCE_DEPRECATION'] = '1'
@@ -109,32 +126,11 @@ plt.rcParams.update(matplotlib_style)
 
 np.set_printoptions(suppress=False, precision=3, threshold=sys.maxsize, linewidth=sys.maxsize)
 
-cieWav = []
-chlA = []
-chlB = []
-nIR = []
-cieX = []
-cieY = []
-cieZ = []
-nUV = []
-
-
-pixels = int(288)
 baseInt = int(550) # specifies the minimum hardware integration time in microseconds. 
-wavCoef = []
-radSens = []
-linCoefs = []
-wavelength = []
-wavelengthBins = []
 wavelengthBoxcar = []
 unitNumber = int(0)
-cieXt = [0.0] * pixels
-cieYt = [0.0] * pixels
-cieZt = [0.0] * pixels
-chlAt = [0.0] * pixels
-chlBt = [0.0] * pixels
-nIRt = [0.0] * pixels
-nUVt = [0.0] * pixels
+calStore = CalibrationStore() # calibration_data.txt & sensitivity_data.csv, compiled to ./.hosi_cache
+engine = None # RadianceEngine for the current unit & boxcar, built by unitSetup()
 saveLabel = StringVar()
 dataString = ""
 output = ""
@@ -143,12 +139,33 @@ visSystems = []
 receptorNames = []
 receptorVals = []
 baudrate = 115200
+serialReader = None # acquisition thread, runs while scanning
+readerQueueLines = 4096 # bound on lines buffered between the reader thread and the GUI
+pumpInterval = 20 # ms between queue drains on the Tk thread
+pumpBatch = 500 # max lines processed per drain
+pumpBudget = 0.05 # max seconds spent per drain before yielding to Tk
+commands = CommandChannel(lambda cmd: safeSerialWrite(cmd)) # jog commands, completed by the tilt:/pan: replies
+commandTimeout = 15 # seconds for a move to report back before it is given up
+commandTimer = None # pending root.after id of commandPump
+commandTerminator = "" # "\n" once the scanner has agreed to newline-terminated commands
+termNegotiateDelay = 2500 # ms after opening the port (the Arduino resets) before asking for them
+binaryFrames = 0 # 1: also ask for binary spectrum frames (hosi.frames), decoded by the serial reader
+
+# Serial logging: commands, replies and spectrum summaries are printed (INFO); recent traffic is also kept
+# in a ring buffer (dumped to ./logs on serial errors). HOSI_SERIAL_LOG=DEBUG prints full spectra, WARNING
+# only errors; HOSI_SERIAL_LOG_FILE=path also logs everything to a file
+serialLog = SerialLog().configure(os.environ.get("HOSI_SERIAL_LOG", "INFO"), os.environ.get("HOSI_SERIAL_LOG_FILE"))
+serialLogDump = None # path of the ring buffer dump for the current reader's error
 
-# Add serial logging
 def logSerial(message, direction="OUT"):
     """Log serial communication for debugging"""
-    timestamp = time.strftime("%H:%M:%S")
-    print(f"[{timestamp}] {direction}: {message}")
+    serialLog.log(message, direction)
+
+def dumpSerialLog(reason):
+    serialLog.error(reason)
+    path = serialLog.dump(logPath())
+    print("Recent serial traffic written to " + path)
+    return path
 
 def safeSerialWrite(data):
     """Safely write to serial with logging and error handling"""
@@ -157,28 +174,13 @@ def safeSerialWrite(data):
         return False
     try:
         logSerial(data, "OUT")
-        ser.write(str.encode(data))
+        ser.write(str.encode(data + commandTerminator))
         return True
     except Exception as e:
         print(f"ERROR writing to serial: {e}")
+        dumpSerialLog(f"write failed: {e}")
         return False
 
-def safeSerialRead():
-    """Safely read from serial with logging and error handling"""
-    if ser is None:
-        print("ERROR: Serial connection not available")
-        return None
-    try:
-        data = ser.readline()
-        if data:
-            decoded = data.decode('utf-8', 'replace').strip()
-            logSerial(decoded, "IN")
-            return decoded
-        return None
-    except Exception as e:
-        print(f"ERROR reading from serial: {e}")
-        return None
-
 def scanSerialPorts():
     """Scan for available serial ports and update the dropdown"""
     global availablePorts
@@ -191,6 +193,10 @@ def scanSerialPorts():
     else:
         ports = serial.tools.list_ports.comports()
         availablePorts = [p.device for p in ports]
+    if os.environ.get("HOSI_SIMULATOR"): # e.g. HOSI_SIMULATOR="sim://?speed=10" for a simulated scanner
+        availablePorts.append(os.environ["HOSI_SIMULATOR"] if os.environ["HOSI_SIMULATOR"].startswith("sim://") else "sim://")
+    if os.environ.get("HOSI_REPLAY"): # e.g. HOSI_REPLAY="replay://captures/field.hcap?speed=4" to replay a capture
+        availablePorts.append(os.environ["HOSI_REPLAY"] if os.environ["HOSI_REPLAY"].startswith("replay://") else "replay://" + os.environ["HOSI_REPLAY"])
     
     # Update the dropdown
     serialPortVar.set('')  # Clear current selection
@@ -218,7 +224,11 @@ def connectSerial():
         if ser and serialConnected:
             disconnectSerial()
         
-        if platform == 'and':
+        if selectedPort.startswith("sim://"):
+            ser = SimulatedScanner.fromUrl(selectedPort, timeout=1)
+        elif selectedPort.startswith("replay://"):
+            ser = ReplaySerial.fromUrl(selectedPort, timeout=1)
+        elif platform == 'and':
             deviceName = usb.get_usb_device(selectedPort)
             while not usb.has_usb_permission(deviceName):
                 usb.request_usb_permission(deviceName)
@@ -227,6 +237,10 @@ def connectSerial():
         else:
             ser = serial.Serial(selectedPort, baudrate, timeout=1)
         
+        if os.environ.get("HOSI_CAPTURE") and not selectedPort.startswith("replay://"): # folder to record the raw serial stream in
+            os.makedirs(os.environ["HOSI_CAPTURE"], exist_ok=True)
+            ser = CaptureSerial(ser, capturePath(os.environ["HOSI_CAPTURE"]))
+            print("Capturing serial stream to " + ser.path)
         serialName = selectedPort
         serialConnected = True
         updateStatus(f"Connected to {selectedPort}")
@@ -241,6 +255,9 @@ def connectSerial():
         btStart.config(state="normal")
         
         print(f"Successfully connected to {selectedPort}")
+
+        if not selectedPort.startswith("replay://"): # (writing would start the replay)
+            root.after(0 if selectedPort.startswith("sim://") else termNegotiateDelay, negotiateTerm)
         
     except Exception as e:
         updateStatus(f"Connection failed: {str(e)}")
@@ -248,10 +265,41 @@ def connectSerial():
         ser = None
         serialConnected = False
 
+def negotiateTerm():
+    """Switch the scanner to newline-terminated commands (and binary frames if binaryFrames is 1) if its firmware supports them"""
+    global commandTerminator
+    commandTerminator = ""
+    commands.maxInFlight = 1
+    if ser is None or scanningFlag == 1:
+        return
+    if serialReader is None:
+        startCommandReader()
+    future = commands.send(TERM_COMMAND.rstrip("\n"), TERM_REPLY, 5) # older firmware doesn't reply: a timeout
+    def binDone(future):
+        if future.exception() is None and future.result() == "bin:1":
+            print("Scanner sends binary spectrum frames")
+        else:
+            print("Scanner firmware without binary frames, spectra are sent as text")
+    def done(future):
+        global commandTerminator
+        if future.exception() is None and future.result() == TERM_REPLY + "1":
+            commandTerminator = "\n"
+            commands.maxInFlight = 2 # commands are read line by line, so a tilt+pan pair can be sent together
+            print("Scanner uses newline-terminated commands")
+            if binaryFrames == 1:
+                commands.send(BIN_COMMAND, BIN_REPLY, 5).add_done_callback(binDone)
+        else:
+            print("Scanner firmware without terminated commands, each command takes ~1 s to be read")
+    future.add_done_callback(done)
+    commandPump()
+
 def disconnectSerial():
     """Disconnect from the current serial port"""
-    global ser, serialConnected
+    global ser, serialConnected, commandTerminator
     
+    commands.cancelAll("Disconnected")
+    stopReader()
+    commandTerminator = ""
     if ser:
         try:
             ser.close()
@@ -287,134 +335,31 @@ except:
 	
 print(ser)
 
-def readLine(ta):
-	ta.pop(0)
-	ta.pop(0)
-	ta = list(filter(None, ta))
-	ta = [float(i) for i in ta]
-	#print(ta)
-	return ta
-	
-
-
 def unitSetup():
-	global unitNumber, wavCoef, radSens, linCoefs, wavelength, wavelengthBins, wavelengthBoxcar, cieXt, cieYt, cieZt, chlAt, chlBt, nIRt, nUVt, cieWav, chlA, chlB, nIR, cieX, cieY, cieZ, nUV, receptorNames, receptorVals
+	global engine, unitNumber, wavelengthBoxcar, receptorNames, receptorVals
 
+	cal = calStore.unit(unitNumber) # parsed once, switching units or boxcar sizes is a cache lookup
+	receptorNames, receptorVals = calStore.receptors()
+	for problem in calStore.problems.get("sensitivity", []):
+		print("sensitivity_data.csv: " + problem)
 
-	if(len(wavCoef) != pixels or len(radSens) != pixels): # only load values from file the first time the code runs (to work out unit number)
-		for line in open("./calibration_data.txt"):
-			row = line.split(',')
-			#print(row)
-			try:
-				int(row[0])
-			except:
-				print(" ")
-			else:
-				if(int(row[0]) == unitNumber):
-##					print(row)
-					if(row[1] == "wavCoef"):
-						wavCoef = row
-						wavCoef.pop(0)
-						wavCoef.pop(0)
-						wavCoef = list(filter(None, wavCoef))
-						wavCoef.pop(len(wavCoef)-1)
-##						print("waveCoef: " + str(len(wavCoef)))
-						wavCoef = [float(i) for i in wavCoef]
-					if(row[1] == "radSens"):
-						radSens = row
-						radSens.pop(0)
-						radSens.pop(0)
-						radSens = list(filter(None, radSens))
-						radSens.pop(len(radSens)-1)
-##						print("radSens: " + str(len(radSens)))
-						radSens = [float(i) for i in radSens]
-##						print(radSens)
-					if(row[1] == "linCoefs"):
-						linCoefs = row
-						linCoefs.pop(0)
-						linCoefs.pop(0)
-						linCoefs = list(filter(None, linCoefs))
-						linCoefs.pop(len(linCoefs)-1)
-##						print("linCoefs: " + str(len(linCoefs)))
-						linCoefs = [float(i) for i in linCoefs]
-						
-		for line2 in open("./sensitivity_data.csv"):
-			row = line2.split(',')
-			# ~ print(row)
-			if(row[0] == "base"):
-				if(row[1] == "cieWav"):
-					cieWav = row
-					cieWav.pop(0)
-					cieWav.pop(0)
-					cieWav = list(filter(None, cieWav))
-					cieWav = [int(i) for i in cieWav]
-	##				print(cieWav)
-				elif(row[1] == "chlA"):
-					chlA = readLine(row)
-				elif(row[1] == "chlB"):
-					chlB = readLine(row)
-				elif(row[1] == "nIR"):
-					nIR = readLine(row)
-				elif(row[1] == "cieX"):
-					cieX = readLine(row)
-				elif(row[1] == "cieY"):
-					cieY = readLine(row)
-				elif(row[1] == "cieZ"):
-					cieZ = readLine(row)
-				elif(row[1] == "nUV"):
-					nUV = readLine(row)
-			else:
-					receptorNames.append(row[0] +"_" + row[1])
-					floatVals = row[2:]
-					floatVals = [float(value) for value in floatVals if value.replace('.', '', 1).isdigit()]
-					receptorVals.append(floatVals)
-
-	
 	# COMMENTED OUT WITH RECEPTOR FUNCTIONALITY
 	# receptorListbox.delete(0, "end")  # Clear current listbox
 	# for item in receptorNames:  # Insert new options
 	# 	# ~ print(item)
 	# 	receptorListbox.insert("end", item)
 
-
-	
-	if(len(wavCoef) != 6 or len(radSens) != pixels or len(linCoefs) != 2):
+	if(cal is None):
 		#settingsLabel.config(text="error - calibration data not found\nEnsure calibration_data.txtis present\nand has data for unit #" + str(unitNumber))
-		#return
 		updateStatus("Missing calibration data")
 		print("error - calibration data not found\nEnsure calibration_data.txt is present\nand has data for unit #" + str(unitNumber))
-		print("waveCoef: " + str(len(wavCoef)))
-		print("radSens: " + str(len(radSens)))
-		print("linCoefs: " + str(len(linCoefs)))
-
-
-	wavelength = []
-	for i in range(0,pixels):
-		wavelength.append(wavCoef[0]+wavCoef[1]*i+wavCoef[2]*i**2+wavCoef[3]*i**3+wavCoef[4]*i**4+wavCoef[5]*i**5)
-
-	#---set up wavelength bin widths array-------
-	wavelengthBins = []
-	for i in range(0,pixels-1):
-		wavelengthBins.append(wavelength[i+1]-wavelength[i])
-	wavelengthBins.append(wavelength[pixels-1]-wavelength[pixels-2])
-
-	# creare array of wavelengths matching boxcar scale for plotting
-	wavelengthBoxcar = []
-	for i in range(0, pixels, boxcarN): #increment in boxcar size
-		wavelengthBoxcar.append(wavCoef[0]+wavCoef[1]*i+wavCoef[2]*i**2+wavCoef[3]*i**3+wavCoef[4]*i**4+wavCoef[5]*i**5)
-
+		for problem in calStore.problems.get(str(unitNumber), []):
+			print(problem)
+		engine = None
+		return
 
-	#------resample spectral sensitivities at spectrometer wavelengths---------
-	for i in range(0,pixels):
-		for j in range(0, len(cieWav)):
-			if(round(wavelength[i]) == cieWav[j]):
-				cieXt[i] = cieX[j]
-				cieYt[i] = cieY[j]            
-				cieZt[i] = cieZ[j]
-				chlAt[i] = chlA[j]
-				chlBt[i] = chlB[j]            
-				nIRt[i] = nIR[j]
-				nUVt[i] = nUV[j]
+	wavelengthBoxcar = cal.wavelengthBoxcar(boxcarN) # wavelengths matching boxcar scale for plotting
+	engine = calStore.engine(unitNumber, boxcarN, baseInt)
 
 
 panFrom = StringVar()
@@ -438,14 +383,15 @@ tiltResolution.set("30")  # Degrees between positions
 maxIntTime.set("2000") # max int time microseconds
 boxcarVal.set("2")
 darkRepVal.set("120")
-tt = time.time()
 reflVal.set("99")
 specOutVal.set("")
 
 reflFlag = 0
 
-darkTimes = []
-darkVals = []
+darkPersist = 1 # keep the dark library of each unit/boxcar in darkFolder between scans
+darkFolder = "./darks"
+darkInterp = 1 # interpolate darks between the dark sets before and after each light frame (by frame count, see hosi.darks.DarkModel)
+scan = ScanProcessor(calStore, darkInterp == 1) # stream processing of the scan being received or loaded, mirrored into the globals below
 
 ## RGB image
 imLum = []
@@ -453,6 +399,14 @@ imR = []
 imG = []
 imB = []
 imCol = []
+previewRenderer = PreviewRenderer() # keeps the uint8 preview between redraws
+renderInterval = 50 # ms between redraws when idle
+scanRenderInterval = 1000 # ms between redraws while scanning, so drawing doesn't compete with acquisition
+renderScheduler = RenderScheduler(root.after, renderInterval) # all redraws go through this, see the handlers registered at the end
+statusText = None # progress text waiting for the next frame
+hoverPos = None # latest pointer position over the preview in hover mode
+hoverPixel = None # pixel whose spectrum hover mode is showing
+hoverTrail = 5 # spectra of the last pixels hovered over, drawn fading out (0 for none)
 maxRGB = 1E-10
 imSatR = []
 imSatB = []
@@ -474,6 +428,9 @@ imNDVI = []
 hspec = []
 hspecPan = []
 hspecTilt = []
+archiveOutput = 1 # also save each scan as a binary .npz archive next to the CSV
+journal = None # on-disk copy of the raw stream of the current scan
+journalSyncInterval = 5.0 # seconds between fsyncs of the journal
 
 
 
@@ -490,8 +447,8 @@ scanningFlag = int(0)
 stopFlag = int(0)
 fileImportFlag = int(0);
 loadPath = ""
-loadLine = 0
-lines = ("")
+loadLines = None # line generator while a saved scan is being loaded
+loadRedrawLines = 2000 # redraw the preview every n lines while loading (0 = only at the end)
 ct = '' # savepath
 
 
@@ -511,56 +468,29 @@ wbGG = 1.0
 wbU = 1.0
 
 def updateStatus(ts):
+    global statusText
+    statusText = None # a queued progress update must not overwrite this
     statusLabel.config(text=ts)
 
-def plotGraph(status):
+def queueStatus(ts):
+	"""Show progress text with the next frame, rather than on every measurement"""
+	global statusText
+	statusText = ts
+	renderScheduler.markDirty("status")
+
+def drawStatus():
+	if statusText is not None:
+		statusLabel.config(text=statusText)
+
+def plotGraph(status=""):
 	global plotImX, plotImY, wbR, wbG, wbB, wbI, wbGG, wbU
 ##        print("plotting")
 	# normalise to max=1 and non-linearise with power function
 	if len(imR) > 0:
 		
-		br = 100/brightnessScale.get()
-		if preview <= 2:
-                        ## avoid raising negative numbers to power (numpy doesn't like it)
-			nImR = np.sign(imR) * ((np.abs(imR * wbR)/maxRGB)**0.42) * 255 * br
-			nImG = np.sign(imG) * ((np.abs(imG * wbG)/maxRGB)**0.42) * 255 * br
-			nImB = np.sign(imB) * ((np.abs(imB * wbB)/maxRGB)**0.42) * 255 * br
-			
-			nImR = np.clip(nImR, 0, 255)
-			nImG = np.clip(nImG, 0, 255)
-			nImB = np.clip(nImB, 0, 255)
-
-			if preview <= 1: ## RGB images
-				imCol = np.dstack((nImR, nImG, nImB))
-			else: ## saturation image
-
-				nImR = nImG ## where saturated turn red, otherwise grey (match green)
-				nImB = nImG - imSatR ## where saturated turn red
-				nImG = nImG - imSatR ## where saturated turn red
-				nImB = np.clip(nImB, 0, 255)
-				nImB = nImB + (imSatB * 5) ## add blue to show degere of saturation across wavelengths, so magenta will be fully saturated
-				nImR = np.clip(nImR, 0, 255)
-				nImG = np.clip(nImG, 0, 255)
-				nImB = np.clip(nImB, 0, 255)
-				imCol = np.dstack((nImR, nImG, nImB))
-
-		if preview == 3:  ## IGU (extreme spectral range image)
-			nImI = np.sign(imI) * ((np.abs(imI * wbI)/maxIGU)**0.42) * 255 * br
-			nImGG = np.sign(imGG) * ((np.abs(imGG * wbGG)/maxIGU)**0.42) * 255 * br
-			nImU = np.sign(imU) * ((np.abs(imU * wbU)/maxIGU)**0.42) * 255 * br
-						
-			nImI = np.clip(nImI, 0, 255)
-			nImGG = np.clip(nImGG, 0, 255)
-			nImU = np.clip(nImU, 0, 255)
-
-			imCol = np.dstack((nImI, nImGG, nImU))
-
-		if preview == 4:  ## NDVI
-			nImB = imChlB * 255
-			nImR = ((255-nImB)*2)* imChlA
-			nImG = ((255-nImB)*2)* (1-imChlA)
-
-			imCol = np.dstack((nImR, nImG, nImB))
+		## tone-mapped uint8 image, re-mapping only the pixels changed since the last frame where possible
+		planes = {"imR": imR, "imG": imG, "imB": imB, "imSatR": imSatR, "imSatB": imSatB, "imI": imI, "imGG": imGG, "imU": imU, "imChlA": imChlA, "imChlB": imChlB}
+		tImCol = previewRenderer.render(preview, planes, maxRGB, maxIGU, (wbR, wbG, wbB, wbI, wbGG, wbU), brightnessScale.get())
 
 		# width: plot_frame.bbox(plot)[2] height: plot_frame.bbox(plot)[3]
 		
@@ -574,13 +504,15 @@ def plotGraph(status):
 		if(plotSize < 50):
 			plotSize = 50 ## set min plot size to avoid drawing errors
 			
-		tImCol = imCol.astype(np.uint8)
 		plotIm = Image.fromarray(tImCol, "RGB")
 ##		plotImt = ImageOps.contain(plotIm, (plotSize,plotSize), method=0)
 		plotImt = ImageOps.contain(plotIm, (plotImX,plotImY), method=0)
-		plotImResized = ImageTk.PhotoImage(plotImt)
-		plot.config(image=plotImResized)
-		plot.image = plotImResized
+		if getattr(plot, "image", None) is not None and (plot.image.width(), plot.image.height()) == plotImt.size:
+			plot.image.paste(plotImt) # same size: update the existing Tk image in place
+		else:
+			plotImResized = ImageTk.PhotoImage(plotImt)
+			plot.config(image=plotImResized)
+			plot.image = plotImResized
 
 		#statusLabel.config(text=status)
 	   # print(root.bbox(0, 1))
@@ -588,21 +520,24 @@ def plotGraph(status):
 	else:
 		
 		if(serialName == 0):
-			statusLabel.config(text="Disconnected")
+			updateStatus("Disconnected")
 			btStart["state"] = "disabled"
 ##		else:
 ##			statusLabel.config(text="Ready")
 		
 	
 def updatePlotRes(event):
+        if event.widget in (root, plot_frame): # <Configure> arrives for every widget in the window
+                renderScheduler.markDirty("resize")
+                renderScheduler.markDirty("preview")
+
+def resizePlot():
         global plotImX, plotImY
         plotImX = plot_frame.bbox(plot)[2]
         plotImY = plot_frame.bbox(plot)[3]
-        plotGraph("Ready")
 
 def getSpec():
-	global tt, unitNumber, imLum, imR, imG, imB, imCol, imSatR, imSatB, panStart, panStop, pan_Res, panDim, tiltDim, tiltStart, tiltStop, tilt_Res, tiltRes, scanningFlag, dataString, boxcarN, maxRGB, output, focusPos
-	global imI, imU, imGG, imChlA, imChlB, imNDVI, maxIGU, hspec, hspecPan, hspecTilt, fileImportFlag, loadPath, loadLine, lines, selX, selY, wavelengthBoxcar, stopFlag, ct
+	global scanningFlag, boxcarN, maxRGB, maxIGU, journal
 	if(scanningFlag == 0 and fileImportFlag == 0): # start scanning
 		# Validate and convert degree inputs to steps
 		pan_left_deg = panLeft.get()
@@ -632,334 +567,201 @@ def getSpec():
 		pan_res_steps = degreesToSteps(pan_res_deg)
 		tilt_res_steps = degreesToSteps(tilt_res_deg)
 		
-		# note addition of 000 to convert max int to microseconds
-		ts = "h" + str(pan_left_steps) + "," + str(pan_right_steps) + "," + str(pan_res_steps) + "," + str(tilt_bot_steps) + "," + str(tilt_top_steps) + "," + str(tilt_res_steps) + "," + str(maxInt.get()) + "000," + str(boxcar.get()) + "," + str(darkRep.get()) + "000," # note addition of three zeros for darkRep as it's expecing milliseconds
+		ts = scanCommand(pan_left_steps, pan_right_steps, pan_res_steps, tilt_bot_steps, tilt_top_steps, tilt_res_steps, maxInt.get(), boxcar.get(), darkRep.get())
 		#print(ts)
 		if(pan_right_steps > pan_left_steps and tilt_top_steps > tilt_bot_steps): # check pan & tilt coords make sense
 			boxcarN = int(boxcar.get())
 			#updateStatus(ts)
-			statusLabel.config(text="Starting")
+			updateStatus("Starting")
+			journal = ScanJournal(scanPath(saveLabel.get()) + ".journal", journalSyncInterval)
+			liveScan()
 			safeSerialWrite( ts )
 			#btStart["state"] = "disabled"
 			btLoad["state"] = "disabled"
 			btStart["text"] = "Stop"
 			print("starting")
 			scanningFlag = 1
-			tt = time.time()
 			maxRGB = 1E-10
 			maxIGU = 1E-10
 		else:
-			statusLabel.config(text="Invalid pan/tilt")
+			updateStatus("Invalid pan/tilt")
 			return
 
-##	specLength = math.ceil(pixels/int(boxcar.get()))
-		
-	serFlag = 0
-
-	if(fileImportFlag == 1 and loadLine == 0):
-##		print("loading spec")
-		f=open(loadPath)
-		lines=f.readlines()
-
-	while (serFlag == 0 or fileImportFlag == 1):
-		if(stopFlag == 1):
-			output = "x"
-			dataString += output
-			# Set serFlag to 1 to exit the loop when stopping
-			serFlag = 1
-		else:
-			if(fileImportFlag == 0):
-				output = safeSerialRead()
-				if output:
-					dataString += output + "\n"
-				else:
-					output = "0"
-					print(f"No data received from serial (got: {output})")
-			else:
-				output = lines[loadLine]
-	##			print(output)
-	##			print(loadLine)
-				loadLine +=1
-			
-			### load file & read first line
-
-		if(output.startswith('x')):
-##			print("a")
-			if stopFlag == 1:
-				statusLabel.config(text="Stopped")
-			else:
-				statusLabel.config(text="Done")
-			## loop to add hspec le values
-			hspec = np.nan_to_num(hspec)# convert NaNs to zeros
-			if(fileImportFlag == 0):
-##				print("b")
-				dataString2 = "le values\npan,tilt,wavelength\n,"
-				for i in range(0, len(wavelengthBoxcar)):
-					dataString2 += "," + str(int(wavelengthBoxcar[i]))
-##				print("c") ## FAILS after this point... WHY!?
-##				dataString2 += str(hspec)
-				for i in range(0, len(hspecTilt)):
-					for j in range(0, len(hspecPan)):
-						dataString2 += '\n' + str(hspecPan[j]) + ',' + str(hspecTilt[i]) + ','
-						dataString3 = str(hspec[i, j])
-##						dataString3 = dataString3.replace('\n', ',')
-						dataString3 = dataString3.replace(' ', ',')
-						dataString3 = dataString3.replace('[', '')
-						dataString3 = dataString3.replace(']', '')
-						dataString3 = dataString3.replace('0.000e+00', '0')
-
-						dataString2 += dataString3
-
-##			print("d")
-			#-------save output file--------
-			if(fileImportFlag == 0 and stopFlag == 0):  # Only save if not stopped early
-				ts = saveLabel.get()
-				t = time.localtime()
-				ct = "./scans/" + str(t.tm_year) + "-" + str(t.tm_mon) + "-" + str(t.tm_mday) + "_" + time.strftime("%H-%M-%S", t) + "_" + ts
-				ctt = ct + ".csv"
-##				print("e")
-				file_object = open(ctt, 'a')
-				file_object.write(dataString)
-				file_object.write(dataString2)
-				file_object.close()
-##				print("f")
-				statusLabel.config(text="Ready")
-				plotGraph("")
-				ctf = ct + "_sRGB.png"
-	##            plt.imsave(ctf, imCol)
-
-				#save image
-				nImR = ((imR/maxRGB)**0.42) * 255
-				nImG = ((imG/maxRGB)**0.42) * 255
-				nImB = ((imB/maxRGB)**0.42) * 255
-				imCol = np.dstack((nImR, nImG, nImB))
-				
-				tImCol = imCol.astype(np.uint8)
-				img = Image.fromarray(tImCol, "RGB")
-				#img.show()
-				img.save(ctf)
-##				print("g")
-			
-			dataString = ""
-			scanningFlag = 0
-			btStart["text"] = "Start"
-			btStart["state"] = "active"
-			btLoad["state"] = "active"
-			focusPos = 0 # reset focus position in case it was previously up
-			#statusLabel.config(text="Ready")
-			serFlag = 1
-			#fileImportFlag = 0
-			loadLine = 0
-			selX = -1
-			selY = -1 # reset these values to clear reflectance too
-			
-			wasStopped = stopFlag == 1
-			stopFlag = 0
-			if wasStopped:
-				print("Scan stopped by user")
-			else:
-				print("h - done")
+		startReader()
+		root.after(pumpInterval, pumpSerial)
+
+def liveScan():
+	"""Set up the stream processing for data coming from the scanner"""
+	scan.keepRaw = archiveOutput == 1
+	scan.darkFolder = darkFolder if darkPersist == 1 else None
+	scan.onPixels = previewRenderer.markDirty
+
+def resumeScan(path):
+	"""Continue an interrupted scan from its journal, starting at the first incomplete tilt row"""
+	global journal, dataString, fileImportFlag, scanningFlag
+	point = resumePoint(path)
+	if point is None:
+		updateStatus("Nothing to resume")
+		return
+	header, tilt = point
+	ts = "h" + ",".join(str(v) for v in header[1:4] + [tilt] + header[5:10]) + ","
+
+	# the cube has just been rebuilt from the journal by loadFile(), carry on filling it
+	dataString = ""
+	scan.rawFrames = []
+	for output in iterRawLines(path):
+		dataString += output + "\n"
+		row = output.split(',')
+		if(scan.hasCube() and len(row) == scan.hspec.shape[2]+5 and row[2] in ('0', '1', '2')):
+			scan.rawFrames.append(np.array(row, dtype=np.int32))
+	journal = ScanJournal(path, journalSyncInterval)
+	journal.append(RESUME_MARKER)
+	dataString += RESUME_MARKER + "\n"
+	scan.resume = True
+	fileImportFlag = 0
+	liveScan()
+
+	updateStatus("Resuming")
+	safeSerialWrite( ts )
+	btLoad["state"] = "disabled"
+	btStart["text"] = "Stop"
+	print("resuming from tilt " + str(tilt))
+	scanningFlag = 1
+	startReader()
+	root.after(pumpInterval, pumpSerial)
+
+def startReader():
+	global serialReader, serialLogDump
+	commands.cancelAll("Scan started")
+	stopReader()
+	serialLogDump = None
+	serialReader = SerialReader(ser, maxLines=readerQueueLines)
+	serialReader.start()
+	renderScheduler.interval = scanRenderInterval
+
+def stopReader():
+	global serialReader
+	if serialReader is not None:
+		serialReader.stop()
+		print("Serial reader: " + str(serialReader.stats()))
+		print("Rendering: " + str(renderScheduler.stats()))
+		serialReader = None
+	renderScheduler.interval = renderInterval
+
+def pumpSerial():
+	"""Drain a batch of lines queued by the serial reader thread (runs on the Tk thread)"""
+	global dataString, serialLogDump
+	if(scanningFlag == 0 or serialReader is None):
+		return
+	if(stopFlag == 1):
+		dataString += "x"
+		handleLine("x")
+		return
+	for item in serialReader.drain(pumpBatch, pumpBudget):
+		logSerial(item, "IN")
+		output = str(item) # binary frames are kept as their text line in the journal and CSV
+		if journal is not None:
+			journal.append(output)
+		dataString += output + "\n"
+		if handleLine(item):
 			return
-		#output = output.decode('utf-8')
-		output = output.split(',')
-##		specLength = math.ceil(pixels/boxcarN)
-		if(output[0] == 'h'):
-			unitNumber = int(output[1])
-			#print("unit: " + str(unitNumber))
-			
-			# Store the steps internally but don't update GUI fields
-			panStart = int(output[2])
-			panStop = int(output[3])
-			pan_Res = int(output[4])
-			panDim = int(0)
-			
-			boxcarN = int(output[9])
-			boxcarVal.set(str(boxcarN))
-			specLength = math.ceil(pixels/boxcarN)
-##			specLength = math.ceil(pixels/boxcarN)
-			if(reflFlag == 1):
-				clearRefl()
-			unitSetup()
-
-			tiltStart = int(output[5])
-			tiltStop = int(output[6])
-			tilt_Res = int(output[7])
-			panDim = int(1+(panStop-panStart)/pan_Res)
-			tiltDim = int(1+(tiltStop-tiltStart)/tilt_Res)
-			print("Hyperspec " + str(panDim) + " by " + str(tiltDim))
-			imLum = np.zeros([tiltDim, panDim])
-			imR = np.zeros([tiltDim, panDim])
-			imG = np.zeros([tiltDim, panDim])            
-			imB = np.zeros([tiltDim, panDim])
-			imCol = np.zeros([tiltDim, panDim, 3])
-			imSatR = np.zeros([tiltDim, panDim])
-			imSatB = np.zeros([tiltDim, panDim])
-
-			imI = np.zeros([tiltDim, panDim])
-			imGG = np.zeros([tiltDim, panDim]) 
-			imU = np.zeros([tiltDim, panDim])
-			
-			imChlA = np.zeros([tiltDim, panDim])            
-			imChlB = np.zeros([tiltDim, panDim])
-			imNDVI = np.zeros([tiltDim, panDim, 3])
-			
-			hspec = np.zeros([tiltDim, panDim, specLength])
-			hspecPan = np.zeros([panDim])
-			hspecTilt = np.zeros([tiltDim])
-
-
-		if(len(hspec) > 0 and hasattr(hspec, 'shape') and len(output) == hspec.shape[2]+5):
-			if(int(output[2]) == 0 or int(output[2]) == 1 or int(output[2]) == 2 ):
-				#time.sleep(0.01)
-				#processSpec()
-				if(preview > 0): ## live update
-						root.after(1, processSpec) # 10 seems to work
-				else:
-						processSpec()
-				#statusLabel.config(text="Running")
-				return
-		
-
-def processSpec():
-	global tt, darkTimes, darkVals, panStart, panStop, pan_Res, panDim, tiltDim, tiltStart, tiltStop, tilt_Res, tiltRes, linCoefs,  wavelength, wavelengthBins, maxRGB, boxcarN, output, maxIGU, hspec
-	boxedLength = len(output) - 5
-	updateDuringDark = 0
-	if(int(output[2]) == 0): # start or restart dark measurement
-		#if(int(output[3]) <= minIntTime): # start of new dark measurement when int time = 1 (might be better to comapre to previous value)
-		if(len(darkTimes) == 0 or int(output[3]) < darkTimes[len(darkTimes)-1]):
-			darkTimes = []
-			darkVals = []
-			#print("new dark measurements")
-
-		if int(output[3]) > 100000:
-				updateDuringDark = 1
-		darkTimes.append(int(output[3]))
-		#for i in range(0,pixels):
-		for i in range(5,boxedLength+5):
-			darkVals.append(output[i])
-
-		  
-
-	if(int(output[2]) == 1): # light measurement
-		for j in range(0, len(darkTimes)): # search through dark integration times
-			tempTime = int(output[3])
-##            if(tempTime < 0):
-##                    tempTime = 1
-			if(tempTime == darkTimes[j]): # found corresponding integration time, microsecond values assumed to be equal to 1ms
-				#print("int " + row[3])
-
-			   #-----------calculate radiance-----------------
-				lum = 0.0
-				intTime = float(output[3])
-##                if(intTime < 0):
-##                        intTime = float(intTime/-1000.0)
-				#if(intTime < 0):
-				#        intTime = 0.032 # intTime of -1 = 32 microseconds
-				intTime += baseInt #was 550 # compensation for minimum microsecond exposure  0.382, 1200 makes the butterfly scan gradients look most smooth (implying it must be close)
-##				le = [0] * pixels
-				cieXval = 0.0
-				cieYval = 0.0
-				cieZval = 0.0
-				chlAval = 0.0
-				chlBval = 0.0
-				nIRval = 0.0
-				nUVval = 0.0
-				
-				#ts = "Radiance W/(sr*sqm*nm)\nInt.: "  + str(intTime)  + "ms Scans: " +  str(nScans)
-				pan = int((int(output[0]) - panStart) / pan_Res)
-				tilt = int((int(output[1]) - tiltStart) / tilt_Res)
-				hspecPan[pan] = int(output[0])
-##				hspecTilt[tiltDim-1-tilt] = int(output[1])
-				hspecTilt[tilt] = int(output[1])
-				loc = 0;
-				for i in range(0, pixels, boxcarN): #increment in boxcar size
-					xSum = 0
-					for k in range(0, boxcarN): #repeat boxcar window
-						if(i+k < pixels):
-							if radSens[i+k] > 0 and len(output) > loc+5 :
-
-								x = (float(output[loc+5])-float(darkVals[loc+boxedLength*j])) / boxcarN # subtract corresponding dark value
-								if(x > 0):
-										#linMultiplier = linCoefs[0]*math.log((x+1)*linCoefs[1])
-									x = math.exp(math.log(x)*linCoefs[0] + linCoefs[1])
-								if(x < 0):
-									x = -1 * math.exp(math.log(-x)*linCoefs[0] + linCoefs[1])
-
-								x = (x) / (radSens[i+k] * intTime)		
-
-								xSum += x
-##								if loc == 0 or loc == 1 or loc ==2:
-##								if loc == pixels-1:
-##									print("dark:" + darkVals[loc+boxedLength*j] + " light:" + output[loc+5] + " sens:" + str(radSens[i+k]) + " x:"+ str(x))
-								x = x * wavelengthBins[i+k] # the following values are adjusted for namometer bin width
-								cieXval += x * cieXt[i+k]
-								cieYval += x * cieYt[i+k]
-								cieZval += x * cieZt[i+k]
-								chlAval += x * chlAt[i+k]
-								chlBval += x * chlBt[i+k]
-								nIRval += x * nIRt[i+k]
-								nUVval += x * nUVt[i+k]
-								
-								lum += x * cieYt[i+k]
-					hspec[tilt, pan, loc-1] += xSum/boxcarN # this is watts per nanometer (i.e. not controlled for AUC)
-					loc += 1
-				lum = lum * 683 * 117.159574150716 #luminance: W/(sr*sqm*nm), scaling factor calculated by comaring JETI to HOSI - the input isn't scaled to the same as OSpRad
-				#ts = "Scanning " +  str(float(pan + (tilt * panDim)) / float(tiltDim * panDim) + "% done")
-				#print(str(tiltDim) + ", " + str(panDim))
-				ts = str(round(float(pan + (tilt * panDim)) / float(tiltDim * panDim) * 100.0)) + "% done"
-				#print(ts)
-				imLum[tiltDim-1-tilt, pan] = lum
-
-				# convert to sRGB * set white balance to match computer screen
-				imRt = 3.24*cieXval -1.54*cieYval - 0.50*cieZval
-				imGt = (-0.97*cieXval + 1.88*cieYval + 0.04*cieZval) * 1.44
-				imBt = (0.06*cieXval -0.20*cieYval + 1.06*cieZval) *  1.71
-
-				imR[tiltDim-1-tilt, pan] = imRt
-				imG[tiltDim-1-tilt, pan] = imGt
-				imB[tiltDim-1-tilt, pan] = imBt
-
-				if(imRt > maxRGB):
-					maxRGB = imRt
-				if(imGt > maxRGB):
-					maxRGB = imGt
-				if(imBt > maxRGB):
-					maxRGB = imBt
-
-				if int(output[4]) > 0:
-					imSatR[tiltDim-1-tilt, pan] = 255
-				imSatB[tiltDim-1-tilt, pan] = int(output[4])
-
-				imI[tiltDim-1-tilt, pan] = nIRval
-				imGG[tiltDim-1-tilt, pan] = cieYval
-				imU[tiltDim-1-tilt, pan] = nUVval
-
-				if(nIRval > maxIGU):
-					maxIGU = nIRval
-				if(cieYval > maxIGU):
-					maxIGU = cieYval
-				if(nUVval > maxIGU):
-					maxIGU = nUVval
-
-				imChlA[tiltDim-1-tilt, pan] = chlAval / (chlAval+nIRval)
-				imChlB[tiltDim-1-tilt, pan] = chlBval / (chlBval+nIRval)
-
-				
-
-				ct = time.time()
-				#print("time: " + str(tt-ct))
-				if ct > tt:
-					tt = ct + 1 # time to next plot in seconds
-					statusLabel.config(text=ts)
-					plotGraph("")
-					#root.after(1, plotGraph(ts))
-
-	if updateDuringDark == 1:
-		root.after(1, getSpec)
+	if serialReader.error is not None:
+		updateStatus("Serial error: " + str(serialReader.error))
+		if serialLogDump is None:
+			serialLogDump = dumpSerialLog("serial error: " + str(serialReader.error))
+	elif serialReader.linesDropped > 0:
+		updateStatus("Dropped " + str(serialReader.linesDropped) + " lines")
+	root.after(pumpInterval, pumpSerial)
+
+def handleLine(output):
+	"""Process one line of a scan stream; returns True once the scan is finished"""
+	global maxRGB, maxIGU
+	event = scan.feed(output)
+	if(event == "header"):
+		adoptScan()
+	elif(event == "light"):
+		maxRGB = scan.maxRGB
+		maxIGU = scan.maxIGU
+		if fileImportFlag == 0: # loadChunk() redraws while loading files
+			queueStatus(scan.progress)
+			renderScheduler.markDirty("preview") # drawn at most once per scanRenderInterval
+	elif(event == "done"):
+		endScan()
+		return True
+	return False
+
+def adoptScan():
+	"""Mirror the geometry and arrays of a newly started scan into the GUI globals"""
+	global unitNumber, boxcarN, panStart, panStop, pan_Res, panDim, tiltStart, tiltStop, tilt_Res, tiltDim, hspec, hspecPan, hspecTilt, maxRGB, maxIGU
+	global imLum, imR, imG, imB, imCol, imSatR, imSatB, imI, imGG, imU, imChlA, imChlB, imNDVI
+	if(reflFlag == 1):
+		clearRefl()
+	unitNumber = scan.unitNumber
+	boxcarN = scan.boxcarN
+	boxcarVal.set(str(boxcarN))
+	unitSetup()
+	panStart, panStop, pan_Res = scan.panStart, scan.panStop, scan.panRes
+	tiltStart, tiltStop, tilt_Res = scan.tiltStart, scan.tiltStop, scan.tiltRes
+	panDim, tiltDim = scan.panDim, scan.tiltDim
+	hspec, hspecPan, hspecTilt = scan.hspec, scan.hspecPan, scan.hspecTilt
+	imLum, imR, imG, imB = scan.imLum, scan.imR, scan.imG, scan.imB
+	imSatR, imSatB = scan.imSatR, scan.imSatB
+	imI, imGG, imU = scan.imI, scan.imGG, scan.imU
+	imChlA, imChlB = scan.imChlA, scan.imChlB
+	imCol = np.zeros([tiltDim, panDim, 3])
+	imNDVI = np.zeros([tiltDim, panDim, 3])
+	maxRGB, maxIGU = scan.maxRGB, scan.maxIGU
+	previewRenderer.invalidate()
+
+def endScan():
+	"""End of a scan (or of a loaded file): save the outputs of a completed live scan and reset"""
+	global scanningFlag, dataString, maxRGB, maxIGU, focusPos, selX, selY, stopFlag, ct, journal
+	if(fileImportFlag == 0):
+		stopReader()
+	if stopFlag == 1:
+		updateStatus("Stopped")
 	else:
-		getSpec()
-		
-
+		updateStatus("Done")
+	maxRGB = scan.maxRGB
+	maxIGU = scan.maxIGU
+	previewRenderer.invalidate() # final preview with the exact maxima
+	if(scan.parser.rejected > 0):
+		print("Rejected " + str(scan.parser.rejected) + " malformed measurement lines")
+	#-------save output file--------
+	if(fileImportFlag == 0 and stopFlag == 0):  # Only save if not stopped early
+		ts = saveLabel.get()
+		ct = scanPath(ts)
+		scan.save(ct, dataString, ts, archive=archiveOutput == 1) # CSV (raw stream + le values), .npz archive, sRGB png
+		scan.saveDarks()
+		if journal is not None:
+			journal.close(remove=True) # everything is in the CSV now
+			journal = None
+		updateStatus("Ready")
+		renderScheduler.markDirty("preview")
+	
+	dataString = ""
+	scan.rawFrames = []
+	scanningFlag = 0
+	btStart["text"] = "Start"
+	btStart["state"] = "active"
+	btLoad["state"] = "active"
+	focusPos = 0 # reset focus position in case it was previously up
+	#statusLabel.config(text="Ready")
+	#fileImportFlag = 0
+	selX = -1
+	selY = -1 # reset these values to clear reflectance too
+	
+	wasStopped = stopFlag == 1
+	stopFlag = 0
+	if journal is not None: # stopped or interrupted: keep the raw stream for recovery
+		journal.close()
+		updateStatus("Stopped - journal kept")
+		print("Scan journal kept: " + journal.path)
+		journal = None
+	if wasStopped:
+		print("Scan stopped by user")
+	else:
+		print("h - done")
 
 def togglePreview():
 	global preview
@@ -978,198 +780,75 @@ def togglePreview():
 	if preview == 4:
 		btPreview.config(text="NDVI")
 
-	plotGraph("")
+	renderScheduler.markDirty("preview")
 		
 
 
-def goTL():
+def jogTo(button, tiltEntry, tiltName, panEntry, panName):
+	"""Move to a corner of the field of view: tilt, then pan, without blocking the GUI"""
 	if(scanningFlag == 0):
-		btTL["state"] = "disabled"
-		
-		# Convert tilt degrees to steps
-		tilt_deg = tiltTop.get()
-		valid, tilt_val = validateDegreeRange(tilt_deg, "Tilt Top")
+		valid, tilt_val = validateDegreeRange(tiltEntry.get(), tiltName)
 		if not valid:
-			btTL["state"] = "active"
-			return
-		tilt_steps = degreesToSteps(tilt_val)
-		
-		ts = "l" + str(tilt_steps)
-		if not safeSerialWrite(ts):
-			btTL["state"] = "active"
 			return
-		serFlag = 0
-		while serFlag == 0: # wait for tilt to get to where it's going
-			output = safeSerialRead()
-			if output and output.startswith('tilt:'):
-				serFlag = 1
-		time.sleep(0.1)
-		
-		# Convert pan degrees to steps
-		pan_deg = panLeft.get()
-		valid, pan_val = validateDegreeRange(pan_deg, "Pan Left")
+		valid, pan_val = validateDegreeRange(panEntry.get(), panName)
 		if not valid:
-			btTL["state"] = "active"
 			return
-		pan_steps = degreesToSteps(pan_val)
-		
-		ts = "p" + str(pan_steps)
-		if not safeSerialWrite(ts):
-			btTL["state"] = "active"
+		jog(button, degreesToSteps(tilt_val), degreesToSteps(pan_val))
+
+def jog(button, tilt_steps, pan_steps):
+	"""Queue a tilt+pan pair back to back; the button is re-enabled when both have reported back"""
+	button["state"] = "disabled"
+	if serialReader is None:
+		startCommandReader()
+	futures = [commands.send("l" + str(tilt_steps), "tilt:", commandTimeout), commands.send("p" + str(pan_steps), "pan:", commandTimeout)]
+	def done(future):
+		if not all(f.done() for f in futures): # replies can come back in either order
 			return
-		serFlag = 0
-		while serFlag == 0: # wait for pan to get to where it's going
-			output = safeSerialRead()
-			if output and output.startswith('pan:'):
-				serFlag = 1
-		btTL["state"] = "active"
+		button["state"] = "active"
+		errors = [f.exception() for f in futures if f.exception() is not None]
+		if errors:
+			updateStatus("Move failed: " + str(errors[0]))
+	for f in futures:
+		f.add_done_callback(done)
+	commandPump()
+
+def goTL():
+	jogTo(btTL, tiltTop, "Tilt Top", panLeft, "Pan Left")
 
 def goTR():
-	if(scanningFlag == 0):
-		btTR["state"] = "disabled"
-		
-		# Convert tilt degrees to steps
-		tilt_deg = tiltTop.get()
-		valid, tilt_val = validateDegreeRange(tilt_deg, "Tilt Top")
-		if not valid:
-			btTR["state"] = "active"
-			return
-		tilt_steps = degreesToSteps(tilt_val)
-		
-		ts = "l" + str(tilt_steps)
-		if not safeSerialWrite(ts):
-			btTR["state"] = "active"
-			return
-		serFlag = 0
-		while serFlag == 0: # wait for tilt to get to where it's going
-			output = safeSerialRead()
-			if output and output.startswith('tilt:'):
-				serFlag = 1
-		time.sleep(0.1)
-		
-		# Convert pan degrees to steps
-		pan_deg = panRight.get()
-		valid, pan_val = validateDegreeRange(pan_deg, "Pan Right")
-		if not valid:
-			btTR["state"] = "active"
-			return
-		pan_steps = degreesToSteps(pan_val)
-		
-		ts = "p" + str(pan_steps)
-		if not safeSerialWrite(ts):
-			btTR["state"] = "active"
-			return
-		serFlag = 0
-		while serFlag == 0: # wait for pan to get to where it's going
-			output = safeSerialRead()
-			if output and output.startswith('pan:'):
-				serFlag = 1
-		btTR["state"] = "active"
+	jogTo(btTR, tiltTop, "Tilt Top", panRight, "Pan Right")
 
 def goBL():
-	if(scanningFlag == 0):
-		btBL["state"] = "disabled"
-		
-		# Convert tilt degrees to steps
-		tilt_deg = tiltBot.get()
-		valid, tilt_val = validateDegreeRange(tilt_deg, "Tilt Bottom")
-		if not valid:
-			btBL["state"] = "active"
-			return
-		tilt_steps = degreesToSteps(tilt_val)
-		
-		ts = "l" + str(tilt_steps)
-		if not safeSerialWrite(ts):
-			btBL["state"] = "active"
-			return
-		serFlag = 0
-		while serFlag == 0: # wait for tilt to get to where it's going
-			output = safeSerialRead()
-			if output and output.startswith('tilt:'):
-				serFlag = 1
-		time.sleep(0.1)
-		
-		# Convert pan degrees to steps
-		pan_deg = panLeft.get()
-		valid, pan_val = validateDegreeRange(pan_deg, "Pan Left")
-		if not valid:
-			btBL["state"] = "active"
-			return
-		pan_steps = degreesToSteps(pan_val)
-		
-		ts = "p" + str(pan_steps)
-		if not safeSerialWrite(ts):
-			btBL["state"] = "active"
-			return
-		serFlag = 0
-		while serFlag == 0: # wait for pan to get to where it's going
-			output = safeSerialRead()
-			if output and output.startswith('pan:'):
-				serFlag = 1
-		btBL["state"] = "active"
+	jogTo(btBL, tiltBot, "Tilt Bottom", panLeft, "Pan Left")
 
 def goBR():
-	if(scanningFlag == 0):
-		btBR["state"] = "disabled"
-		
-		# Convert tilt degrees to steps
-		tilt_deg = tiltBot.get()
-		valid, tilt_val = validateDegreeRange(tilt_deg, "Tilt Bottom")
-		if not valid:
-			btBR["state"] = "active"
-			return
-		tilt_steps = degreesToSteps(tilt_val)
-		
-		ts = "l" + str(tilt_steps)
-		if not safeSerialWrite(ts):
-			btBR["state"] = "active"
-			return
-		serFlag = 0
-		while serFlag == 0: # wait for tilt to get to where it's going
-			output = safeSerialRead()
-			if output and output.startswith('tilt:'):
-				serFlag = 1
-		time.sleep(0.1)
-		
-		# Convert pan degrees to steps
-		pan_deg = panRight.get()
-		valid, pan_val = validateDegreeRange(pan_deg, "Pan Right")
-		if not valid:
-			btBR["state"] = "active"
-			return
-		pan_steps = degreesToSteps(pan_val)
-		
-		ts = "p" + str(pan_steps)
-		if not safeSerialWrite(ts):
-			btBR["state"] = "active"
-			return
-		serFlag = 0
-		while serFlag == 0: # wait for pan to get to where it's going
-			output = safeSerialRead()
-			if output and output.startswith('pan:'):
-				serFlag = 1
-		btBR["state"] = "active"
+	jogTo(btBR, tiltBot, "Tilt Bottom", panRight, "Pan Right")
 	
 def goZero():
 	if(scanningFlag == 0):
-		btZero["state"] = "disabled"
-		if not safeSerialWrite("l0"):
-			btZero["state"] = "active"
-			return
-		serFlag = 0
-		while serFlag == 0: # wait for tilt to get to where it's going
-			output = safeSerialRead()
-			if output and output.startswith('tilt:'):
-				serFlag = 1
-		if not safeSerialWrite("p0"):
-			btZero["state"] = "active"
-			return
-		serFlag = 0
-		while serFlag == 0: # wait for pan to get to where it's going
-			output = safeSerialRead()
-			if output and output.startswith('pan:'):
-				serFlag = 1
-		btZero["state"] = "active"
+		jog(btZero, 0, 0)
+
+def startCommandReader():
+	"""Reader thread for command replies outside scans (unlike startReader, keeps the idle redraw rate)"""
+	global serialReader
+	serialReader = SerialReader(ser, maxLines=readerQueueLines)
+	serialReader.start()
+
+def commandPump():
+	"""Route replies to the pending commands and enforce their deadlines (runs on the Tk thread)"""
+	global commandTimer
+	if(scanningFlag == 0 and serialReader is not None):
+		for item in serialReader.drain(pumpBatch, pumpBudget):
+			logSerial(item, "IN")
+			commands.feed(str(item))
+	commands.poll()
+	if commands.pending() > 0 and commandTimer is None:
+		commandTimer = root.after(pumpInterval, commandPumpTimer)
+
+def commandPumpTimer():
+	global commandTimer
+	commandTimer = None
+	commandPump()
 
 def setServoAngle(angle):
 	"""Set servo to specific angle (0-180)"""
@@ -1198,11 +877,6 @@ def closeShutter():
 	else:
 		print("Cannot close shutter - system is currently scanning")
 
-def degreesToSteps(degrees):
-	"""Convert degrees (-90 to 90) to steps (-512 to 512)"""
-	# Linear conversion: -90° = -512 steps, 90° = 512 steps
-	return int(degrees * 512 / 90)
-
 def validateDegreeRange(value, name):
 	"""Validate that degree value is within -90 to 90 range, clamp if out of range"""
 	deg = float(value)
@@ -1246,7 +920,7 @@ def showRes(a,b,c):
 			pan = math.floor( (pan_to_steps - pan_from_steps) / pan_res_steps ) +1
 			tilt = math.floor( (tilt_to_steps - tilt_from_steps) / tilt_res_steps ) +1
 			ts = str(pan) + "x" + str(tilt)
-			statusLabel.config(text=ts)
+			updateStatus(ts)
 ##			print(ts)
 		except:
 			return
@@ -1263,14 +937,8 @@ tiltResolution.trace_add('write', showRes)
 
 
 
-def onmouse(event):
-	global panDim, tiltDim, hspec, wavelengthBoxcar
-	global plotImX, plotImY, selX, selY, refs
-	clickX = event.x
-	clickY = event.y
-##	print("mouse event")
-##	print('x:' + str(event.x) + ' y:' + str(event.y))
-##	print(  plot_frame.bbox(plot) )
+def eventToPixel(clickX, clickY):
+	"""Image pixel (x, y up from the bottom) under position clickX, clickY of the preview label, clamped to the image"""
 	imAR = panDim/tiltDim # aspect ratio h/w y/x
 	frameAR = plotImX/plotImY # width is 2, height is 3
 	padding = 2
@@ -1281,87 +949,83 @@ def onmouse(event):
 
 	centreX = plotImX/2
 	centreY = plotImY/2
-	selX = int(math.floor( (panDim/2) + scale*(clickX-centreX)  )) ## offsets between click and centre of image
-	selY = int(math.floor( (tiltDim/2) + scale*(clickY-centreY) ))
-	selY = tiltDim-selY-1
+	x = int(math.floor( (panDim/2) + scale*(clickX-centreX)  )) ## offsets between click and centre of image
+	y = int(math.floor( (tiltDim/2) + scale*(clickY-centreY) ))
+	y = tiltDim-y-1
 
+	#---ensure selected coordinates match image dimensions---
+	x = min(max(x, 0), panDim-1)
+	y = min(max(y, 0), tiltDim-1)
+	return x, y
+
+def showPixel(x, y, trail=False):
+	"""Show the position, luminance and spectrum of pixel x, y (trail keeps the previous spectra as a fading overlay)"""
+	# Update position label
+	posLabel.config(text=f"Position: x:{x} y:{y} (pan:{panStart+pan_Res*x}° tilt:{tiltStart+tilt_Res*y}°)")
+	
+	# Update luminance label
+	if(imLum[y, x] > 0.1):
+		lumLabel.config(text=f"Luminance: {imLum[y, x]:.3f} cd/m²")
+	else:
+		lumLabel.config(text=f"Luminance: {imLum[y, x]:.3e} cd/m²")
+	le = hspec[y][x]
+	if(reflFlag == 1):
+		with np.errstate(invalid='ignore'):
+			le = le*100*refs
+	specView.show(wavelengthBoxcar, le, reflFlag == 1, x, y, trail)
 
+def onmouse(event):
+	global selX, selY
+	if(tiltDim == 0):
+		return
+	selX, selY = eventToPixel(event.x, event.y)
 ##	print("Selection:" + str(selX) + ", " + str(selY))
-	#---ensure selected coordinates match image dimensions---
-	if(selX < 0):
-		selX = 0
-	if(selX > panDim-1):
-		selX = panDim-1
-	if(selY < 0):
-		selY = 0
-	if(selY > tiltDim-1):
-		selY = tiltDim-1
-		
 
 	if(len(hspec)>0 and hasattr(hspec, 'shape')):
-		# Update position label
-		posLabel.config(text=f"Position: x:{selX} y:{selY} (pan:{panStart+pan_Res*selX}° tilt:{tiltStart+tilt_Res*selY}°)")
-		
-		# Update luminance label
-		if(imLum[selY, selX] > 0.1):
-			lumLabel.config(text=f"Luminance: {imLum[selY, selX]:.3f} cd/m²")
-		else:
-			lumLabel.config(text=f"Luminance: {imLum[selY, selX]:.3e} cd/m²")
-##		print("plot update")
-		le = hspec[selY][selX]
-		if(reflFlag == 1):
-			with np.errstate(invalid='ignore'):
-				le = le*100*refs
-		[ax[i].clear() for i in range(1)]
-		
-		# Find peak wavelength
-		peak_idx = np.argmax(le)
-		peak_wavelength = wavelengthBoxcar[peak_idx]
-		peak_value = le[peak_idx]
-		
-		# Create the main plot
-		ax[0].plot(wavelengthBoxcar, le, 'b-', linewidth=2, label='Spectrum')
-		
-		# Mark the peak
-		ax[0].plot(peak_wavelength, peak_value, 'ro', markersize=8, label=f'Peak: {peak_wavelength:.1f} nm')
-		
-		# Set labels and title
-		ax[0].set_xlabel('Wavelength (nm)', fontsize=10, fontweight='bold')
-		if(reflFlag == 1):
-			ax[0].set_ylabel('Reflectance (%)', fontsize=10, fontweight='bold')
-			ax[0].set_title(f'Reflectance Spectrum - Pixel ({selX}, {selY})', fontsize=11, fontweight='bold')
-		else:
-			ax[0].set_ylabel('Radiance (W·sr⁻¹·m⁻²·nm⁻¹)', fontsize=10, fontweight='bold')
-			ax[0].set_title(f'Radiance Spectrum - Pixel ({selX}, {selY})', fontsize=11, fontweight='bold')
-		
-		# Add grid
-		ax[0].grid(True, alpha=0.3, linestyle='-', linewidth=0.5)
-		ax[0].grid(True, alpha=0.2, linestyle='--', linewidth=0.3, which='minor')
-		
-		# Set axis limits
-		ax[0].set_ylim(ymin=0)
-		ax[0].set_xlim(min(wavelengthBoxcar), max(wavelengthBoxcar))
-		
-		# Add legend
-		ax[0].legend(loc='upper right', fontsize=9)
-		
-		# Improve tick formatting
-		ax[0].tick_params(axis='both', which='major', labelsize=9)
-		ax[0].tick_params(axis='both', which='minor', labelsize=8)
-		
-		# Add minor ticks
-		ax[0].minorticks_on()
-		
-		canvas.draw()
+		showPixel(selX, selY)
+		renderScheduler.markDirty("spectrum")
 		btSpecOut["state"] = "active"
 
+def onHover(event):
+	"""Pointer moved over the preview: keep only the latest position, the next frame shows it"""
+	global hoverPos
+	if(hoverMode.get() == 1):
+		hoverPos = (event.x, event.y)
+		renderScheduler.markDirty("hover")
+
+def onLeave(event):
+	global hoverPos
+	if(hoverMode.get() == 1):
+		hoverPos = None
+		renderScheduler.markDirty("hover")
+
+def drawHover():
+	"""Show the spectrum under the pointer (or the selected pixel again once the pointer has left)"""
+	global hoverPixel
+	if(len(hspec) == 0 or not hasattr(hspec, 'shape') or tiltDim == 0):
+		return
+	if(hoverPos is None or hoverMode.get() == 0):
+		if(hoverPixel is not None and selX > -1):
+			showPixel(selX, selY)
+			specView.draw()
+		hoverPixel = None
+		return
+	px = eventToPixel(*hoverPos)
+	if(px == hoverPixel): # still on the same pixel
+		return
+	hoverPixel = px
+	showPixel(px[0], px[1], hoverTrail > 0)
+	specView.draw()
+
 
 
 
 def loadFile():
-	global fileImportFlag, loadPath, maxRGB, maxIGU
+	global fileImportFlag, loadPath, loadLines, maxRGB, maxIGU
 	filetypes = (
 		('Hyperspec Files', '*.csv'),
+		('Hyperspec Archives', '*.npz'),
+		('Scan Journals', '*.journal'),
 		('All files', '*.*')
 	)
 
@@ -1370,15 +1034,106 @@ def loadFile():
 			title='Open a file',
 			initialdir='./scans/',
 			filetypes=filetypes)
+		if not loadPath:
+			return
 		print('Loading: ' + loadPath)
 		fileImportFlag = 1
 		maxRGB = 1E-10
 		maxIGU = 1E-10
-		getSpec()
+		t = time.time()
+		if loadPath.endswith('.npz'):
+			if showLeValues(loadArchive(loadPath)):
+				print("Loaded archive in " + str(round(time.time()-t, 3)) + "s")
+			else:
+				updateStatus("Load failed")
+			return
+		if showLeValues(readLeValues(loadPath)): # fast path: saved cube, no re-calibration
+			print("Loaded le values in " + str(round(time.time()-t, 3)) + "s")
+			return
+		scan.keepRaw = False # re-processing a saved file: no archive, no stored darks
+		scan.darkFolder = None
+		scan.onPixels = previewRenderer.markDirty
+		loadLines = iterRawLines(loadPath)
+		btLoad["state"] = "disabled"
+		loadChunk()
 	except:
 		fileImportFlag = 0
+		loadLines = None
+		btLoad["state"] = "active"
 		return
 
+def showLeValues(saved):
+	"""Use the cube from a saved scan's le values block and rebuild the preview images from it"""
+	global unitNumber, boxcarN, panStart, panStop, pan_Res, panDim, tiltStart, tiltStop, tilt_Res, tiltDim, hspec, hspecPan, hspecTilt
+	global imLum, imR, imG, imB, imCol, imSatR, imSatB, imI, imGG, imU, imChlA, imChlB, imNDVI, maxRGB, maxIGU, selX, selY
+	if saved is None:
+		return False
+	unitNumber = saved.header[0]
+	boxcarN = saved.header[8]
+	unitSetup()
+	if(engine is None or saved.cube.shape[2] != engine.specLength):
+		print("le values don't match the calibration for unit #" + str(unitNumber) + ", re-processing raw data")
+		return False
+	if(reflFlag == 1):
+		clearRefl()
+	boxcarVal.set(str(boxcarN))
+	panStart, panStop, pan_Res, tiltStart, tiltStop, tilt_Res = saved.header[1:7]
+	tiltDim, panDim = saved.cube.shape[:2]
+	print("Hyperspec " + str(panDim) + " by " + str(tiltDim))
+
+	hspec = saved.cube
+	hspecPan = saved.pan
+	hspecTilt = saved.tilt
+	planes = previewPlanes(engine.bandsFromSpectra(hspec), np.any(hspec != 0, axis=2))
+	imLum = planes["imLum"]
+	imR = planes["imR"]
+	imG = planes["imG"]
+	imB = planes["imB"]
+	imI = planes["imI"]
+	imGG = planes["imGG"]
+	imU = planes["imU"]
+	imChlA = planes["imChlA"]
+	imChlB = planes["imChlB"]
+	imCol = np.zeros([tiltDim, panDim, 3])
+	imNDVI = np.zeros([tiltDim, panDim, 3])
+	imSatB = saved.satN[::-1]
+	imSatR = np.where(imSatB > 0, 255, 0)
+	previewRenderer.invalidate()
+	maxRGB = max(1E-10, imR.max(), imG.max(), imB.max())
+	maxIGU = max(1E-10, imI.max(), imGG.max(), imU.max())
+
+	selX = -1
+	selY = -1 # reset these values to clear reflectance too
+	updateStatus("Done")
+	renderScheduler.markDirty("preview")
+	return True
+
+def loadChunk():
+	"""Stream the next chunk of a saved scan through handleLine, then redraw and yield to Tk"""
+	global loadLines, fileImportFlag
+	try:
+		n = 0
+		for output in loadLines:
+			if handleLine(output):
+				break
+			n += 1
+			if(loadRedrawLines > 0 and n >= loadRedrawLines):
+				renderScheduler.markDirty("preview")
+				root.after(1, loadChunk)
+				return
+		else:
+			handleLine("x") # file ended without the end-of-scan marker (e.g. a partial scan)
+	except Exception as e:
+		print("Error loading " + loadPath + ": " + str(e))
+		updateStatus("Load failed")
+		fileImportFlag = 0
+	loadLines = None
+	btLoad["state"] = "active"
+	renderScheduler.markDirty("preview")
+	if(loadPath.endswith('.journal') and fileImportFlag == 1 and serialConnected and resumePoint(loadPath) is not None):
+		if messagebox.askyesno("Resume scan", "This scan was interrupted. Resume it from the first incomplete row?"):
+			resumeScan(loadPath)
+
 def setReflVal():
 	global reflVal, reflFlag, selX, selY, refs, hspec, imR, imG, imB, maxRGB, wbR, wbG, wbB, wbI, wbGG, wbU, maxIGU, tiltDim
 	if(reflFlag == 0):
@@ -1427,7 +1182,7 @@ def setReflVal():
 				wbU = tmaxIGU/wbU
 ##				print("Multiplier R:"+str(wbR)+" G:"+str(wbG)+" B:"+str(wbB))
 ##					
-				plotGraph("Reflectance set")
+				renderScheduler.markDirty("preview")
 
 			else:
 				clearRefl()
@@ -1454,44 +1209,9 @@ def clearRefl():
 	if(len(hspec)>0 and hasattr(hspec, 'shape')):
 ##		print("plot update")
 		le = hspec[selY][selX]
-		[ax[i].clear() for i in range(1)]
-		
-		# Find peak wavelength
-		peak_idx = np.argmax(le)
-		peak_wavelength = wavelengthBoxcar[peak_idx]
-		peak_value = le[peak_idx]
-		
-		# Create the main plot
-		ax[0].plot(wavelengthBoxcar, le, 'b-', linewidth=2, label='Spectrum')
-		
-		# Mark the peak
-		ax[0].plot(peak_wavelength, peak_value, 'ro', markersize=8, label=f'Peak: {peak_wavelength:.1f} nm')
-		
-		# Set labels and title
-		ax[0].set_xlabel('Wavelength (nm)', fontsize=10, fontweight='bold')
-		ax[0].set_ylabel('Radiance (W·sr⁻¹·m⁻²·nm⁻¹)', fontsize=10, fontweight='bold')
-		ax[0].set_title(f'Radiance Spectrum - Pixel ({selX}, {selY})', fontsize=11, fontweight='bold')
-		
-		# Add grid
-		ax[0].grid(True, alpha=0.3, linestyle='-', linewidth=0.5)
-		ax[0].grid(True, alpha=0.2, linestyle='--', linewidth=0.3, which='minor')
-		
-		# Set axis limits
-		ax[0].set_ylim(ymin=0)
-		ax[0].set_xlim(min(wavelengthBoxcar), max(wavelengthBoxcar))
-		
-		# Add legend
-		ax[0].legend(loc='upper right', fontsize=9)
-		
-		# Improve tick formatting
-		ax[0].tick_params(axis='both', which='major', labelsize=9)
-		ax[0].tick_params(axis='both', which='minor', labelsize=8)
-		
-		# Add minor ticks
-		ax[0].minorticks_on()
-		
-		canvas.draw()
-	plotGraph("Reflectance cleared")
+		specView.show(wavelengthBoxcar, le, False, selX, selY)
+		renderScheduler.markDirty("spectrum")
+	renderScheduler.markDirty("preview")
 
 def showInfo():
 	"""Display information window with usage instructions and tool details"""
@@ -1626,6 +1346,8 @@ This tool is designed for research and educational use in spectral imaging appli
 
 def startStop():
 	global fileImportFlag
+	if loadLines is not None: # a saved scan is still loading
+		return
 	fileImportFlag = 0
 	global stopFlag, scanningFlag
 	if(scanningFlag == 0 and stopFlag == 0):
@@ -1645,60 +1367,25 @@ def startStop():
 		return
 	
 
-# COMMENTED OUT FOR LATER USE - RECEPTOR-BASED IMAGE OUTPUT FUNCTION
-# def imageOutput():
-# 	print("Outputting selected cone-catch images");
-# 	for item in receptorListbox.curselection():
-# 		#print("item: "+ str(item))
-# 		print(receptorNames[item])
-# 	
-# 		#------resample spectral sensitivities at spectrometer wavelengths---------
-# 		recept = [0.0] * pixels
-# 		rSum = 0.0
-# 		for i in range(0,pixels):
-# 			# ~ for j in range(0, len(cieWav)):
-# 			for j in range(0, len(receptorVals[item])):
-# 				if(round(wavelength[i]) == cieWav[j]):
-# 					recept[i] = receptorVals[item][j]
-# 					rSum += recept[i]
-# 					
-# 		# ~ for i in range(0,pixels):
-# 			# ~ recept[i] = recept[i]/rSum #  normalise to area under curve = 1
-# 		
-# 		# ~ print(recept)
-# 		imOut = np.zeros([tiltDim, panDim])
-# 		
-# 		# ~ pes = [(6.626E-34 * 2.998E8) / (x*1E-9) for x in wavelengthBoxcar] # energy per photon at each wavelength
-# 		pes = [(1E18 * 6.626E-34 * 2.998E8) / (x*1E-9) for x in wavelengthBoxcar] # energy per photon at each wavelength - SCALED (multiplied by 1E18 to give more sensible ouput given 32-bit floating point range limits
-# 		#print(pes)
-# 		
-# 		for y in range(0, tiltDim):
-# 			for x in range(0, panDim):
-# 				leSum = 0.0
-# 				le = hspec[y][x]
-# 				if(reflFlag == 1):
-# 					with np.errstate(invalid='ignore'):
-# 						le = le*100*refs
-# 				# ~ print(str(len(le)))
-# 				
-# 				for z in range(0, len(le)):
-# 					for b in range(0, boxcarN):
-# 						# ~ leSum += le[z] * recept[b + z*boxcarN] * wavelengthBins[b + z*boxcarN] # correct for differences in bin-width (area-under curve)
-# 						leSum += (le[z]/pes[z]) * recept[b + z*boxcarN] * wavelengthBins[b + z*boxcarN] # correct for differences in bin-width (area-under curve)
-# 
-# 				imOut[tiltDim-y-1, x] = leSum
-# 
-# 				# ~ print("x: "+ str(x) + " y: " + str(y) + " val: " + str(leSum))
-# 		# ~ print(imOut)
-# 		img = Image.fromarray(imOut)
-# 		
-# 		if fileImportFlag == 1:
-# 			ts = loadPath.replace('.csv', '')
-# 		else:
-# 			ts = ct
-# 		print(ts)
-# 		ts = ts + "_" + receptorNames[item] + ".tif"
-# 		img.save(ts)
+def imageOutput():
+	if len(hspec)>0 and hasattr(hspec, 'shape'):
+		print("Outputting cone-catch images")
+		recEngine = calStore.receptorEngine(unitNumber, boxcarN)
+		if recEngine is None or len(recEngine.names) == 0:
+			updateStatus("No receptor data")
+			return
+		if fileImportFlag == 1:
+			ts = os.path.splitext(loadPath)[0]
+		elif isinstance(ct, str) and ct:
+			ts = ct
+		else: # scan still running
+			ts = scanPath(saveLabel.get())
+		t0 = time.time()
+		paths = exportReceptors(ts, recEngine, hspec, refs if reflFlag == 1 else None)
+		for p in paths:
+			print(p)
+		updateStatus("Saved " + str(len(paths)) + " receptor image(s)")
+		print("receptor images: " + str(round(time.time()-t0, 3)) + " s")
 
 		
 def specOutput():
@@ -1713,7 +1400,7 @@ def specOutput():
 				le = le*100*refs
 				
 		if fileImportFlag == 1:
-			ts = loadPath.replace('.csv', '')
+			ts = os.path.splitext(loadPath)[0]
 		else:
 			ts = ct
 		# ~ print(ts)
@@ -1847,13 +1534,17 @@ frame3.grid(row=3, column=0, sticky=N+E+W)
 frame3.columnconfigure(0, weight=1)
 frame3.rowconfigure(0, weight=1)
 
-brightnessScale = Scale(frame3, from_=1, to=100, orient='horizontal',command= plotGraph)
+brightnessScale = Scale(frame3, from_=1, to=100, orient='horizontal',command=lambda v: renderScheduler.markDirty("preview"))
 brightnessScale.set(100)
 brightnessScale.grid(row=0, column=0, padx=2, pady=2, sticky=N+W+E)
 
 statusLabel = Label(frame3, text = "Status", fg="gray", justify="left")
 statusLabel.grid(row=0, column=0, padx=2, pady=2, sticky=N+W)
 
+hoverMode = IntVar(value=0)
+hoverCheck = ttk.Checkbutton(frame3, text="Hover", variable=hoverMode, command=lambda: renderScheduler.markDirty("hover"))
+hoverCheck.grid(row=0, column=0, padx=2, pady=2, sticky=N+E)
+
 ##------------IMAGE FRAME-------------
 
 plot_frame = Frame(root)
@@ -1885,6 +1576,8 @@ except:
 plot = Label(plot_frame, image=gridImResized, fg="gray", justify="left", cursor="hand2")
 plot.grid(row=0, column=0, padx=0, pady=0, sticky=N+W+E+S)
 plot.bind('<1>', onmouse) ## mouse click event
+plot.bind('<Motion>', onHover) ## hover mode: spectrum under the pointer
+plot.bind('<Leave>', onLeave)
 plot_frame.grid_propagate(False)
 
 ##------------SPEC PLOT FRAME-------------
@@ -1896,60 +1589,16 @@ canvas = FigureCanvasTkAgg(figure, spec_frame)
 canvas.get_tk_widget().grid(row=0, column=0, padx=2, pady=2, sticky=N+S+E+W)
 ax = [figure.add_subplot(1, 1, x+1) for x in range(1)]
 
-# Global variables for crosshair
-crosshair_vline = None
-crosshair_text = None
+specView = SpectrumView(ax[0], canvas, hoverTrail) # persistent artists, blitted
 
 def on_plot_click(event):
 	"""Handle clicks on the spectral plot to show wavelength crosshair"""
-	global crosshair_vline, crosshair_text
-	
 	if event.inaxes == ax[0] and len(hspec) > 0 and hasattr(hspec, 'shape'):
-		# Clear previous crosshair by removing from axes lines and texts collections
-		if crosshair_vline:
-			try:
-				crosshair_vline.remove()
-			except:
-				# If remove fails, clear from lines collection
-				if crosshair_vline in ax[0].lines:
-					ax[0].lines.remove(crosshair_vline)
-		
-		if crosshair_text:
-			try:
-				crosshair_text.remove()
-			except:
-				# If remove fails, clear from texts collection
-				if crosshair_text in ax[0].texts:
-					ax[0].texts.remove(crosshair_text)
-		
-		# Get clicked wavelength
-		wavelength_clicked = event.xdata
-		
-		if wavelength_clicked is not None:
-			# Find closest wavelength in our data
-			closest_idx = np.argmin(np.abs(np.array(wavelengthBoxcar) - wavelength_clicked))
-			closest_wavelength = wavelengthBoxcar[closest_idx]
-			
-			# Get the spectrum value at this wavelength
-			le = hspec[selY][selX]
-			if(reflFlag == 1):
-				with np.errstate(invalid='ignore'):
-					le = le*100*refs
-			spectrum_value = le[closest_idx]
-			
-			# Add vertical line at clicked wavelength
-			crosshair_vline = ax[0].axvline(x=closest_wavelength, color='red', linestyle='--', alpha=0.8, linewidth=2)
-			
-			# Add text annotation
-			crosshair_text = ax[0].annotate(
-				f'{closest_wavelength:.1f} nm\n{spectrum_value:.3e}',
-				xy=(closest_wavelength, spectrum_value),
-				xytext=(10, 10), textcoords='offset points',
-				bbox=dict(boxstyle='round,pad=0.3', facecolor='yellow', alpha=0.8),
-				fontsize=9, fontweight='bold'
-			)
-			
-			canvas.draw()
+		# Mark the closest band of the spectrum on show
+		hit = specView.crosshair(event.xdata)
+		if hit is not None:
+			closest_wavelength, spectrum_value = hit
+			renderScheduler.markDirty("spectrum")
 			print(f"Clicked wavelength: {closest_wavelength:.1f} nm, Value: {spectrum_value:.3e}")
 
 # Connect the click event to the plot
@@ -1963,6 +1612,13 @@ spec_frame.rowconfigure(0, weight=1)
 
 root.bind("<Configure>", updatePlotRes) ## resizing the window calls this function
 
+## redraw handlers, run in this order by renderScheduler (at most one frame per interval)
+renderScheduler.register("resize", resizePlot)
+renderScheduler.register("preview", plotGraph)
+renderScheduler.register("hover", drawHover)
+renderScheduler.register("spectrum", specView.draw)
+renderScheduler.register("status", drawStatus)
+
 # Serial port selection variables
 serialPortVar = StringVar()
 
@@ -2019,12 +1675,12 @@ btCloseShutter.grid(row=1, column=2, padx=4, pady=4, sticky=W+E)
 
 # Info button
 ttk.Label(controls_frame, text="Help:").grid(row=1, column=3, padx=4, pady=4, sticky=W)
-btInfo = ttk.Button(controls_frame, text="Info", command=lambda: showInfo(), width=12)
-btInfo.grid(row=1, column=4, columnspan=2, padx=4, pady=4, sticky=W+E)
+btInfo = ttk.Button(controls_frame, text="Info", command=lambda: showInfo(), width=10)
+btInfo.grid(row=1, column=4, padx=4, pady=4, sticky=W+E)
 
-# Export Images button spanning two columns for better balance - COMMENTED OUT (USES RECEPTORS)
-# btImOut = ttk.Button(controls_frame, text="Export Images", command=lambda: imageOutput(), width=15)
-# btImOut.grid(row=1, column=4, columnspan=2, padx=4, pady=4, sticky=W+E)
+# Export Images: one multi-page TIFF per species in sensitivity_data.csv
+btImOut = ttk.Button(controls_frame, text="Export Images", command=lambda: imageOutput(), width=10)
+btImOut.grid(row=1, column=5, padx=4, pady=4, sticky=W+E)
 
 # Row 2: Status display (properly formatted, always visible)
 status_frame = ttk.Frame(controls_frame)
@@ -2053,4 +1709,5 @@ lumLabel.grid(row=0, column=2, padx=4, pady=2, sticky=N)
 # controls_frame.rowconfigure(5, weight=1)
 controls_frame.configure(height=350)  # Increase height to give more room for receptors
 
-root.mainloop()
\ No newline at end of file
+root.mainloop()
+serialLog.close() # flush the file sink
@@ -0,0 +1,235 @@
+"""Benchmark cases for the host processing pipeline.
+
+Each case takes a Dataset and returns a function doing one unit of work (e.g. parsing every line
+of the scan once) and the number of items it handles, so results can be compared per frame too.
+"""
+import os
+import numpy as np
+
+from hosi.calibration import CalibrationStore
+from hosi.darks import DarkModel
+from hosi.preview import PreviewRenderer
+from hosi.scan import ScanProcessor, scanCommand
+from hosi.scanfile import iterRawLines, readLeValues
+from hosi.archive import loadArchive
+from hosi.simulator import SimulatedScanner
+from hosi.frames import FrameDecoder, encodeFrame
+from hosi.parser import LineParser
+
+CASES = {}
+
+
+def case(fn):
+	CASES[fn.__name__] = fn
+	return fn
+
+
+class Dataset:
+	"""The lines of one scan plus the processed result, shared by the cases"""
+
+	def __init__(self, name, lines, store):
+		self.name = name
+		self.lines = lines
+		self.store = store
+		self.folder = None # scratch folder for the save/load cases, set by the runner
+		self.rows = [line.split(",") for line in lines]
+		self.frames = [row for row in self.rows if len(row) > 5 and row[2] in ("0", "1", "2")]
+		self.lights = [row for row in self.frames if row[2] == "1"]
+		self.scan = ScanProcessor(store)
+		self.scan.keepRaw = True
+		for line in lines:
+			self.scan.feed(line)
+
+	@property
+	def engine(self):
+		return self.scan.engine
+
+
+def synthetic(width, height, boxcar, store, seed=0):
+	"""A width x height pixel scan with boxcar from the simulated scanner (unthrottled)"""
+	sim = SimulatedScanner(unitNumber=store.units()[0], speed=0, seed=seed, timeout=5)
+	tilt0 = 100 # well below the tilts where the firmware thins out pan positions
+	sim.write(scanCommand(-(width//2), -(width//2) + width - 1, 1, tilt0, tilt0 + height - 1, 1, 2000, boxcar, 120))
+	lines = []
+	while True:
+		line = sim.readline().decode().strip()
+		if line:
+			lines.append(line)
+		if line == "x":
+			break
+	sim.close()
+	return Dataset(str(width) + "x" + str(height) + "/b" + str(boxcar), lines, store)
+
+
+def recorded(path, store):
+	"""The raw stream of a saved scan (.csv or .journal)"""
+	return Dataset(os.path.basename(path), list(iterRawLines(path)), store)
+
+
+#------------------------ cases ------------------------
+
+@case
+def parse(data):
+	"""Parse every line into its header fields and a pooled counts row (hosi.parser)"""
+	lines = data.lines
+	length = len(data.frames[0]) - 5
+	def run():
+		parser = LineParser(length)
+		for line in lines:
+			frame = parser.parse(line)
+			if frame is not None:
+				parser.release(frame[5])
+	return run, len(lines)
+
+
+@case
+def decodeFrames(data):
+	"""The same frames sent as binary (hosi.frames): decode the byte stream into count arrays"""
+	stream = b"".join(encodeFrame(*(int(v) for v in row[:5]), np.asarray(row[5:], dtype=np.int64)) for row in data.frames)
+	def run():
+		FrameDecoder().feed(stream)
+	return run, len(data.frames)
+
+
+@case
+def darks(data):
+	"""Dark-set bookkeeping and time interpolation for every frame"""
+	frames = [(int(row[2]), int(row[3]), row[5:]) for row in data.frames]
+	def run():
+		model = DarkModel()
+		for pos, (darkLight, intTime, counts) in enumerate(frames):
+			if darkLight == 0:
+				model.addDark(pos, intTime, counts)
+			elif darkLight == 1:
+				model.addLight(pos, intTime, pos)
+		model.finish()
+	return run, len(frames)
+
+
+@case
+def radiance(data):
+	"""Radiance and band sums of each light frame, one frame at a time as during a scan"""
+	engine = data.engine
+	light = [np.asarray(row[5:], dtype=float) for row in data.lights]
+	dark = [l * 0.1 for l in light]
+	intTime = [int(row[3]) for row in data.lights]
+	def run():
+		for l, d, t in zip(light, dark, intTime):
+			engine.convert(l, d, t)
+	return run, len(light)
+
+
+@case
+def process(data):
+	"""The whole per-line pipeline: ScanProcessor.feed over the stream"""
+	lines = data.lines
+	store = data.store
+	def run():
+		scan = ScanProcessor(store)
+		for line in lines:
+			scan.feed(line)
+	return run, len(lines)
+
+
+def _planes(scan):
+	return {name: getattr(scan, name) for name in ("imR", "imG", "imB", "imSatR", "imSatB", "imI", "imGG", "imU", "imChlA", "imChlB")}
+
+
+@case
+def previewFull(data):
+	"""Full preview render in each of the five modes"""
+	scan = data.scan
+	planes = _planes(scan)
+	renderer = PreviewRenderer()
+	wb = (1.0,)*6
+	def run():
+		for mode in range(5):
+			renderer.invalidate()
+			renderer.render(mode, planes, scan.maxRGB, scan.maxIGU, wb, 100)
+	return run, 5
+
+
+@case
+def previewPixel(data):
+	"""Preview update after one new pixel, the common case while scanning"""
+	scan = data.scan
+	planes = _planes(scan)
+	renderer = PreviewRenderer()
+	wb = (1.0,)*6
+	renderer.render(0, planes, scan.maxRGB, scan.maxIGU, wb, 100)
+	n = 100
+	def run():
+		for i in range(n):
+			renderer.markDirty(i % scan.tiltDim, i % scan.panDim)
+			renderer.render(0, planes, scan.maxRGB, scan.maxIGU, wb, 100)
+	return run, n
+
+
+@case
+def saveCsv(data):
+	"""CSV output: the raw stream plus the le values block"""
+	scan = data.scan
+	rawText = "".join(line + "\n" for line in data.lines)
+	def run():
+		path = os.path.join(data.folder, "saveCsv")
+		if os.path.exists(path + ".csv"):
+			os.remove(path + ".csv")
+		scan.save(path, rawText, csv=True, archive=False, images=())
+	return run, 1
+
+
+@case
+def saveNpz(data):
+	"""Binary .npz archive output (cube and raw frames)"""
+	scan = data.scan
+	def run():
+		scan.save(os.path.join(data.folder, "saveNpz"), "", csv=False, archive=True, images=())
+	return run, 1
+
+
+def _saved(data):
+	path = os.path.join(data.folder, "saved_" + data.name.replace("/", "_"))
+	if not os.path.exists(path + ".npz"):
+		data.scan.save(path, "".join(line + "\n" for line in data.lines), csv=True, archive=True, images=())
+	return path
+
+
+@case
+def loadCsv(data):
+	"""Reading the le values back from the CSV"""
+	path = _saved(data) + ".csv"
+	def run():
+		readLeValues(path)
+	return run, 1
+
+
+@case
+def loadNpz(data):
+	"""Reading the cube back from the .npz archive"""
+	path = _saved(data) + ".npz"
+	def run():
+		loadArchive(path).cube.sum()
+	return run, 1
+
+
+@case
+def reflectance(data):
+	"""Reflectance relative to a reference pixel, applied to the whole cube and the receptor catches"""
+	scan = data.scan
+	hspec = scan.hspec
+	recEngine = data.store.receptorEngine(scan.unitNumber, scan.boxcarN)
+	y, x = hspec.shape[0] // 2, hspec.shape[1] // 2
+	def run():
+		with np.errstate(divide='ignore', invalid='ignore'):
+			refs = (50/100)/hspec[y][x]
+			hspec*100*refs
+			if recEngine is not None:
+				recEngine.catch(hspec, refs)
+	return run, hspec.shape[0] * hspec.shape[1]
+
+
+def loadStore(calPath, sensPath):
+	store = CalibrationStore(calPath, sensPath)
+	if not store.units():
+		raise SystemExit("No calibrated units in " + calPath)
+	return store
@@ -0,0 +1,74 @@
+"""Command latency with and without newline-terminated commands, on the simulated scanner.
+
+    python bench/latency.py [--out latency.json]
+
+Times are on the simulator's virtual clock (from the write to the firmware finishing the command),
+so they reflect the firmware's timing rather than this machine's speed.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hosi.commands import negotiate
+from hosi.simulator import SimulatedScanner
+
+COMMANDS = ("t500", "t0", "open", "close", "l0", "p0", "l100", "r")
+
+
+def commandTime(sim, cmd, terminator):
+	"""Virtual seconds from writing cmd until the firmware has handled it"""
+	done = sim.commandsDone
+	t0 = sim.clock
+	sim.write(cmd + terminator)
+	while sim.commandsDone == done:
+		time.sleep(0.0005)
+	sim.reset_input_buffer()
+	return sim.clock - t0
+
+
+def stopTime(sim, terminator):
+	"""Virtual seconds from "stop" during a scan to the scan's closing x"""
+	sim.write("h-100,100,5,0,50,5,2000000,2,120000," + terminator)
+	while sim.framesSent < 20: # into the light frames
+		time.sleep(0.001)
+	t0 = sim.clock
+	sim.write("stop" + terminator)
+	while sim.readline().strip() != b"x":
+		pass
+	return sim.clock - t0
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(prog="python bench/latency.py", description=__doc__.splitlines()[0])
+	parser.add_argument("--out", help="write the results to this JSON file")
+	args = parser.parse_args(argv)
+	results = {}
+	for mode in ("readString", "terminated"):
+		sim = SimulatedScanner(speed=0, timeout=5)
+		terminator = ""
+		if mode == "terminated":
+			if not negotiate(sim):
+				raise SystemExit("simulator refused terminated commands")
+			terminator = "\n"
+		times = {cmd: commandTime(sim, cmd, terminator) for cmd in COMMANDS}
+		times["stop"] = stopTime(sim, terminator)
+		sim.close()
+		results[mode] = times
+	for cmd in COMMANDS + ("stop",):
+		a, b = results["readString"][cmd], results["terminated"][cmd]
+		print(cmd.ljust(6) + (str(round(a*1000)) + " ms").rjust(10) + (str(round(b*1000)) + " ms").rjust(10) + ("-" + str(round((a-b)*1000)) + " ms").rjust(10), file=sys.stderr)
+	text = json.dumps(results, indent=1, sort_keys=True)
+	if args.out:
+		with open(args.out, "w") as f:
+			f.write(text)
+	else:
+		print(text)
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
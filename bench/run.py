@@ -0,0 +1,140 @@
+"""Benchmarks for the host processing pipeline.
+
+    python bench/run.py                                   # all cases, default sizes, results to stdout
+    python bench/run.py --quick                           # small scans only, a few seconds
+    python bench/run.py --out results.json                # save the results as JSON
+    python bench/run.py --baseline results.json --threshold 0.25    # fail (exit 1) on >25% slowdowns
+    python bench/run.py --sizes 5x5 50x25 --boxcar 2 --cases parse process --recorded scans/my_scan.csv
+
+Synthetic scans come from the simulated scanner (hosi.simulator) and are the same on every run.
+Each case is timed repeat times after a warm-up and the median is compared against the baseline.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+from cases import CASES, loadStore, recorded, synthetic
+
+SIZES = ("5x5", "20x10", "50x25", "200x100")
+BOXCARS = (1, 2, 4)
+
+
+def timeCase(run, repeat, minTime=0.05):
+	"""Seconds per call of run: warm up, then repeat samples of enough calls to take minTime each"""
+	with contextlib.redirect_stdout(io.StringIO()): # the processing code prints progress
+		t0 = time.perf_counter()
+		run()
+		once = time.perf_counter() - t0
+		calls = max(1, int(minTime / max(once, 1E-9)))
+		samples = []
+		for i in range(repeat):
+			t0 = time.perf_counter()
+			for j in range(calls):
+				run()
+			samples.append((time.perf_counter() - t0) / calls)
+	return samples
+
+
+def gitCommit():
+	try:
+		return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=10).stdout.strip()
+	except (OSError, subprocess.SubprocessError):
+		return ""
+
+
+def compare(results, baseline, threshold):
+	"""Cases whose median is more than threshold (a fraction) slower than in baseline"""
+	regressions = []
+	for key, res in results.items():
+		base = baseline.get(key)
+		if base is None or base["median"] <= 0:
+			continue
+		ratio = res["median"] / base["median"]
+		res["ratio"] = round(ratio, 3)
+		if ratio > 1 + threshold:
+			regressions.append((key, ratio))
+	return regressions
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(prog="python bench/run.py", description="HOSI host pipeline benchmarks")
+	parser.add_argument("--sizes", nargs="*", default=list(SIZES), help="synthetic scans, pan x tilt pixels")
+	parser.add_argument("--boxcar", nargs="*", type=int, default=list(BOXCARS))
+	parser.add_argument("--recorded", nargs="*", default=[], help="saved scans (.csv/.journal) to benchmark as well")
+	parser.add_argument("--cases", nargs="*", default=list(CASES), choices=list(CASES))
+	parser.add_argument("--repeat", type=int, default=5)
+	parser.add_argument("--out", help="write the results to this JSON file")
+	parser.add_argument("--baseline", help="results JSON to compare against")
+	parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown against the baseline (0.2 = 20%%)")
+	parser.add_argument("--quick", action="store_true", help="5x5 and 20x10 scans with boxcar 2, 3 repeats")
+	parser.add_argument("--calibration", default=os.path.join(ROOT, "calibration_data.txt"))
+	parser.add_argument("--sensitivity", default=os.path.join(ROOT, "sensitivity_data.csv"))
+	args = parser.parse_args(argv)
+	if args.quick:
+		args.sizes, args.boxcar, args.repeat = ["5x5", "20x10"], [2], 3
+
+	store = loadStore(args.calibration, args.sensitivity)
+	datasets = []
+	for size in args.sizes:
+		width, height = (int(v) for v in size.lower().split("x"))
+		for boxcar in args.boxcar:
+			datasets.append(lambda w=width, h=height, b=boxcar: synthetic(w, h, b, store))
+	for path in args.recorded:
+		datasets.append(lambda p=path: recorded(p, store))
+
+	results = {}
+	with tempfile.TemporaryDirectory(prefix="hosi_bench_") as folder:
+		for make in datasets:
+			t0 = time.perf_counter()
+			with contextlib.redirect_stdout(io.StringIO()):
+				data = make()
+			data.folder = folder
+			print(data.name + ": " + str(len(data.lines)) + " lines (" + str(round(time.perf_counter() - t0, 1)) + " s to generate)", file=sys.stderr)
+			for name in args.cases:
+				run, items = CASES[name](data)
+				samples = timeCase(run, args.repeat)
+				median = float(np.median(samples))
+				key = name + "/" + data.name
+				results[key] = {"median": median, "min": float(min(samples)), "items": items, "perItemUs": median / items * 1E6}
+				print("  " + name.ljust(14) + (str(round(median * 1000, 3)) + " ms").rjust(14) + (str(round(median / items * 1E6, 2)) + " us/item").rjust(20), file=sys.stderr)
+
+	regressions = []
+	if args.baseline:
+		with open(args.baseline) as f:
+			regressions = compare(results, json.load(f)["results"], args.threshold)
+	report = {
+		"meta": {
+			"time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+			"commit": gitCommit(),
+			"python": platform.python_version(),
+			"numpy": np.__version__,
+			"machine": platform.platform(),
+			"repeat": args.repeat,
+		},
+		"results": results,
+	}
+	text = json.dumps(report, indent=1, sort_keys=True)
+	if args.out:
+		with open(args.out, "w") as f:
+			f.write(text)
+	else:
+		print(text)
+	for key, ratio in regressions:
+		print("REGRESSION " + key + ": " + str(round(ratio, 2)) + "x the baseline", file=sys.stderr)
+	return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1 @@
+"""Headless processing code for the HOSI hyperspectral scanner (shared by GUI.py)."""
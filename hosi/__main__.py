@@ -0,0 +1,6 @@
+"""python -m hosi: see hosi.cli."""
+import sys
+
+from hosi.cli import main
+
+sys.exit(main())
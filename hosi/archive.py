@@ -0,0 +1,77 @@
+"""Binary scan archive (.npz) written next to the CSV output.
+
+The archive is an uncompressed .npz, so each member is a plain .npy file inside the zip. np.load()
+reads it like any other .npz, and openCube() memory-maps the hspec cube in place so single pixel
+spectra can be read without loading the whole scan.
+"""
+import struct
+import zipfile
+import numpy as np
+
+from hosi.scanfile import LeValues
+
+ARCHIVE_VERSION = 1
+
+
+def saveArchive(path, header, hspec, hspecPan, hspecTilt, wavelengthBoxcar, rawFrames=None, label=""):
+	"""Write a scan archive.
+
+	header holds the fields of the "h," echo line (unit, pan/tilt ranges, maxInt, boxcar, darkRepeat),
+	rawFrames the raw dark/light lines as integer rows: pan, tilt, darkLight, intTime, satN, counts...
+	"""
+	if rawFrames is None or len(rawFrames) == 0:
+		rawFrames = np.zeros([0, np.shape(hspec)[2] + 5], dtype=np.int32)
+	rawFrames = np.asarray(rawFrames, dtype=np.int32)
+	np.savez(path,
+		version=np.array(ARCHIVE_VERSION),
+		header=np.asarray(header, dtype=np.int64),
+		unitNumber=np.array(header[0]),
+		hspec=np.asarray(hspec, dtype=np.float32),
+		hspecPan=np.asarray(hspecPan, dtype=np.float64),
+		hspecTilt=np.asarray(hspecTilt, dtype=np.float64),
+		wavelengthBoxcar=np.asarray(wavelengthBoxcar, dtype=np.float64),
+		rawHeaders=rawFrames[:, :5],
+		rawCounts=rawFrames[:, 5:],
+		label=np.array(label))
+
+
+def loadArchive(path):
+	"""Read a scan archive into the same structure as readLeValues()."""
+	with np.load(path) as z:
+		header = [int(v) for v in z["header"]]
+		hspec = z["hspec"].astype(float)
+		rawHeaders = z["rawHeaders"]
+		tiltDim, panDim = hspec.shape[:2]
+		panStart, panStop, panRes, tiltStart, tiltStop, tiltRes = header[1:7]
+		satN = np.zeros([tiltDim, panDim])
+		light = rawHeaders[rawHeaders[:, 2] == 1] if len(rawHeaders) else rawHeaders
+		if len(light):
+			p = ((light[:, 0] - panStart) / panRes).astype(int)
+			t = ((light[:, 1] - tiltStart) / tiltRes).astype(int)
+			ok = (p >= 0) & (p < panDim) & (t >= 0) & (t < tiltDim)
+			satN[t[ok], p[ok]] = light[ok, 4]
+		return LeValues(header, z["hspecPan"], z["hspecTilt"], z["wavelengthBoxcar"], hspec, satN)
+
+
+def openCube(path, member="hspec"):
+	"""Memory-map an array stored in an archive (read-only) without reading it into memory."""
+	with zipfile.ZipFile(path) as z:
+		info = z.getinfo(member + ".npy")
+	if info.compress_type != zipfile.ZIP_STORED:
+		raise ValueError(member + " is compressed and can't be memory-mapped")
+	with open(path, "rb") as f:
+		f.seek(info.header_offset)
+		nameLen, extraLen = struct.unpack("<HH", f.read(30)[26:30]) # zip local file header
+		f.seek(info.header_offset + 30 + nameLen + extraLen)
+		version = np.lib.format.read_magic(f)
+		if version == (1, 0):
+			shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+		else:
+			shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+		offset = f.tell()
+	return np.memmap(path, dtype=dtype, mode="r", shape=shape, offset=offset, order="F" if fortran else "C")
+
+
+def readSpectrum(path, x, y):
+	"""Spectrum of one preview pixel (x across, y up from the bottom as in the GUI) from an archive."""
+	return np.array(openCube(path)[y, x])
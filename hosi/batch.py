@@ -0,0 +1,138 @@
+"""Batch re-processing of a whole scans folder across worker processes.
+
+Every scan CSV in the folder is re-run through hosi.cli.processFile (cube archive, preview PNGs and
+receptor images). A manifest in the output folder records the content hash of each scan together
+with the calibration and the products it was made with, so unchanged scans are skipped next time.
+"""
+import glob
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from hosi.calibration import CalibrationStore
+from hosi.cli import processFile
+
+MANIFEST = "manifest.json"
+MANIFEST_VERSION = 1
+
+_store = None # per-worker calibration store
+
+
+def discover(folder="./scans"):
+	"""Scan CSVs in folder, excluding the _reprocessed copies, in name (i.e. date) order"""
+	return sorted(p for p in glob.glob(os.path.join(folder, "*.csv")) if not p.endswith("_reprocessed.csv"))
+
+
+def fileHash(*paths):
+	"""sha1 over the contents of paths"""
+	h = hashlib.sha1()
+	for p in paths:
+		with open(p, "rb") as f:
+			for chunk in iter(lambda: f.read(1 << 20), b""):
+				h.update(chunk)
+	return h.hexdigest()
+
+
+def loadManifest(outDir):
+	try:
+		with open(os.path.join(outDir, MANIFEST)) as f:
+			manifest = json.load(f)
+	except (OSError, ValueError):
+		return {}
+	if manifest.get("version") != MANIFEST_VERSION:
+		return {}
+	return manifest.get("files", {})
+
+
+def saveManifest(outDir, files):
+	path = os.path.join(outDir, MANIFEST)
+	with open(path + ".tmp", "w") as f:
+		json.dump({"version": MANIFEST_VERSION, "files": files}, f, indent=1, sort_keys=True)
+	os.replace(path + ".tmp", path)
+
+
+def upToDate(entry, key):
+	return entry is not None and entry.get("key") == key and all(os.path.exists(p) for p in entry.get("outputs", []))
+
+
+def _initWorker(calPath, sensPath):
+	global _store
+	_store = CalibrationStore(calPath, sensPath)
+
+
+def _process(path, outDir, images, receptors):
+	t0 = time.time()
+	try:
+		paths = processFile(path, _store, images, outDir, receptors=receptors)
+	except Exception as e: # one malformed scan must not stop the rest of the batch
+		return path, None, type(e).__name__ + ": " + str(e), time.time() - t0
+	return path, paths, None, time.time() - t0
+
+
+class BatchResult:
+	"""Outcome of one batch run: per-file seconds for processed scans, skipped and failed scans"""
+
+	def __init__(self):
+		self.done = {} # path: seconds
+		self.skipped = []
+		self.failed = {} # path: error
+		self.seconds = 0.0
+
+
+def runBatch(folder="./scans", outDir=None, workers=None, images=("sRGB", "IGU", "NDVI"), receptors=True,
+		calPath="./calibration_data.txt", sensPath="./sensitivity_data.csv", force=False, report=print):
+	"""Re-process every scan in folder into outDir (default folder/reprocessed) with up to workers processes.
+
+	Scans whose content, calibration and requested products match the manifest are skipped unless
+	force is set. report is called with one line per finished scan.
+	"""
+	t0 = time.time()
+	if outDir is None:
+		outDir = os.path.join(folder, "reprocessed")
+	os.makedirs(outDir, exist_ok=True)
+	store = CalibrationStore(calPath, sensPath)
+	store.load() # build the compiled cache once, before the workers read it
+	calHash = fileHash(calPath, sensPath)
+	settings = json.dumps([sorted(images), bool(receptors)])
+	manifest = loadManifest(outDir)
+	result = BatchResult()
+
+	todo = {}
+	for path in discover(folder):
+		name = os.path.basename(path)
+		key = hashlib.sha1((fileHash(path) + calHash + settings).encode()).hexdigest()
+		if not force and upToDate(manifest.get(name), key):
+			result.skipped.append(path)
+		else:
+			todo[path] = key
+	report(str(len(todo)) + " scan(s) to process, " + str(len(result.skipped)) + " up to date")
+
+	def finished(path, paths, error, seconds):
+		name = os.path.basename(path)
+		if error is not None:
+			result.failed[path] = error
+			manifest.pop(name, None)
+			report(path + ": " + error)
+		else:
+			result.done[path] = seconds
+			manifest[name] = {"key": todo[path], "outputs": paths, "seconds": round(seconds, 3)}
+			report(path + " (" + str(round(seconds, 2)) + " s)")
+		saveManifest(outDir, manifest) # keep progress if an overnight run is interrupted
+
+	if workers == 1 or len(todo) <= 1:
+		_initWorker(calPath, sensPath)
+		for path in todo:
+			finished(*_process(path, outDir, tuple(images), receptors))
+	elif todo:
+		with ProcessPoolExecutor(max_workers=workers, initializer=_initWorker, initargs=(calPath, sensPath)) as pool:
+			futures = {pool.submit(_process, path, outDir, tuple(images), receptors): path for path in todo}
+			for future in as_completed(futures):
+				try:
+					finished(*future.result())
+				except Exception as e: # the worker itself died (e.g. BrokenProcessPool)
+					finished(futures[future], None, type(e).__name__ + ": " + str(e), 0.0)
+	saveManifest(outDir, manifest)
+	result.seconds = time.time() - t0
+	return result
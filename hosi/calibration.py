@@ -0,0 +1,276 @@
+"""Calibration store: calibration_data.txt and sensitivity_data.csv parsed once into arrays by unit.
+
+The parsed arrays are kept in memory and in a compiled .npz under cacheDir, rebuilt only when a source
+file's content changes (mtime/size, then content hash). Resampled curves per unit and engines per
+(unit, boxcarN) are built once into the store's _derived dict, which load() empties when the sources
+change.
+"""
+import hashlib
+import json
+import os
+import numpy as np
+
+from hosi.engine import RadianceEngine, BANDS
+from hosi.receptors import ReceptorEngine
+
+CACHE_VERSION = 1
+
+
+class UnitCalibration:
+	"""Spectrometer calibration of one unit."""
+
+	def __init__(self, unitNumber, wavCoef, radSens, linCoefs):
+		self.unitNumber = unitNumber
+		self.wavCoef = wavCoef
+		self.radSens = radSens
+		self.linCoefs = linCoefs
+		i = np.arange(len(radSens), dtype=float)
+		c = wavCoef
+		self.wavelength = c[0]+c[1]*i+c[2]*i**2+c[3]*i**3+c[4]*i**4+c[5]*i**5
+		#---set up wavelength bin widths array-------
+		self.wavelengthBins = np.append(np.diff(self.wavelength), self.wavelength[-1]-self.wavelength[-2])
+
+	def wavelengthBoxcar(self, boxcarN):
+		"""Wavelengths matching the boxcar scale, for plotting."""
+		return self.wavelength[::boxcarN]
+
+
+class CalibrationStore:
+	"""Calibration data for every unit, keyed by unit number."""
+
+	def __init__(self, calPath="./calibration_data.txt", sensPath="./sensitivity_data.csv", cacheDir="./.hosi_cache", pixels=288):
+		self.calPath = calPath
+		self.sensPath = sensPath
+		self.cacheDir = cacheDir
+		self.pixels = pixels
+		self.problems = {} # unit -> list of validation errors
+		self._stamp = None
+		self._data = None
+		self._derived = {} # (method, unitNumber, boxcarN, baseInt) -> resampled curves/engines, cleared by load()
+
+	#------------------------ parsing ------------------------
+
+	def _parseCalibration(self):
+		rows = {}
+		for line in open(self.calPath):
+			row = line.split(',')
+			try:
+				unit = int(row[0])
+			except ValueError:
+				continue # header
+			vals = [float(v) for v in row[2:] if v.strip()]
+			rows.setdefault(unit, {})[row[1].strip()] = np.array(vals)
+		return rows
+
+	def _parseSensitivity(self):
+		base = {}
+		names = []
+		vals = []
+		for line in open(self.sensPath):
+			row = line.strip().split(',')
+			if len(row) < 3:
+				continue
+			curve = np.array([float(v) for v in row[2:] if v.strip()])
+			if row[0] == "base":
+				base[row[1]] = curve
+			else:
+				names.append(row[0] + "_" + row[1])
+				vals.append(curve)
+		return base, names, vals
+
+	def _validate(self, units, base, vals):
+		problems = {}
+		for unit, d in units.items():
+			p = []
+			for key, n in (("wavCoef", 6), ("radSens", self.pixels), ("linCoefs", 2)):
+				if key not in d:
+					p.append(key + " missing")
+				elif len(d[key]) != n:
+					p.append(key + ": " + str(len(d[key])) + " values, expected " + str(n))
+				elif not np.all(np.isfinite(d[key])):
+					p.append(key + " has non-numeric values")
+			if p:
+				problems[unit] = p
+		nWav = len(base.get("cieWav", []))
+		for name in ("cieWav",) + BANDS:
+			if name not in base:
+				problems.setdefault("sensitivity", []).append(name + " missing")
+			elif len(base[name]) != nWav:
+				problems.setdefault("sensitivity", []).append(name + ": " + str(len(base[name])) + " values, expected " + str(nWav))
+		for i, v in enumerate(vals):
+			if len(v) != nWav:
+				problems.setdefault("sensitivity", []).append("receptor row " + str(i) + ": " + str(len(v)) + " values, expected " + str(nWav))
+		return problems
+
+	def _parse(self):
+		units = self._parseCalibration()
+		base, names, vals = self._parseSensitivity()
+		problems = self._validate(units, base, vals)
+		data = {"receptorNames": np.array(names, dtype=str)}
+		nWav = len(base.get("cieWav", []))
+		data["receptorVals"] = np.array([v for v in vals if len(v) == nWav]).reshape(-1, nWav)
+		if len(data["receptorVals"]) != len(names):
+			data["receptorNames"] = np.array([n for n, v in zip(names, vals) if len(v) == nWav], dtype=str)
+		for name, curve in base.items():
+			data["base_" + name] = curve
+		for unit, d in units.items():
+			if unit in problems:
+				continue
+			for key in ("wavCoef", "radSens", "linCoefs"):
+				data["unit" + str(unit) + "_" + key] = d[key]
+		data["problems"] = np.array(json.dumps({str(k): v for k, v in problems.items()}))
+		return data
+
+	#------------------------ caching ------------------------
+
+	def _sources(self):
+		return [self.calPath, self.sensPath]
+
+	def _fileStamp(self):
+		return [[p, os.stat(p).st_mtime_ns, os.stat(p).st_size] for p in self._sources()]
+
+	def _contentHash(self):
+		h = hashlib.sha1(str(CACHE_VERSION).encode())
+		for p in self._sources():
+			with open(p, "rb") as f:
+				h.update(f.read())
+		return h.hexdigest()
+
+	def _cachePath(self):
+		return os.path.join(self.cacheDir, "calibration.npz")
+
+	def _readCache(self, stamp):
+		path = self._cachePath()
+		if not os.path.exists(path):
+			return None
+		try:
+			with np.load(path) as z:
+				meta = json.loads(str(z["meta"]))
+				if meta["version"] != CACHE_VERSION:
+					return None
+				if meta["stamp"] != stamp and meta["hash"] != self._contentHash():
+					return None # sources really changed, not just touched
+				data = {k: z[k] for k in z.files if k != "meta"}
+		except (OSError, KeyError, ValueError):
+			return None
+		if meta["stamp"] != stamp:
+			self._writeCache(data, stamp) # same content, new mtime: refresh the stamp
+		return data
+
+	def _writeCache(self, data, stamp):
+		try:
+			os.makedirs(self.cacheDir, exist_ok=True)
+			meta = {"version": CACHE_VERSION, "stamp": stamp, "hash": self._contentHash()}
+			tmp = self._cachePath() + ".tmp.npz"
+			np.savez(tmp, meta=np.array(json.dumps(meta)), **data)
+			os.replace(tmp, self._cachePath())
+		except OSError as e:
+			print("Calibration cache not written: " + str(e))
+
+	def load(self):
+		"""Parsed data, from memory, the compiled cache or the source files (in that order)."""
+		stamp = self._fileStamp()
+		if self._data is not None and stamp == self._stamp:
+			return self._data
+		data = self._readCache(stamp)
+		if data is None:
+			data = self._parse()
+			self._writeCache(data, stamp)
+		self._data = data
+		self._stamp = stamp
+		self.problems = {k: v for k, v in json.loads(str(data["problems"])).items()}
+		self._derived = {}
+		return data
+
+	#------------------------ lookups ------------------------
+
+	def units(self):
+		data = self.load()
+		return sorted(int(k[4:].split("_")[0]) for k in data if k.startswith("unit") and k.endswith("_radSens"))
+
+	def unit(self, unitNumber):
+		"""UnitCalibration for unitNumber, or None if it's missing or invalid (see problems)."""
+		data = self.load()
+		key = "unit" + str(unitNumber) + "_"
+		if key + "radSens" not in data:
+			return None
+		return UnitCalibration(unitNumber, data[key + "wavCoef"], data[key + "radSens"], data[key + "linCoefs"])
+
+	def cieWav(self):
+		return self.load().get("base_cieWav", np.zeros(0))
+
+	def curves(self):
+		"""Base sensitivity curves (chlA, nIR, cieX...) at the cieWav wavelengths."""
+		data = self.load()
+		return {k[5:]: v for k, v in data.items() if k.startswith("base_") and k != "base_cieWav"}
+
+	def receptors(self):
+		"""(names, values) of the receptor curves (species_receptor), values at the cieWav wavelengths."""
+		data = self.load()
+		return [str(n) for n in data["receptorNames"]], data["receptorVals"]
+
+	def _cached(self, key, build):
+		"""build() once per key, until load() sees changed sources"""
+		self.load()
+		if key not in self._derived:
+			self._derived[key] = build()
+		return self._derived[key]
+
+	def resampled(self, unitNumber):
+		"""(base curves dict, receptor array) linearly interpolated at the unit's pixel wavelengths."""
+		return self._cached(("resampled", unitNumber), lambda: self._resample(unitNumber))
+
+	def _resample(self, unitNumber):
+		cal = self.unit(unitNumber)
+		if cal is None:
+			return None
+		curves = self.curves()
+		names = list(curves)
+		receptorNames, receptorVals = self.receptors()
+		stacked = np.vstack([np.vstack([curves[n] for n in names]), receptorVals]) if names else receptorVals
+		out = stacked @ interpMatrix(self.cieWav(), cal.wavelength).T # every curve in one product
+		return dict(zip(names, out[:len(names)])), out[len(names):]
+
+	def weights(self, unitNumber):
+		"""Base curves resampled at the unit's pixel wavelengths."""
+		r = self.resampled(unitNumber)
+		return None if r is None else r[0]
+
+	def engine(self, unitNumber, boxcarN, baseInt=550):
+		"""RadianceEngine for a unit and boxcar size."""
+		return self._cached(("engine", unitNumber, boxcarN, baseInt), lambda: self._engine(unitNumber, boxcarN, baseInt))
+
+	def _engine(self, unitNumber, boxcarN, baseInt):
+		cal = self.unit(unitNumber)
+		if cal is None:
+			return None
+		return RadianceEngine(cal.radSens, cal.wavelengthBins, cal.linCoefs, self.weights(unitNumber), boxcarN, baseInt)
+
+	def receptorEngine(self, unitNumber, boxcarN):
+		"""ReceptorEngine for every receptor row, for a unit and boxcar size."""
+		return self._cached(("receptorEngine", unitNumber, boxcarN), lambda: self._receptorEngine(unitNumber, boxcarN))
+
+	def _receptorEngine(self, unitNumber, boxcarN):
+		cal = self.unit(unitNumber)
+		if cal is None:
+			return None
+		engine = self.engine(unitNumber, boxcarN)
+		return ReceptorEngine(self.receptors()[0], self.resampled(unitNumber)[1], cal.wavelength, cal.wavelengthBins, boxcarN, engine.order)
+
+
+def interpMatrix(cieWav, wavelength):
+	"""Linear interpolation from the cieWav grid to wavelength as a [len(wavelength), len(cieWav)] matrix.
+
+	Each row has at most two non-zero weights; wavelengths outside the grid get an all-zero row.
+	"""
+	x = np.asarray(cieWav, dtype=float)
+	w = np.asarray(wavelength, dtype=float)
+	m = np.zeros((len(w), len(x)))
+	if len(x) < 2:
+		return m
+	rows = np.flatnonzero((w >= x[0]) & (w <= x[-1]))
+	j = np.clip(np.searchsorted(x, w[rows], side="right") - 1, 0, len(x) - 2)
+	f = (w[rows] - x[j]) / (x[j+1] - x[j])
+	m[rows, j] = 1 - f
+	m[rows, j+1] += f
+	return m
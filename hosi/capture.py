@@ -0,0 +1,214 @@
+"""Raw serial capture and timed replay.
+
+CaptureSerial wraps an open port and records every chunk of bytes read from or written to it, with a
+monotonic timestamp, into a capture file. ReplaySerial plays the received bytes of a capture back as
+a port: at the recorded pace (speed 1), N times faster (speed N) or as fast as they are read (speed 0),
+so a field scan can be re-run through the GUI or python -m hosi scan without the scanner.
+
+File format: the 8-byte magic CAPTURE_MAGIC, then one record per chunk: a little-endian header
+(nanoseconds since the capture started: uint64, direction: uint8, length: uint32) and the bytes.
+"""
+import struct
+import threading
+import time
+from urllib.parse import parse_qs, unquote, urlparse
+
+from hosi.frames import FrameDecoder
+
+CAPTURE_MAGIC = b"HOSICAP1"
+RECORD = struct.Struct("<QBI")
+IN = 0 # scanner -> host
+OUT = 1 # host -> scanner
+
+
+def capturePath(folder="./captures"):
+	t = time.localtime()
+	return folder + "/" + str(t.tm_year) + "-" + str(t.tm_mon) + "-" + str(t.tm_mday) + "_" + time.strftime("%H-%M-%S", t) + ".hcap"
+
+
+class CaptureSerial:
+	"""Serial port wrapper writing every byte read and written to path; other attributes pass through"""
+
+	def __init__(self, ser, path):
+		self.ser = ser
+		self.path = path
+		self.file = open(path, "wb")
+		self.file.write(CAPTURE_MAGIC)
+		self.t0 = time.monotonic_ns()
+		self.bytesIn = 0
+		self.bytesOut = 0
+		self._lock = threading.Lock() # the reader thread reads while the GUI writes
+
+	def _record(self, direction, data):
+		if not data or self.file is None:
+			return
+		with self._lock:
+			self.file.write(RECORD.pack(time.monotonic_ns() - self.t0, direction, len(data)))
+			self.file.write(data)
+			if direction == OUT:
+				self.file.flush()
+
+	def read(self, size=1):
+		data = self.ser.read(size)
+		self.bytesIn += len(data)
+		self._record(IN, data)
+		return data
+
+	def readline(self):
+		data = self.ser.readline()
+		self.bytesIn += len(data)
+		self._record(IN, data)
+		return data
+
+	def write(self, data):
+		n = self.ser.write(data)
+		self.bytesOut += len(data)
+		self._record(OUT, bytes(data))
+		return n
+
+	def close(self):
+		self.ser.close()
+		with self._lock:
+			if self.file is not None:
+				self.file.close()
+				self.file = None
+
+	def __getattr__(self, name):
+		return getattr(self.ser, name)
+
+
+def readCapture(path):
+	"""Yield (seconds since the capture started, direction, bytes) for each record"""
+	with open(path, "rb") as f:
+		if f.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+			raise ValueError(path + " is not a serial capture")
+		while True:
+			head = f.read(RECORD.size)
+			if len(head) < RECORD.size:
+				return # end, or cut short by a crash
+			t, direction, n = RECORD.unpack(head)
+			data = f.read(n)
+			if len(data) < n:
+				return
+			yield t / 1E9, direction, data
+
+
+def captureLines(path):
+	"""The received stream of a capture as stripped, non-empty lines (binary frames as their text line)"""
+	data = b"".join(d for t, direction, d in readCapture(path) if direction == IN)
+	return [str(item) for item in FrameDecoder().feed(data + b"\n")]
+
+
+class ReplaySerial:
+	"""Serial-port stand-in playing back the received bytes of a capture.
+
+	Playback starts at the first write() (the command that started the recorded scan), lined up with
+	the first command in the capture; bytes received before it are available straight away. speed
+	scales the recorded pace (0: no waiting). Writes are otherwise ignored.
+	"""
+
+	def __init__(self, path, speed=1.0, timeout=1.0):
+		self.path = path
+		self.port = "replay://" + path
+		self.speed = speed
+		self.timeout = timeout
+		self.is_open = True
+		records = list(readCapture(path))
+		outTimes = [t for t, direction, data in records if direction == OUT]
+		self.tStart = outTimes[0] if outTimes else (records[0][0] if records else 0.0)
+		self.chunks = [(t, data) for t, direction, data in records if direction == IN]
+		self.next = 0 # index of the next chunk to release
+		self.buf = bytearray()
+		self.wall0 = None # wall time of the first write
+		self._cond = threading.Condition()
+
+	@classmethod
+	def fromUrl(cls, url, **kwargs):
+		"""ReplaySerial for a "replay:///path/to/capture.hcap?speed=4" port name"""
+		u = urlparse(url)
+		query = parse_qs(u.query)
+		if "speed" in query:
+			kwargs["speed"] = float(query["speed"][-1])
+		return cls(unquote(u.netloc + u.path), **kwargs)
+
+	def _due(self, chunkTime):
+		"""Wall time at which a chunk recorded at chunkTime is released"""
+		if chunkTime <= self.tStart:
+			return 0.0
+		if self.wall0 is None:
+			return None # not started
+		if not self.speed or self.speed <= 0:
+			return self.wall0
+		return self.wall0 + (chunkTime - self.tStart) / self.speed
+
+	def _release(self):
+		now = time.monotonic()
+		while self.next < len(self.chunks):
+			t, data = self.chunks[self.next]
+			due = self._due(t)
+			if due is None or due > now:
+				return due
+			self.buf += data
+			self.next += 1
+		return None
+
+	def write(self, data):
+		if not self.is_open:
+			raise OSError("replay port is closed")
+		with self._cond:
+			if self.wall0 is None:
+				self.wall0 = time.monotonic()
+				self._cond.notify_all()
+		return len(data)
+
+	@property
+	def in_waiting(self):
+		with self._cond:
+			self._release()
+			return len(self.buf)
+
+	@property
+	def finished(self):
+		"""All the captured bytes have been read"""
+		return self.next >= len(self.chunks) and not self.buf
+
+	def _wait(self, ready, end):
+		with self._cond:
+			while self.is_open:
+				due = self._release()
+				if ready():
+					break
+				now = time.monotonic()
+				if end is not None and now >= end:
+					break
+				wait = [w for w in (None if due is None else due - now, None if end is None else end - now) if w is not None]
+				self._cond.wait(min(wait) if wait else None)
+
+	def read(self, size=1):
+		end = None if self.timeout is None else time.monotonic() + self.timeout
+		self._wait(lambda: len(self.buf) >= size, end)
+		with self._cond:
+			data = bytes(self.buf[:size])
+			del self.buf[:size]
+		return data
+
+	def readline(self):
+		end = None if self.timeout is None else time.monotonic() + self.timeout
+		self._wait(lambda: b"\n" in self.buf, end)
+		with self._cond:
+			n = self.buf.find(b"\n") + 1 or len(self.buf)
+			data = bytes(self.buf[:n])
+			del self.buf[:n]
+		return data
+
+	def reset_input_buffer(self):
+		with self._cond:
+			self.buf.clear()
+
+	def flush(self):
+		pass
+
+	def close(self):
+		with self._cond:
+			self.is_open = False
+			self._cond.notify_all()
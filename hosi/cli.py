@@ -0,0 +1,230 @@
+"""Headless scanning and processing: python -m hosi scan|process|batch ...
+
+Uses the same processing code as GUI.py (hosi.scan.ScanProcessor) without importing tkinter or
+matplotlib, so it runs on machines without a display.
+"""
+import argparse
+import os
+import sys
+import time
+
+from hosi.calibration import CalibrationStore
+from hosi.capture import CaptureSerial, ReplaySerial
+from hosi.commands import negotiate
+from hosi.frames import negotiateFrames
+from hosi.journal import ScanJournal
+from hosi.receptors import exportReceptors
+from hosi.scan import ScanProcessor, scanCommand, scanPath, degreesToSteps
+from hosi.scanfile import iterRawLines
+from hosi.seriallog import SerialLog
+
+IMAGES = ("sRGB", "IGU", "NDVI")
+
+
+def openPort(port, baudrate=115200):
+	if port.startswith("sim://"):
+		from hosi.simulator import SimulatedScanner
+		return SimulatedScanner.fromUrl(port, timeout=1)
+	if port.startswith("replay://"):
+		return ReplaySerial.fromUrl(port, timeout=1)
+	import serial # only needed for scanning
+	return serial.Serial(port, baudrate, timeout=1)
+
+
+def runScan(args, ser=None):
+	"""Run one scan on the scanner at args.port (or the open port ser), writing the outputs as it finishes"""
+	from hosi.serialio import SerialReader
+	os.makedirs(args.out, exist_ok=True)
+	base = scanPath(args.label, args.out)
+	store = CalibrationStore(args.calibration, args.sensitivity)
+	scan = ScanProcessor(store, not args.no_dark_interp)
+	scan.keepRaw = True
+	scan.darkFolder = None if args.no_dark_library else args.darks
+
+	pan = [degreesToSteps(min(max(v, -90), 90)) for v in args.pan]
+	tilt = [degreesToSteps(min(max(v, -90), 90)) for v in args.tilt]
+	if(pan[1] <= pan[0] or tilt[1] <= tilt[0]):
+		print("Invalid pan/tilt", file=sys.stderr)
+		return 2
+	cmd = scanCommand(pan[0], pan[1], degreesToSteps(args.pan_res), tilt[0], tilt[1], degreesToSteps(args.tilt_res), args.max_int, args.boxcar, args.dark_rep)
+
+	if ser is None:
+		ser = openPort(args.port, args.baud)
+		if not args.port.startswith(("sim://", "replay://")):
+			time.sleep(args.settle) # the Arduino resets when the port opens
+		if args.capture:
+			ser = CaptureSerial(ser, args.capture)
+	terminator = ""
+	if not args.port.startswith("replay://") and not args.legacy_commands and negotiate(ser):
+		terminator = "\n" # newline-terminated commands, read without the firmware's 1 s wait
+		if args.binary and not negotiateFrames(ser, terminator):
+			print("Scanner firmware without binary frames, spectra are sent as text", file=sys.stderr)
+	journal = ScanJournal(base + ".journal")
+	serialLog = SerialLog().configure(args.serial_log, args.serial_log_file)
+	reader = SerialReader(ser)
+	reader.start()
+	serialLog.log(cmd, "OUT")
+	ser.write((cmd + terminator).encode())
+	t0 = time.time()
+	lastReport = 0
+	done = False
+	stopped = False
+	try:
+		while not done:
+			for line in reader.drain(500, 0.05):
+				serialLog.log(line, "IN")
+				journal.append(str(line)) # binary frames are journalled as their text line
+				event = scan.feed(line)
+				if event == "done":
+					done = True
+					break
+				if event == "header" and scan.engine is None:
+					print("No calibration data for unit #" + str(scan.unitNumber), file=sys.stderr)
+			if reader.error is not None:
+				print("Serial error: " + str(reader.error), file=sys.stderr)
+				serialLog.error("serial error: " + str(reader.error))
+				break
+			if not done:
+				if time.time() - lastReport > args.report and scan.progress:
+					lastReport = time.time()
+					print(scan.progress, flush=True)
+				time.sleep(0.01)
+	except KeyboardInterrupt:
+		serialLog.log("stop", "OUT")
+		ser.write(("stop" + terminator).encode())
+		stopped = True
+	reader.stop()
+	print("Serial reader: " + str(reader.stats()))
+	if scan.parser.rejected > 0:
+		print("Rejected " + str(scan.parser.rejected) + " malformed measurement lines", file=sys.stderr)
+	if args.capture:
+		ser.close()
+		print("Capture: " + args.capture)
+
+	if not done or stopped:
+		journal.close()
+		print("Scan incomplete, journal kept: " + journal.path, file=sys.stderr)
+		print("Recent serial traffic: " + serialLog.dump(base + "_serial.log"), file=sys.stderr)
+		serialLog.close()
+		return 1
+	journal.close()
+	serialLog.close()
+	rawText = "".join(line + "\n" for line in iterRawLines(journal.path)) if args.csv else ""
+	paths = scan.save(base, rawText, args.label, csv=args.csv, images=args.images)
+	scan.saveDarks()
+	os.remove(journal.path)
+	print("Scan took " + str(round(time.time()-t0, 1)) + " s")
+	for p in paths:
+		print(p)
+	return 0
+
+
+def processFile(path, store, images=IMAGES, outDir=None, csv=False, receptors=False):
+	"""Re-process the raw stream of a saved scan (.csv or .journal) with the current calibration; returns the output paths"""
+	scan = ScanProcessor(store)
+	scan.keepRaw = True
+	lines = []
+	for line in iterRawLines(path):
+		if csv:
+			lines.append(line)
+		if scan.feed(line) == "done":
+			break
+	else:
+		scan.finish() # partial scan without the end marker
+	if not scan.hasCube():
+		raise ValueError(path + " has no scan data")
+	if scan.parser.rejected > 0:
+		print(path + ": rejected " + str(scan.parser.rejected) + " malformed measurement lines", file=sys.stderr)
+	base = os.path.splitext(path)[0]
+	if outDir is not None:
+		os.makedirs(outDir, exist_ok=True)
+		base = os.path.join(outDir, os.path.basename(base))
+	rawText = "".join(line + "\n" for line in lines) if csv else ""
+	label = os.path.basename(base)
+	if csv and outDir is None:
+		base += "_reprocessed"
+	paths = scan.save(base, rawText, label, csv=csv, images=images)
+	if receptors:
+		recEngine = store.receptorEngine(scan.unitNumber, scan.boxcarN)
+		if recEngine is not None and len(recEngine.names) > 0:
+			paths += exportReceptors(base, recEngine, scan.hspec)
+	return paths
+
+
+def runProcess(args):
+	store = CalibrationStore(args.calibration, args.sensitivity)
+	failed = 0
+	for path in args.files:
+		t0 = time.time()
+		try:
+			paths = processFile(path, store, args.images, args.out, args.csv, args.receptors)
+		except (OSError, ValueError) as e:
+			print(path + ": " + str(e), file=sys.stderr)
+			failed += 1
+			continue
+		print(path + " -> " + ", ".join(paths) + " (" + str(round(time.time()-t0, 2)) + " s)")
+	return 1 if failed else 0
+
+
+def runBatchCommand(args):
+	from hosi.batch import runBatch
+	result = runBatch(args.folder, args.out, args.workers, args.images, not args.no_receptors,
+		args.calibration, args.sensitivity, args.force)
+	print(str(len(result.done)) + " processed, " + str(len(result.skipped)) + " skipped, " + str(len(result.failed)) + " failed in " + str(round(result.seconds, 1)) + " s")
+	if result.done:
+		print("per scan: " + str(round(sum(result.done.values())/len(result.done), 2)) + " s mean, " + str(round(max(result.done.values()), 2)) + " s max")
+	return 1 if result.failed else 0
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(prog="python -m hosi", description="HOSI scanner without the GUI")
+	parser.add_argument("--calibration", default="./calibration_data.txt")
+	parser.add_argument("--sensitivity", default="./sensitivity_data.csv")
+	sub = parser.add_subparsers(dest="command", required=True)
+
+	p = sub.add_parser("scan", help="run a scan and save the cube (.npz) and preview images")
+	p.add_argument("--port", required=True, help="serial port, sim://?speed=N for the simulated scanner or replay://CAPTURE?speed=N to replay a capture (speed 0: unthrottled)")
+	p.add_argument("--capture", default=None, help="record the raw serial stream to this file")
+	p.add_argument("--legacy-commands", action="store_true", help="don't ask for newline-terminated commands")
+	p.add_argument("--binary", action="store_true", help="ask for binary spectrum frames (needs terminated commands)")
+	p.add_argument("--serial-log", default="WARNING", choices=("DEBUG", "INFO", "WARNING", "ERROR"), help="serial traffic on the console: INFO for commands, replies and spectrum summaries, DEBUG for full spectra")
+	p.add_argument("--serial-log-file", default=None, help="also log serial traffic (all levels) to this file, from a background thread")
+	p.add_argument("--baud", type=int, default=115200)
+	p.add_argument("--pan", type=float, nargs=2, default=[-45, 45], metavar=("LEFT", "RIGHT"), help="degrees")
+	p.add_argument("--tilt", type=float, nargs=2, default=[-45, 45], metavar=("BOTTOM", "TOP"), help="degrees")
+	p.add_argument("--pan-res", type=float, default=1.0, help="degrees")
+	p.add_argument("--tilt-res", type=float, default=1.0, help="degrees")
+	p.add_argument("--max-int", type=int, default=2000, help="maximum integration time, ms")
+	p.add_argument("--boxcar", type=int, default=2)
+	p.add_argument("--dark-rep", type=int, default=120, help="seconds between dark measurements")
+	p.add_argument("--label", default="")
+	p.add_argument("--out", default="./scans")
+	p.add_argument("--csv", action="store_true", help="also write the CSV the GUI saves")
+	p.add_argument("--images", nargs="*", default=list(IMAGES), choices=IMAGES + ("Sat",))
+	p.add_argument("--darks", default="./darks", help="dark library folder")
+	p.add_argument("--no-dark-library", action="store_true")
+	p.add_argument("--no-dark-interp", action="store_true")
+	p.add_argument("--settle", type=float, default=2.0, help="seconds to wait after opening the port")
+	p.add_argument("--report", type=float, default=5.0, help="seconds between progress lines")
+
+	p = sub.add_parser("process", help="re-process saved scans (.csv/.journal) with the current calibration")
+	p.add_argument("files", nargs="+")
+	p.add_argument("--out", default=None, help="output folder (default: next to each scan)")
+	p.add_argument("--csv", action="store_true", help="also write a CSV with the recomputed le values")
+	p.add_argument("--images", nargs="*", default=list(IMAGES), choices=IMAGES + ("Sat",))
+	p.add_argument("--receptors", action="store_true", help="also write the receptor (cone-catch) images")
+
+	p = sub.add_parser("batch", help="re-process every scan in a folder on several processes, skipping up-to-date ones")
+	p.add_argument("folder", nargs="?", default="./scans")
+	p.add_argument("--out", default=None, help="output folder (default: FOLDER/reprocessed)")
+	p.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+	p.add_argument("--images", nargs="*", default=list(IMAGES), choices=IMAGES + ("Sat",))
+	p.add_argument("--no-receptors", action="store_true", help="skip the receptor images")
+	p.add_argument("--force", action="store_true", help="re-process scans the manifest says are up to date")
+
+	args = parser.parse_args(argv)
+	if args.command == "scan":
+		return runScan(args)
+	if args.command == "batch":
+		return runBatchCommand(args)
+	return runProcess(args)
@@ -0,0 +1,117 @@
+"""Asynchronous scanner commands: one future per command, completed by the matching reply.
+
+Also the negotiation of newline-terminated commands: "newline\n" is answered "newline:1" by firmware
+that supports them, after which commands end with "\n" and are acted on without the 1 s readString
+wait. Older firmware ignores it (no command starts with "n") and the request times out.
+"""
+import time
+from collections import deque
+from concurrent.futures import Future
+
+
+class CommandTimeout(Exception):
+	pass
+
+
+class CommandError(Exception):
+	pass
+
+
+class Command:
+	def __init__(self, text, reply, timeout):
+		self.text = text
+		self.reply = reply # prefix (or tuple of prefixes) of the line completing the command, None: done once written
+		self.timeout = timeout
+		self.deadline = None # set when written
+		self.sentAt = None
+		self.future = Future()
+
+
+class CommandChannel:
+	"""Queues commands to the scanner and routes the replies back to them.
+
+	send() returns a concurrent.futures.Future that gets the reply line, or a CommandTimeout if no
+	reply arrived within the command's timeout, or a CommandError if it couldn't be written. The
+	firmware handles one command at a time, so the next queued command is written as soon as the one
+	before it is answered (or, with maxInFlight > 1, straight away for firmware that reads commands
+	line by line). feed() is given every received line and poll() checks the deadlines; both are
+	meant to run on one thread (the GUI's), where the futures' callbacks then also run.
+	"""
+
+	def __init__(self, write, maxInFlight=1, clock=time.monotonic):
+		self.write = write # write(text) -> False if it failed, adds the terminator if there is one
+		self.maxInFlight = maxInFlight
+		self.clock = clock
+		self.queued = deque()
+		self.inFlight = deque()
+		self.sent = 0
+		self.timeouts = 0
+
+	def send(self, text, reply=None, timeout=10.0):
+		cmd = Command(text, reply, timeout)
+		self.queued.append(cmd)
+		self._writeQueued()
+		return cmd.future
+
+	def pending(self):
+		return len(self.queued) + len(self.inFlight)
+
+	def feed(self, line):
+		"""Complete the oldest command waiting for this reply; returns True if the line was one"""
+		for cmd in self.inFlight:
+			if cmd.reply is not None and line.startswith(cmd.reply):
+				self.inFlight.remove(cmd)
+				cmd.future.set_result(line)
+				self._writeQueued()
+				return True
+		return False
+
+	def poll(self):
+		"""Fail the commands whose deadline has passed"""
+		now = self.clock()
+		expired = [cmd for cmd in self.inFlight if cmd.deadline is not None and now > cmd.deadline]
+		for cmd in expired:
+			self.inFlight.remove(cmd)
+			self.timeouts += 1
+			cmd.future.set_exception(CommandTimeout("no reply to " + repr(cmd.text) + " within " + str(cmd.timeout) + " s"))
+		if expired:
+			self._writeQueued()
+
+	def cancelAll(self, reason="cancelled"):
+		for cmd in list(self.inFlight) + list(self.queued):
+			if not cmd.future.done():
+				cmd.future.set_exception(CommandError(reason))
+		self.inFlight.clear()
+		self.queued.clear()
+
+	def _writeQueued(self):
+		while self.queued and len(self.inFlight) < self.maxInFlight:
+			cmd = self.queued.popleft()
+			if not self.write(cmd.text):
+				cmd.future.set_exception(CommandError("could not write " + repr(cmd.text)))
+				continue
+			self.sent += 1
+			cmd.sentAt = self.clock()
+			if cmd.reply is None:
+				cmd.future.set_result(None)
+				continue
+			cmd.deadline = cmd.sentAt + cmd.timeout
+			self.inFlight.append(cmd)
+
+
+TERM_COMMAND = "newline\n" # switches the firmware to newline-terminated commands
+TERM_REPLY = "newline:"
+
+
+def negotiate(ser, timeout=3.0):
+	"""Ask the scanner for newline-terminated commands; True if it agreed (call before other reads).
+
+	Older firmware doesn't answer, so it costs the whole timeout there.
+	"""
+	ser.write(TERM_COMMAND.encode())
+	end = time.monotonic() + timeout
+	while time.monotonic() < end:
+		line = ser.readline().decode("utf-8", "replace").strip()
+		if line.startswith(TERM_REPLY):
+			return line == TERM_REPLY + "1"
+	return False
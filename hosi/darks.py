@@ -0,0 +1,175 @@
+"""Dark-frame library keyed by integration time."""
+import os
+import time
+from collections import deque
+import numpy as np
+
+
+class DarkLibrary:
+	"""Latest dark frame for each integration time, plus a timestamped history per exposure.
+
+	Frames are stored as float arrays of boxcar-summed counts, so a light frame finds its dark with
+	one dict lookup. One library holds frames of a single length (i.e. one boxcar setting).
+	"""
+
+	def __init__(self, historyLength=64):
+		self.historyLength = historyLength
+		self.current = {} # intTime -> counts
+		self.history = {} # intTime -> deque of (timestamp, counts)
+
+	def add(self, intTime, counts, stamp=None):
+		counts = np.array(counts, dtype=float)
+		if stamp is None:
+			stamp = time.time()
+		self.current[intTime] = counts
+		if intTime not in self.history:
+			self.history[intTime] = deque(maxlen=self.historyLength)
+		self.history[intTime].append((stamp, counts))
+		return counts
+
+	def get(self, intTime):
+		"""Dark frame for intTime, or None if that exposure has never been measured."""
+		return self.current.get(intTime)
+
+	def latest(self, intTime):
+		"""(timestamp, counts) of the latest dark frame for intTime, or None"""
+		h = self.history.get(intTime)
+		return h[-1] if h else None
+
+	def __contains__(self, intTime):
+		return intTime in self.current
+
+	def __len__(self):
+		return len(self.current)
+
+	def drift(self, intTime):
+		"""Least-squares drift of the mean dark level for intTime, in counts per hour (0 if unknown)."""
+		h = self.history.get(intTime)
+		if h is None or len(h) < 2:
+			return 0.0
+		t = np.array([s for s, v in h])
+		m = np.array([v.mean() for s, v in h])
+		if np.ptp(t) == 0:
+			return 0.0
+		return float(np.polyfit((t - t[0]) / 3600.0, m, 1)[0])
+
+	def save(self, path):
+		"""Write the history (which includes the current frames) to an .npz file."""
+		folder = os.path.dirname(path)
+		if folder:
+			os.makedirs(folder, exist_ok=True)
+		arrays = {}
+		for intTime, h in self.history.items():
+			arrays["t" + str(intTime)] = np.array([s for s, v in h])
+			arrays["v" + str(intTime)] = np.vstack([v for s, v in h])
+		np.savez(path, **arrays)
+
+	def load(self, path, length=None):
+		"""Merge a saved history into the library; frames of a different length are ignored."""
+		if not os.path.exists(path):
+			return
+		with np.load(path) as z:
+			for key in z.files:
+				if not key.startswith("t"):
+					continue
+				intTime = int(key[1:])
+				stamps = z[key]
+				vals = z["v" + key[1:]]
+				if length is not None and vals.shape[1] != length:
+					continue
+				for stamp, counts in sorted(zip(stamps, vals), key=lambda sv: sv[0]):
+					self.add(intTime, counts, float(stamp))
+
+
+def libraryPath(unitNumber, boxcarN, folder="./darks"):
+	"""Per-unit, per-boxcar file the GUI persists its dark library to."""
+	return os.path.join(folder, "unit" + str(unitNumber) + "_boxcar" + str(boxcarN) + ".npz")
+
+
+class DarkModel:
+	"""Interpolates dark frames between the dark sets measured before and after each light frame.
+
+	This approximates interpolation in time with the position in the measurement stream: stamps are
+	frame counters, since the stream carries no timestamps and a re-loaded file must give the same
+	result as the live scan. Frames take different times (integration time, motor moves), so the
+	weights are only as good as the frame rate is even between two dark sets.
+
+	A light frame is given the latest dark straight away (for the live preview) and kept pending; once
+	the next dark set is complete, addLight()/finish() hand back every pending frame with its dark
+	linearly interpolated, per integration time, between the two sets. Frames with no later dark set
+	for their exposure (e.g. a scan with a single set) keep the provisional dark, and frames with no
+	earlier one have none (unless seed() supplied one from the library).
+	"""
+
+	def __init__(self, library=None, interpolate=True):
+		self.library = library if library is not None else DarkLibrary()
+		self.interpolate = interpolate
+		self.before = {} # intTime -> (stamp, counts) from the dark sets so far
+		self.after = {} # the dark set being measured now
+		self.pending = [] # (stamp, intTime, (stamp, counts) before, item)
+		self.inDark = False
+
+	def addDark(self, stamp, intTime, counts):
+		if not self.inDark:
+			self.inDark = True
+			self.after = {}
+		counts = self.library.add(intTime, counts)
+		self.after[intTime] = (stamp, counts)
+		return counts
+
+	def addLight(self, stamp, intTime, item=None):
+		"""Return (dark, finalised) for a light frame.
+
+		dark is the latest dark for intTime (None if there is none), finalised a list of (item, dark)
+		for earlier light frames whose following dark set has just been completed.
+		"""
+		finalised = self._closeSet() if self.inDark else []
+		prev = self.before.get(intTime)
+		if prev is None:
+			return None, finalised
+		if self.interpolate:
+			self.pending.append((stamp, intTime, prev, item))
+		return prev[1], finalised
+
+	def seed(self, maxAge=3600.0, maxDrift=2.0, now=None):
+		"""Start from the library's darks (e.g. loaded from earlier scans); returns how many were used.
+
+		A library frame stands in for a dark set measured at the start of the stream, so the first light
+		frames have a dark before them, if it is at most maxAge seconds old and its drift over that age
+		(DarkLibrary.drift) is at most maxDrift counts; older or drifting exposures are left out.
+		"""
+		now = time.time() if now is None else now
+		used = 0
+		for intTime in list(self.library.current):
+			stamp, counts = self.library.latest(intTime)
+			age = now - stamp
+			if age > maxAge or abs(self.library.drift(intTime)) * age / 3600.0 > maxDrift:
+				continue
+			self.before[intTime] = (0, counts)
+			used += 1
+		return used
+
+	def discard(self, drop):
+		"""Forget the pending light frames whose item drop(item) is true (they won't be finalised)"""
+		self.pending = [p for p in self.pending if not drop(p[3])]
+
+	def finish(self):
+		"""End of stream: finalise pending frames if a dark set followed them."""
+		finalised = self._closeSet() if self.inDark else []
+		self.pending = []
+		return finalised
+
+	def _closeSet(self):
+		self.inDark = False
+		finalised = []
+		for stamp, intTime, (s0, d0), item in self.pending:
+			nxt = self.after.get(intTime)
+			if nxt is None or nxt[0] == s0:
+				continue # no later dark for this exposure, the provisional one stands
+			s1, d1 = nxt
+			w = (stamp - s0) / (s1 - s0)
+			finalised.append((item, d0 + (d1 - d0) * w))
+		self.pending = []
+		self.before.update(self.after)
+		self.after = {}
+		return finalised
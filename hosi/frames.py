@@ -0,0 +1,144 @@
+"""Binary spectrum frames, the opt-in alternative to the firmware's ASCII CSV lines.
+
+After the "bin" command (reply "bin:1") the firmware sends each measurement as a frame instead of
+a "pan,tilt,darkLight,intTime,satN,counts..." line; all other output stays text. Frame layout,
+little-endian:
+
+    sync      2 bytes  0xA5 0x5A
+    flags     uint8    bit 0: counts are uint32 (otherwise uint16)
+    pan       int32
+    tilt      int32
+    darkLight uint8
+    intTime   uint32   microseconds
+    satN      uint16
+    length    uint16   number of counts
+    counts    length x uint16/uint32
+    crc       uint16   CRC-16/CCITT-FALSE of everything after the sync bytes
+
+Text never contains the sync bytes, so FrameDecoder can split a mixed stream into text lines and
+frames, resynchronising after a corrupted frame.
+"""
+import binascii
+import struct
+import time
+import numpy as np
+
+SYNC = b"\xA5\x5A"
+HEADER = struct.Struct("<2sBiiBIHH")
+CRC = struct.Struct("<H")
+FLAG_U32 = 0x01
+MAX_COUNTS = 288
+BIN_COMMAND = "bin" # switches the firmware to binary frames ("ascii" switches back)
+BIN_REPLY = "bin:" # "bin:1"; firmware without frames ignores the command
+
+
+def crc16(data):
+	"""CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF), as computed by the firmware"""
+	return binascii.crc_hqx(data, 0xFFFF)
+
+
+class Frame:
+	"""One decoded measurement; str() gives the equivalent ASCII line (for the journal and CSV)"""
+	__slots__ = ("pan", "tilt", "darkLight", "intTime", "satN", "counts")
+
+	def __init__(self, pan, tilt, darkLight, intTime, satN, counts):
+		self.pan = pan
+		self.tilt = tilt
+		self.darkLight = darkLight
+		self.intTime = intTime
+		self.satN = satN
+		self.counts = counts # read-only integer array
+
+	def row(self):
+		"""The frame as the int32 row stored in scan archives"""
+		out = np.empty(len(self.counts) + 5, dtype=np.int32)
+		out[:5] = (self.pan, self.tilt, self.darkLight, self.intTime, self.satN)
+		out[5:] = self.counts
+		return out
+
+	def __str__(self):
+		return str(self.pan) + "," + str(self.tilt) + "," + str(self.darkLight) + "," + str(self.intTime) + "," + str(self.satN) + "," + ",".join(map(str, self.counts.tolist()))
+
+
+def encodeFrame(pan, tilt, darkLight, intTime, satN, counts, wide=None):
+	"""Frame bytes as sent by the firmware; wide: uint32 counts (default: only if they don't fit in uint16)"""
+	counts = np.asarray(counts)
+	if wide is None:
+		wide = len(counts) > 0 and int(counts.max()) > 0xFFFF
+	body = HEADER.pack(SYNC, FLAG_U32 if wide else 0, pan, tilt, darkLight, intTime, satN, len(counts))[2:]
+	body += counts.astype("<u4" if wide else "<u2").tobytes()
+	return SYNC + body + CRC.pack(crc16(body))
+
+
+class FrameDecoder:
+	"""Splits received bytes into text lines (stripped, non-empty) and Frames"""
+
+	def __init__(self):
+		self.buf = bytearray()
+		self.frames = 0
+		self.badFrames = 0 # CRC failures and impossible headers
+		self.discard = False # drop the text up to the next newline/sync (the rest of a bad frame)
+
+	def _text(self, out, data):
+		if self.discard:
+			self.discard = False
+			return
+		line = data.decode("utf-8", "replace").strip()
+		if line:
+			out.append(line)
+
+	def feed(self, data):
+		"""Add received bytes; returns the complete lines and frames, in order"""
+		buf = self.buf
+		buf += data
+		out = []
+		start = 0
+		while True:
+			sync = buf.find(SYNC, start)
+			end = buf.find(b"\n", start, sync if sync >= 0 else len(buf))
+			if end >= 0:
+				self._text(out, buf[start:end])
+				start = end + 1
+				continue
+			if sync < 0:
+				break # partial text line
+			if sync > start: # unterminated text before a frame
+				self._text(out, buf[start:sync])
+			self.discard = False
+			start = sync
+			if len(buf) - start < HEADER.size:
+				break
+			_, flags, pan, tilt, darkLight, intTime, satN, length = HEADER.unpack_from(buf, start)
+			width = 4 if flags & FLAG_U32 else 2
+			if length > MAX_COUNTS or flags & ~FLAG_U32:
+				self.badFrames += 1
+				self.discard = True # not a frame header: skip to the next sync or newline
+				start += 2
+				continue
+			size = HEADER.size + length * width + CRC.size
+			if len(buf) - start < size:
+				break
+			body = bytes(buf[start + 2:start + size - CRC.size])
+			if crc16(body) != CRC.unpack_from(buf, start + size - CRC.size)[0]:
+				if len(buf) - start == size:
+					break # wait for one more byte, a resync could start on the last one
+				self.badFrames += 1
+				resync = buf.find(SYNC, start + 2, start + size + 1) # a frame cut short by lost bytes ends early
+				start = resync if resync >= 0 else start + size
+				continue
+			counts = np.frombuffer(body, dtype="<u4" if width == 4 else "<u2", count=length, offset=HEADER.size - 2)
+			out.append(Frame(pan, tilt, darkLight, intTime, satN, counts))
+			self.frames += 1
+			start += size
+		del buf[:start]
+		return out
+
+def negotiateFrames(ser, terminator="\n", timeout=3.0):
+	"""Ask the scanner for binary frames; True if it agreed (after hosi.commands.negotiate)"""
+	ser.write((BIN_COMMAND + terminator).encode())
+	end = time.monotonic() + timeout
+	while time.monotonic() < end:
+		line = ser.readline().decode("utf-8", "replace").strip()
+		if line.startswith(BIN_REPLY):
+			return line == "bin:1"
+	return False
@@ -0,0 +1,69 @@
+"""Append-only journal of the raw scan stream, so interrupted scans can be recovered."""
+import os
+import time
+
+from hosi.scanfile import iterRawLines, rowPans, rowTilts
+
+RESUME_MARKER = "resume" # written before the h echo of a resumed scan
+
+
+class ScanJournal:
+	"""Appends every received line to disk as it arrives.
+
+	Each line is flushed to the OS straight away (so a crash of the GUI loses nothing) and the
+	file is fsync'd at most every syncInterval seconds (so a power cut loses at most that much).
+	"""
+
+	def __init__(self, path, syncInterval=5.0):
+		self.path = path
+		self.syncInterval = syncInterval
+		self.lines = 0
+		self._f = open(path, "a")
+		self._lastSync = time.monotonic()
+
+	def append(self, line):
+		self._f.write(line + "\n")
+		self._f.flush()
+		self.lines += 1
+		if time.monotonic() - self._lastSync > self.syncInterval:
+			self.sync()
+
+	def sync(self):
+		self._f.flush()
+		os.fsync(self._f.fileno())
+		self._lastSync = time.monotonic()
+
+	def close(self, remove=False):
+		"""Close the journal; remove=True deletes it once the scan has been saved elsewhere."""
+		if self._f.closed:
+			return
+		self.sync()
+		self._f.close()
+		if remove:
+			os.remove(self.path)
+
+
+def resumePoint(path):
+	"""Return (header, tilt) to resume an interrupted scan from, or None if it has nothing left to do.
+
+	header is the first "h," echo in the journal; tilt is the first row (in scan order) that doesn't
+	have a light measurement at every pan position the firmware would visit.
+	"""
+	header = None
+	done = set()
+	for line in iterRawLines(path):
+		row = line.split(",", 5)
+		if row[0] == "h":
+			if header is None:
+				header = [int(float(v)) for v in line.split(",")[1:] if v.strip()]
+		elif len(row) == 6 and row[2] == "1":
+			try:
+				done.add((int(row[0]), int(row[1])))
+			except ValueError:
+				pass
+	if header is None or len(header) < 9:
+		return None
+	for tilt in rowTilts(header):
+		if any((pan, tilt) not in done for pan in rowPans(header, tilt)):
+			return header, tilt
+	return None
@@ -0,0 +1,75 @@
+"""Single-pass parsing of the scanner's measurement lines into pooled NumPy rows.
+
+A "pan,tilt,darkLight,intTime,satN,counts..." line is converted once, in C, by np.fromstring, instead
+of splitting it into a few hundred Python strings and converting the header fields and counts
+separately. The counts are copied into a float row from a RowPool, which ScanProcessor hands back
+once the frame is no longer needed (straight away for darks, after its dark set for lights), so a
+scan reuses a handful of rows rather than allocating one per frame.
+"""
+import numpy as np
+
+FRAME_START = "-0123456789" # first character of a measurement line; text replies start with a letter
+
+
+class RowPool:
+	"""Free list of float rows of one length"""
+
+	def __init__(self, length):
+		self.length = length
+		self.free = []
+		self.allocated = 0
+
+	def get(self):
+		if self.free:
+			return self.free.pop()
+		self.allocated += 1
+		return np.empty(self.length)
+
+	def put(self, row):
+		"""Return a row to the pool; rows of another length or type (or views) are left to the GC"""
+		if isinstance(row, np.ndarray) and row.dtype == np.float64 and row.shape == (self.length,) and row.base is None:
+			self.free.append(row)
+
+
+class LineParser:
+	"""Parses the measurement lines of a scan with length counts per frame.
+
+	parse() returns (pan, tilt, darkLight, intTime, satN, row), the counts in a row from pool, or None.
+	Text lines (status replies, "h,"/"x") are None without being counted; lines that start like a
+	measurement but have the wrong number of values, a non-integer field or an unknown darkLight are
+	counted in rejected.
+	"""
+
+	def __init__(self, length):
+		self.length = length
+		self.nValues = length + 5
+		self.pool = RowPool(length)
+		self.values = None # int64 values of the last parsed line (for the raw frames)
+		self.parsed = 0
+		self.rejected = 0
+
+	def parse(self, line):
+		if not line or line[0] not in FRAME_START:
+			return None
+		if line.count(",") != self.nValues - 1:
+			self.rejected += 1
+			return None
+		try:
+			values = np.fromstring(line, dtype=np.int64, sep=",") # stops at a malformed value
+		except ValueError:
+			values = None
+		if values is None or len(values) != self.nValues:
+			self.rejected += 1
+			return None
+		pan, tilt, darkLight, intTime, satN = values[:5].tolist()
+		if darkLight not in (0, 1, 2):
+			self.rejected += 1
+			return None
+		row = self.pool.get()
+		np.copyto(row, values[5:])
+		self.values = values
+		self.parsed += 1
+		return pan, tilt, darkLight, intTime, satN, row
+
+	def release(self, row):
+		self.pool.put(row)
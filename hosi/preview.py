@@ -0,0 +1,125 @@
+"""Preview compositing: the tone-mapped 8-bit RGB image shown in the GUI's plot panel."""
+import numpy as np
+
+GAMMA = 0.42 # non-linearise with power function
+
+# planes used by each preview mode (0/1 RGB, 2 saturation, 3 IGU, 4 NDVI)
+MODE_PLANES = {0: ("imR", "imG", "imB"), 1: ("imR", "imG", "imB"), 2: ("imR", "imG", "imB", "imSatR", "imSatB"), 3: ("imI", "imGG", "imU"), 4: ("imChlA", "imChlB")}
+
+
+class PreviewRenderer:
+	"""Keeps the uint8 preview buffer between frames and only recomputes what changed.
+
+	Pixels written since the last frame are registered with markDirty(); if nothing else changed
+	(mode, white balance, brightness or the image arrays themselves) only those pixels are re-mapped.
+	Otherwise the whole image goes through the same maths in place, in preallocated scratch arrays, so
+	the output is identical to the straightforward float pipeline.
+
+	The normalisation maxima grow with almost every frame of a live scan, so they are not part of the
+	key: pixels are re-mapped with the maxima of the last full render until a maximum has grown by
+	more than maxGrowth (or shrunk), which then triggers a full render. In between, pixels brighter
+	than the old maximum clip at 255 (by at most (1+maxGrowth)**GAMMA); invalidate() before a render
+	that has to be exact, e.g. at the end of a scan.
+	"""
+
+	def __init__(self, maxGrowth=0.1):
+		self.buf = None # [rows, cols, 3] uint8
+		self.key = None
+		self.maxGrowth = maxGrowth
+		self.scale = None # (maxRGB, maxIGU) of the last full render
+		self.scratch = None
+		self.dirty = []
+		self.fullRenders = 0
+		self.partialRenders = 0
+
+	def markDirty(self, rows, cols):
+		"""Register preview pixels (image rows, i.e. already flipped) that have new values."""
+		rows, cols = np.broadcast_arrays(np.ravel(rows), np.ravel(cols))
+		self.dirty.append((rows, cols))
+
+	def invalidate(self):
+		self.key = None
+
+	def render(self, preview, planes, maxRGB, maxIGU, wb, brightness):
+		"""Return the uint8 RGB preview for mode preview.
+
+		planes maps image names (imR, imSatR, imChlA...) to 2D arrays, wb holds the white balance
+		factors (wbR, wbG, wbB, wbI, wbGG, wbU) and brightness the slider percentage.
+		"""
+		names = MODE_PLANES[preview]
+		ims = [planes[n] for n in names]
+		br = 100/brightness
+		shape = np.shape(ims[0])
+		key = (preview, shape, tuple(id(im) for im in ims), tuple(wb), br)
+		if self.buf is not None and key == self.key and self._scaleHolds(maxRGB, maxIGU):
+			if self.dirty:
+				rows = np.concatenate([r for r, c in self.dirty])
+				cols = np.concatenate([c for r, c in self.dirty])
+				out = np.empty((3, len(rows)))
+				compose(preview, [im[rows, cols] for im in ims], self.scale[0], self.scale[1], wb, br, out, np.empty(len(rows)))
+				for ch in range(3):
+					self.buf[rows, cols, ch] = out[ch].astype(np.uint8)
+				self.partialRenders += 1
+		else:
+			if self.buf is None or self.buf.shape[:2] != shape:
+				self.buf = np.zeros(shape + (3,), dtype=np.uint8)
+				self.scratch = (np.empty((3,) + shape), np.empty(shape))
+			out, tmp = self.scratch
+			compose(preview, ims, maxRGB, maxIGU, wb, br, out, tmp)
+			for ch in range(3):
+				np.copyto(self.buf[:, :, ch], out[ch], casting="unsafe")
+			self.key = key
+			self.scale = (maxRGB, maxIGU)
+			self.fullRenders += 1
+		self.dirty = []
+		return self.buf
+
+	def _scaleHolds(self, maxRGB, maxIGU):
+		"""The maxima of the last full render still do for maxRGB, maxIGU"""
+		return all(old <= new <= old * (1 + self.maxGrowth) for old, new in zip(self.scale, (maxRGB, maxIGU)))
+
+
+def tone(im, wb, maxV, br, out, tmp):
+	"""out = clip(sign(im) * (|im*wb|/maxV)**GAMMA * 255 * br, 0, 255), computed in place."""
+	np.multiply(im, wb, out=out)
+	np.abs(out, out=out)
+	np.divide(out, maxV, out=out)
+	np.power(out, GAMMA, out=out)
+	np.multiply(out, 255, out=out)
+	np.multiply(out, br, out=out)
+	np.sign(im, out=tmp) ## avoid raising negative numbers to power
+	np.multiply(out, tmp, out=out)
+	np.clip(out, 0, 255, out=out)
+	return out
+
+
+def compose(preview, ims, maxRGB, maxIGU, wb, br, out, tmp):
+	"""Fill out[3, ...] with the float RGB preview values for the planes in MODE_PLANES[preview]."""
+	wbR, wbG, wbB, wbI, wbGG, wbU = wb
+	if preview <= 2:
+		tone(ims[0], wbR, maxRGB, br, out[0], tmp)
+		tone(ims[1], wbG, maxRGB, br, out[1], tmp)
+		tone(ims[2], wbB, maxRGB, br, out[2], tmp)
+		if preview == 2: ## saturation image: where saturated turn red, otherwise grey (match green)
+			imSatR, imSatB = ims[3], ims[4]
+			out[0] = out[1]
+			np.subtract(out[1], imSatR, out=out[2])
+			np.clip(out[2], 0, 255, out=out[2])
+			np.multiply(imSatB, 5, out=tmp) ## add blue to show degree of saturation across wavelengths, so magenta will be fully saturated
+			np.add(out[2], tmp, out=out[2])
+			np.clip(out[2], 0, 255, out=out[2])
+			np.subtract(out[1], imSatR, out=out[1])
+			np.clip(out[1], 0, 255, out=out[1])
+	elif preview == 3: ## IGU (extreme spectral range image)
+		tone(ims[0], wbI, maxIGU, br, out[0], tmp)
+		tone(ims[1], wbGG, maxIGU, br, out[1], tmp)
+		tone(ims[2], wbU, maxIGU, br, out[2], tmp)
+	elif preview == 4: ## NDVI
+		imChlA, imChlB = ims
+		np.multiply(imChlB, 255, out=out[2])
+		np.subtract(255, out[2], out=tmp)
+		np.multiply(tmp, 2, out=tmp)
+		np.multiply(tmp, imChlA, out=out[0])
+		np.subtract(1, imChlA, out=out[1])
+		np.multiply(tmp, out[1], out=out[1])
+	return out
@@ -0,0 +1,69 @@
+"""Receptor (cone-catch) images from an hspec cube, for every receptor in sensitivity_data.csv."""
+import numpy as np
+from PIL import Image
+
+# energy per photon = h*c/lambda, multiplied by 1E18 to keep the output in a sensible range for 32-bit floats
+PHOTON_SCALE = 1E18 * 6.626E-34 * 2.998E8
+
+
+class ReceptorEngine:
+	"""Per-bin receptor weights for one unit and boxcar size.
+
+	receptorVals holds one row per receptor, already resampled at the unit's pixel wavelengths. Each
+	weight folds in the bin widths and the photon energy of its boxcar bin, so a catch is one product.
+	"""
+
+	def __init__(self, receptorNames, receptorVals, wavelength, wavelengthBins, boxcarN, order):
+		self.names = list(receptorNames)
+		wavelength = np.asarray(wavelength, dtype=float)
+		pixels = len(wavelength)
+		binIdx = np.arange(pixels) // boxcarN
+		specLength = binIdx[-1] + 1
+		pes = PHOTON_SCALE / (wavelength[::boxcarN] * 1E-9) # photon energy at each bin's first wavelength
+		w = np.asarray(receptorVals, dtype=float).reshape(-1, pixels) * np.asarray(wavelengthBins, dtype=float) # correct for differences in bin-width (area-under curve)
+		binW = np.zeros((specLength, len(self.names)))
+		np.add.at(binW, binIdx, w.T)
+		self.weights = binW / pes[:, None]
+		self.unorder = np.argsort(order) # hspec layout -> boxcar bin order
+
+	def catch(self, hspec, refs=None, receptors=None):
+		"""Receptor images [receptor, tilt, pan], flipped vertically like the preview.
+
+		With refs (the per-bin reflectance factors set with "Set Ref.%") the catch is of reflectance
+		instead of radiance. receptors selects a subset by index.
+		"""
+		le = np.asarray(hspec, dtype=float)
+		if refs is not None:
+			with np.errstate(invalid='ignore'):
+				le = le * 100 * np.asarray(refs, dtype=float)
+		w = self.weights if receptors is None else self.weights[:, list(receptors)]
+		return np.einsum("tpz,zr->rtp", np.nan_to_num(le[..., self.unorder]), w)[:, ::-1]
+
+
+def species(receptorNames):
+	"""Group receptor indices by species (the part of species_receptor before the underscore), in file order."""
+	groups = {}
+	for i, name in enumerate(receptorNames):
+		groups.setdefault(name.split("_")[0], []).append(i)
+	return groups
+
+
+def saveStack(path, images, names):
+	"""Write images as one multi-page 32-bit float TIFF, pages in the order of names."""
+	pages = [Image.fromarray(np.ascontiguousarray(im, dtype=np.float32)) for im in images]
+	pages[0].save(path, save_all=True, append_images=pages[1:], tiffinfo={270: ",".join(names)})
+
+
+def exportReceptors(basePath, receptorEngine, hspec, refs=None, selected=None):
+	"""Write basePath_<species>.tif for each species with a selected receptor; returns the file paths."""
+	names = receptorEngine.names
+	if selected is None:
+		selected = range(len(names))
+	selected = sorted(selected)
+	images = receptorEngine.catch(hspec, refs, selected)
+	paths = []
+	for sp, idx in species([names[i] for i in selected]).items():
+		path = basePath + "_" + sp + ".tif"
+		saveStack(path, images[idx], [names[selected[i]] for i in idx])
+		paths.append(path)
+	return paths
@@ -0,0 +1,301 @@
+"""Scan stream processing shared by the GUI and the command-line tools.
+
+ScanProcessor turns the lines of a scan (the "h," echo, dark/light frames and the closing "x") into
+the radiance cube and the preview planes. It has no GUI dependencies: the GUI mirrors its arrays into
+its own globals, the CLI writes them straight to disk.
+"""
+import math
+import sys
+import time
+import numpy as np
+from PIL import Image
+
+from hosi.engine import LUM_SCALE, srgb
+from hosi.darks import DarkLibrary, DarkModel, libraryPath
+from hosi.journal import RESUME_MARKER
+from hosi.archive import saveArchive
+from hosi.preview import compose
+from hosi.frames import Frame
+from hosi.parser import LineParser
+
+PIXELS = 288 # spectrometer pixels
+
+# preview planes filled in while a scan is processed, [tilt, pan] with the top row = highest tilt
+PLANES = ("imLum", "imR", "imG", "imB", "imSatR", "imSatB", "imI", "imGG", "imU", "imChlA", "imChlB")
+
+
+def degreesToSteps(degrees):
+	"""Convert degrees (-90 to 90) to steps (-512 to 512)"""
+	# Linear conversion: -90° = -512 steps, 90° = 512 steps
+	return int(degrees * 512 / 90)
+
+
+def scanCommand(panLeft, panRight, panRes, tiltBot, tiltTop, tiltRes, maxInt, boxcar, darkRep):
+	"""The "h" command starting a scan: positions in steps, maxInt in ms, darkRep in seconds."""
+	# note addition of 000 to convert max int to microseconds, and darkRep to milliseconds
+	return "h" + str(panLeft) + "," + str(panRight) + "," + str(panRes) + "," + str(tiltBot) + "," + str(tiltTop) + "," + str(tiltRes) + "," + str(maxInt) + "000," + str(boxcar) + "," + str(darkRep) + "000,"
+
+
+def scanPath(label, folder="./scans"):
+	"""Output path (without extension) for a scan finishing or starting now"""
+	t = time.localtime()
+	return folder + "/" + str(t.tm_year) + "-" + str(t.tm_mon) + "-" + str(t.tm_mday) + "_" + time.strftime("%H-%M-%S", t) + "_" + label
+
+
+class ScanProcessor:
+	"""State of the scan being received (or re-loaded) and the per-line processing.
+
+	feed() takes a line or a binary hosi.frames.Frame and returns what it was: "header" (a new cube
+	was allocated), "light", "dark", "done" (end of scan, cube finalised) or None. onPixels(rows, cols)
+	is called with the preview pixels written by each light frame.
+	"""
+
+	def __init__(self, calStore, darkInterp=True):
+		self.calStore = calStore
+		self.darkInterp = darkInterp
+		self.keepRaw = False # keep the raw frames for the binary archive
+		self.darkFolder = None # load/save the dark library per unit & boxcar here (None: don't)
+		self.onPixels = None
+		self.engine = None
+		self.header = [] # fields of the "h," echo line
+		self.unitNumber = 0
+		self.boxcarN = 1
+		self.panStart = self.panStop = self.panRes = 0
+		self.tiltStart = self.tiltStop = self.tiltRes = 0
+		self.panDim = self.tiltDim = 0
+		self.wavelengthBoxcar = np.zeros(0)
+		self.hspec = []
+		self.hspecPan = []
+		self.hspecTilt = []
+		self.maxRGB = 1E-10
+		self.maxIGU = 1E-10
+		self.rawFrames = []
+		self.darkModel = DarkModel()
+		self.parser = LineParser(0) # measurement lines of the current scan, replaced by startScan
+		self.streamPos = 0 # frames processed so far, stands in for time in the dark interpolation (see DarkModel)
+		self.resume = False # next h echo continues the current cube
+		self.progress = ""
+		for name in PLANES:
+			setattr(self, name, [])
+
+	def hasCube(self):
+		return len(self.hspec) > 0 and hasattr(self.hspec, 'shape')
+
+	def feed(self, output):
+		if isinstance(output, Frame):
+			if not self.hasCube():
+				return None
+			if(len(output.counts) != self.parser.length or output.darkLight not in (0, 1, 2)):
+				self.parser.rejected += 1
+				return None
+			if(self.keepRaw):
+				self.rawFrames.append(output.row())
+			row = self.parser.pool.get()
+			np.copyto(row, output.counts)
+			return self.processFrame(output.pan, output.tilt, output.darkLight, output.intTime, output.satN, row)
+		if(output == RESUME_MARKER):
+			self.resume = True
+			return None
+		if(output.startswith('x')):
+			self.finish()
+			return "done"
+		if(output.startswith('h,')):
+			return self.startScan(output.split(','))
+		if not self.hasCube():
+			return None
+		frame = self.parser.parse(output)
+		if frame is None:
+			return None
+		if(self.keepRaw):
+			self.rawFrames.append(self.parser.values.astype(np.int32))
+		return self.processFrame(*frame)
+
+	def startScan(self, row):
+		if(self.resume and self.hasCube()):
+			# resumed scan: keep the existing cube and its pan/tilt geometry
+			self.resume = False
+			self.clearRows(int(row[5]))
+			print("Continuing " + str(self.panDim) + " by " + str(self.tiltDim))
+			return None
+		self.resume = False
+		self.header = [int(float(v)) for v in row[1:] if v.strip()]
+		self.unitNumber = int(row[1])
+		self.panStart, self.panStop, self.panRes = int(row[2]), int(row[3]), int(row[4])
+		self.tiltStart, self.tiltStop, self.tiltRes = int(row[5]), int(row[6]), int(row[7])
+		self.boxcarN = int(row[9])
+		specLength = math.ceil(PIXELS/self.boxcarN)
+		self.engine = self.calStore.engine(self.unitNumber, self.boxcarN)
+		cal = self.calStore.unit(self.unitNumber)
+		self.wavelengthBoxcar = cal.wavelengthBoxcar(self.boxcarN) if cal is not None else np.zeros(specLength)
+		self.rawFrames = []
+		self.darkModel = DarkModel(DarkLibrary(), self.darkInterp)
+		self.parser = LineParser(specLength)
+		self.streamPos = 0
+		if(self.darkFolder is not None):
+			self.darkModel.library.load(libraryPath(self.unitNumber, self.boxcarN, self.darkFolder), specLength)
+			self.darkModel.seed() # recent darks from earlier scans cover the lights before the first dark set
+
+		self.panDim = int(1+(self.panStop-self.panStart)/self.panRes)
+		self.tiltDim = int(1+(self.tiltStop-self.tiltStart)/self.tiltRes)
+		print("Hyperspec " + str(self.panDim) + " by " + str(self.tiltDim))
+		for name in PLANES:
+			setattr(self, name, np.zeros([self.tiltDim, self.panDim]))
+		self.hspec = np.zeros([self.tiltDim, self.panDim, specLength])
+		self.hspecPan = np.zeros([self.panDim])
+		self.hspecTilt = np.zeros([self.tiltDim])
+		self.maxRGB = 1E-10
+		self.maxIGU = 1E-10
+		return "header"
+
+	def clearRows(self, tiltVal):
+		"""Forget the pixels of tilt rows tiltVal and up, which a resumed scan measures again"""
+		first = max(0, int(math.ceil((tiltVal - self.tiltStart) / self.tiltRes)))
+		self.hspec[first:] = 0
+		rows = self.tiltDim - first
+		for name in PLANES:
+			getattr(self, name)[:rows] = 0 # plane row tiltDim-1-t holds tilt row t, so the top rows come first
+		if self.onPixels is not None and rows > 0:
+			y, pan = np.mgrid[:rows, :self.panDim]
+			self.onPixels(y, pan)
+		# light frames still waiting for their dark set would add their finalised radiance back
+		self.darkModel.discard(lambda item: item is not None and item[0] >= first)
+
+	def processFrame(self, panVal, tiltVal, darkLight, intTime, satN, light):
+		"""One measurement; light is a row from self.parser.pool, given back once it is no longer needed"""
+		self.streamPos += 1
+		if(darkLight == 0): # dark measurement
+			self.darkModel.addDark(self.streamPos, intTime, light) # the library keeps a copy
+			self.parser.release(light)
+			return "dark"
+		if(darkLight != 1):
+			self.parser.release(light)
+			return None
+		# light measurement
+		tempTime = intTime
+		pan = int((panVal - self.panStart) / self.panRes)
+		tilt = int((tiltVal - self.tiltStart) / self.tiltRes)
+		item = [tilt, pan, light, tempTime, None] # provisional le is filled in below
+		dark, finalised = self.darkModel.addLight(self.streamPos, tempTime, item) # latest dark frame with the corresponding integration time
+		self.finaliseLights(finalised) # earlier frames now that the dark set after them is complete
+		if dark is None:
+			self.parser.release(light) # not kept pending for a dark set
+			return None
+		if self.engine is None:
+			return None
+		#-----------calculate radiance-----------------
+		self.hspecPan[pan] = panVal
+		self.hspecTilt[tilt] = tiltVal
+		le, bands = self.engine.convert(light, dark, tempTime) # baseInt compensation for minimum microsecond exposure is applied by the engine
+		self.hspec[tilt, pan] += le # this is watts per nanometer (i.e. not controlled for AUC)
+		item[4] = le
+		self.progress = str(round(float(pan + (tilt * self.panDim)) / float(self.tiltDim * self.panDim) * 100.0)) + "% done"
+		self.setPixels(tilt, pan, bands)
+		if satN > 0:
+			self.imSatR[self.tiltDim-1-tilt, pan] = 255
+		self.imSatB[self.tiltDim-1-tilt, pan] = satN
+		if not self.darkModel.interpolate:
+			self.parser.release(light)
+		return "light"
+
+	def setPixels(self, tilt, pan, bands):
+		"""Write the band sums (adjusted for nanometer bin width) of light measurement(s) at cube index tilt, pan into the preview planes"""
+		y = self.tiltDim-1-np.asarray(tilt)
+		cieXval, cieYval, cieZval, chlAval, chlBval, nIRval, nUVval = np.moveaxis(np.asarray(bands), -1, 0)
+		self.imLum[y, pan] = cieYval * LUM_SCALE #luminance: W/(sr*sqm*nm), scaling factor calculated by comparing JETI to HOSI
+
+		# convert to sRGB * set white balance to match computer screen
+		imRt, imGt, imBt = srgb(cieXval, cieYval, cieZval)
+		self.imR[y, pan] = imRt
+		self.imG[y, pan] = imGt
+		self.imB[y, pan] = imBt
+		self.maxRGB = max(self.maxRGB, np.max(imRt), np.max(imGt), np.max(imBt))
+
+		self.imI[y, pan] = nIRval
+		self.imGG[y, pan] = cieYval
+		self.imU[y, pan] = nUVval
+		self.maxIGU = max(self.maxIGU, np.max(nIRval), np.max(cieYval), np.max(nUVval))
+
+		with np.errstate(divide='ignore', invalid='ignore'):
+			self.imChlA[y, pan] = chlAval / (chlAval+nIRval)
+			self.imChlB[y, pan] = chlBval / (chlBval+nIRval)
+		if self.onPixels is not None:
+			self.onPixels(y, pan)
+
+	def finaliseLights(self, finalised):
+		"""Re-calculate light frames with their interpolated darks, replacing the provisional values"""
+		done = finalised
+		finalised = [(item, dark) for item, dark in finalised if item[4] is not None]
+		if len(finalised) > 0:
+			tilt = np.array([item[0] for item, dark in finalised])
+			pan = np.array([item[1] for item, dark in finalised])
+			le, bands = self.engine.convert(np.vstack([item[2] for item, dark in finalised]), np.vstack([dark for item, dark in finalised]), np.array([item[3] for item, dark in finalised]))
+			np.add.at(self.hspec, (tilt, pan), le - np.vstack([item[4] for item, dark in finalised]))
+			self.setPixels(tilt, pan, bands)
+		for item, dark in done:
+			self.parser.release(item[2])
+
+	def finish(self):
+		"""End of the stream: finalise the light frames followed by the closing dark set"""
+		self.finaliseLights(self.darkModel.finish())
+		if self.hasCube():
+			np.nan_to_num(self.hspec, copy=False) # convert NaNs to zeros
+
+	def saveDarks(self):
+		if(self.darkFolder is not None and len(self.darkModel.library) > 0):
+			self.darkModel.library.save(libraryPath(self.unitNumber, self.boxcarN, self.darkFolder))
+
+	#------------------------ outputs ------------------------
+
+	def leValuesBlock(self):
+		"""The "le values" block appended to the CSV after the raw stream"""
+		parts = ["le values\npan,tilt,wavelength\n,"]
+		for w in self.wavelengthBoxcar:
+			parts.append("," + str(int(w)))
+		with np.printoptions(suppress=False, precision=3, threshold=sys.maxsize, linewidth=sys.maxsize):
+			for i in range(0, len(self.hspecTilt)):
+				for j in range(0, len(self.hspecPan)):
+					dataString3 = str(self.hspec[i, j])
+					dataString3 = dataString3.replace(' ', ',')
+					dataString3 = dataString3.replace('[', '')
+					dataString3 = dataString3.replace(']', '')
+					dataString3 = dataString3.replace('0.000e+00', '0')
+					parts.append('\n' + str(self.hspecPan[j]) + ',' + str(self.hspecTilt[i]) + ',' + dataString3)
+		return "".join(parts)
+
+	def srgbImage(self):
+		"""8-bit sRGB image as saved next to each scan"""
+		with np.errstate(invalid='ignore'):
+			nImR = ((self.imR/self.maxRGB)**0.42) * 255
+			nImG = ((self.imG/self.maxRGB)**0.42) * 255
+			nImB = ((self.imB/self.maxRGB)**0.42) * 255
+			return np.dstack((nImR, nImG, nImB)).astype(np.uint8)
+
+	def previewImage(self, preview):
+		"""8-bit preview image in one of the GUI's modes (see hosi.preview), without white balance"""
+		names = {0: ("imR", "imG", "imB"), 2: ("imR", "imG", "imB", "imSatR", "imSatB"), 3: ("imI", "imGG", "imU"), 4: ("imChlA", "imChlB")}[preview]
+		shape = (self.tiltDim, self.panDim)
+		out = np.empty((3,) + shape)
+		with np.errstate(invalid='ignore'):
+			compose(preview, [getattr(self, n) for n in names], self.maxRGB, self.maxIGU, (1.0,)*6, 1.0, out, np.empty(shape))
+		return np.moveaxis(out, 0, -1).astype(np.uint8)
+
+	def save(self, base, rawText, label="", csv=True, archive=True, images=("sRGB",)):
+		"""Write base.csv (raw stream + le values), base.npz and base_<image>.png; returns the paths"""
+		paths = []
+		if csv:
+			file_object = open(base + ".csv", 'a')
+			file_object.write(rawText)
+			file_object.write(self.leValuesBlock())
+			file_object.close()
+			paths.append(base + ".csv")
+		if archive:
+			saveArchive(base + ".npz", self.header, self.hspec, self.hspecPan, self.hspecTilt, self.wavelengthBoxcar, self.rawFrames, label)
+			paths.append(base + ".npz")
+		for name in images:
+			if name == "sRGB":
+				im = self.srgbImage()
+			else:
+				im = self.previewImage({"IGU": 3, "NDVI": 4, "Sat": 2}[name])
+			Image.fromarray(im, "RGB").save(base + "_" + name + ".png")
+			paths.append(base + "_" + name + ".png")
+		return paths
@@ -0,0 +1,99 @@
+"""Readers for saved scan files (./scans/*.csv)."""
+import re
+import numpy as np
+
+
+def iterRawLines(path):
+	"""Yield the raw serial lines of a saved scan, one at a time.
+
+	The file is read lazily, so memory use does not grow with the scan size. Iteration stops at
+	the "le values" block that follows the raw stream.
+	"""
+	with open(path) as f:
+		for line in f:
+			line = line.strip()
+			if line.startswith("le values"):
+				return
+			if line:
+				yield line
+
+
+class LeValues:
+	"""Computed cube read back from the le values block of a saved scan."""
+
+	def __init__(self, header, pan, tilt, wavelengths, cube, satN):
+		self.header = header # fields of the "h," echo line: unit, panStart, panStop, panRes, tiltStart, tiltStop, tiltRes, maxInt, boxcar, darkRepeat
+		self.pan = pan # hspecPan
+		self.tilt = tilt # hspecTilt
+		self.wavelengths = wavelengths # wavelengthBoxcar as saved (rounded to nm)
+		self.cube = cube # hspec [tilt, pan, band]
+		self.satN = satN # saturated band count per light measurement [tilt, pan]
+
+
+def readLeValues(path):
+	"""Parse the le values block of a saved scan straight into a cube.
+
+	Returns None when the file has no complete block (e.g. a raw-only or truncated file), in
+	which case the raw lines have to be re-processed instead.
+	"""
+	with open(path, "rb") as f:
+		data = f.read()
+	start = data.rfind(b"\nle values")
+	if start < 0:
+		return None
+	raw = data[:start]
+
+	header = None
+	for m in re.finditer(rb"^h,([^\r\n]*)", raw, re.M):
+		header = [int(float(v)) for v in m.group(1).split(b",") if v.strip()]
+		break
+	if header is None or len(header) < 9:
+		return None
+	panStart, panStop, panRes, tiltStart, tiltStop, tiltRes = header[1:7]
+	panDim = int(1+(panStop-panStart)/panRes)
+	tiltDim = int(1+(tiltStop-tiltStart)/tiltRes)
+
+	block = data[start+1:].split(b"\n", 3)
+	if len(block) < 4:
+		return None
+	wavelengths = np.array(block[2].replace(b",", b" ").split(), dtype=float)
+	specLength = len(wavelengths)
+	# saved rows come from str(numpy array) with spaces swapped for commas, so fields can be empty
+	try:
+		vals = np.fromstring(block[3].replace(b",", b" ").decode("ascii"), sep=" ")
+	except (ValueError, UnicodeDecodeError):
+		return None
+	if specLength == 0 or vals.size != tiltDim * panDim * (specLength + 2):
+		return None
+	rows = vals.reshape(tiltDim, panDim, specLength + 2)
+
+	satN = np.zeros([tiltDim, panDim])
+	for m in re.finditer(rb"^(-?\d+),(-?\d+),1,-?\d+,(\d+),", raw, re.M):
+		p = int((int(m.group(1)) - panStart) / panRes)
+		t = int((int(m.group(2)) - tiltStart) / tiltRes)
+		if 0 <= p < panDim and 0 <= t < tiltDim:
+			satN[t, p] = int(m.group(3))
+
+	return LeValues(header, rows[0, :, 0].copy(), rows[:, 0, 1].copy(), wavelengths, np.ascontiguousarray(rows[:, :, 2:]), satN)
+
+
+# firmware thins out pan positions at high tilt: from panoSteps[i] on, only every panoSpaces[i]th position is measured
+panoSteps = [913, 959, 988, 1005]
+panoSpaces = [2, 4, 8, 16]
+
+
+def rowPans(header, tiltVal):
+	"""Pan positions the firmware measures on the row at tiltVal (header as in LeValues.header)."""
+	panLeft, panRight, panRes = header[1:4]
+	panShift = 1
+	panStart = 0
+	for i in range(len(panoSteps)):
+		if tiltVal >= panoSteps[i]:
+			panShift = panoSpaces[i]
+			panStart = panoSpaces[i]//2
+	return range(panLeft + panStart*panRes, panRight + 1, panShift*panRes)
+
+
+def rowTilts(header):
+	"""Tilt positions of a scan in the order the firmware visits them."""
+	return range(header[4], header[5] + 1, header[6])
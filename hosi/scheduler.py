@@ -0,0 +1,63 @@
+"""Coalescing redraw scheduler for the GUI."""
+import time
+from collections import deque
+import numpy as np
+
+
+class RenderScheduler:
+	"""Collects redraw requests and runs them as at most one frame per interval.
+
+	Parts of the display (preview, spectrum, status...) are registered with a draw function. Calling
+	markDirty(name) any number of times between frames draws that part once, in registration order,
+	in the next frame. after(ms, fn) is the toolkit's timer, e.g. root.after.
+	"""
+
+	def __init__(self, after, interval=50, historyLength=200):
+		self.after = after
+		self.interval = interval # ms between frames
+		self.handlers = {}
+		self.dirty = set()
+		self.pending = False
+		self.lastFrame = -1E9
+		self.frames = 0
+		self.requests = 0
+		self.frameTimes = deque(maxlen=historyLength) # seconds spent drawing each frame
+		self.partTimes = {}
+
+	def register(self, name, draw):
+		self.handlers[name] = draw
+		self.partTimes[name] = deque(maxlen=self.frameTimes.maxlen)
+
+	def markDirty(self, name):
+		self.requests += 1
+		self.dirty.add(name)
+		if not self.pending:
+			self.pending = True
+			wait = self.interval - (time.perf_counter() - self.lastFrame) * 1000
+			self.after(max(1, int(wait)), self.frame)
+
+	def frame(self):
+		"""Draw every dirty part now (normally called from the timer)."""
+		self.pending = False
+		dirty = self.dirty
+		self.dirty = set()
+		t0 = time.perf_counter()
+		self.lastFrame = t0
+		for name, draw in self.handlers.items():
+			if name in dirty:
+				t1 = time.perf_counter()
+				draw()
+				self.partTimes[name].append(time.perf_counter() - t1)
+		self.frameTimes.append(time.perf_counter() - t0)
+		self.frames += 1
+
+	def stats(self):
+		"""Frame count, requests coalesced and frame times (ms) over the recent history."""
+		out = {"frames": self.frames, "requests": self.requests}
+		if self.frameTimes:
+			ft = np.array(self.frameTimes) * 1000
+			out.update(meanMs=float(ft.mean()), p95Ms=float(np.percentile(ft, 95)), maxMs=float(ft.max()))
+		for name, times in self.partTimes.items():
+			if times:
+				out[name + "Ms"] = float(np.mean(times) * 1000)
+		return out
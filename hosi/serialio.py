@@ -0,0 +1,87 @@
+"""Serial acquisition thread: reads and frames lines into a bounded queue."""
+import queue
+import threading
+import time
+
+from hosi.frames import FrameDecoder
+
+
+class SerialReader(threading.Thread):
+	"""Reads newline-terminated lines from a serial port on its own thread.
+
+	Lines are decoded, stripped and put on a bounded queue that the GUI drains in batches; binary
+	spectrum frames (see hosi.frames) are queued as Frame objects in their place. When the queue is
+	full the reader blocks for up to putTimeout seconds (backpressure) before dropping the line, so
+	a slow consumer is visible in the counters rather than stalling the port indefinitely.
+	"""
+
+	def __init__(self, ser, maxLines=4096, putTimeout=0.5):
+		threading.Thread.__init__(self, name="SerialReader", daemon=True)
+		self.ser = ser
+		self.queue = queue.Queue(maxsize=maxLines)
+		self.putTimeout = putTimeout
+		self.linesRead = 0
+		self.linesDropped = 0
+		self.blockedTime = 0.0 # seconds spent waiting on a full queue
+		self.maxDepth = 0
+		self.error = None
+		self.decoder = FrameDecoder()
+		self._stopEvent = threading.Event()
+
+	def run(self):
+		decoder = self.decoder
+		while not self._stopEvent.is_set():
+			try:
+				data = self.ser.read(getattr(self.ser, "in_waiting", 0) or 1)
+			except Exception as e:
+				self.error = e
+				break
+			if not data:
+				continue
+			for item in decoder.feed(data):
+				self._put(item)
+
+	def _put(self, line):
+		self.linesRead += 1
+		try:
+			self.queue.put_nowait(line)
+		except queue.Full:
+			t = time.monotonic()
+			try:
+				self.queue.put(line, timeout=self.putTimeout)
+			except queue.Full:
+				self.linesDropped += 1
+			self.blockedTime += time.monotonic() - t
+		depth = self.queue.qsize()
+		if depth > self.maxDepth:
+			self.maxDepth = depth
+
+	def drain(self, maxLines=500, budget=None):
+		"""Return up to maxLines queued lines without blocking (stop early after budget seconds)."""
+		lines = []
+		end = None if budget is None else time.monotonic() + budget
+		while len(lines) < maxLines:
+			try:
+				lines.append(self.queue.get_nowait())
+			except queue.Empty:
+				break
+			if end is not None and time.monotonic() > end:
+				break
+		return lines
+
+	def stop(self, timeout=2.0):
+		"""Ask the thread to finish and wait for it (the port itself is left open)."""
+		self._stopEvent.set()
+		if self.is_alive() and threading.current_thread() is not self:
+			self.join(timeout)
+
+	def stats(self):
+		return {
+			"read": self.linesRead,
+			"dropped": self.linesDropped,
+			"queued": self.queue.qsize(),
+			"maxDepth": self.maxDepth,
+			"blocked": round(self.blockedTime, 3),
+			"frames": self.decoder.frames,
+			"badFrames": self.decoder.badFrames,
+		}
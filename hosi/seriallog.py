@@ -0,0 +1,145 @@
+"""Serial traffic logging: levels, a ring buffer of recent traffic and optional background file sinks.
+
+Every line sent or received goes into a fixed-size ring buffer (a deque append of the unformatted
+item), which dump() writes out after a failure. Records for the "hosi.serial" logger are only built
+when it is enabled for their level: commands and text replies at INFO, spectrum lines at DEBUG in
+full or at INFO as a summary (header fields and number of counts). Spectrum records are
+rate-limited to maxPerSecond, the rest are counted (commands and replies always get through), and
+file sinks are written by a QueueListener thread, so logging never blocks acquisition on console or
+disk I/O.
+
+    HOSI_SERIAL_LOG=DEBUG HOSI_SERIAL_LOG_FILE=serial.log python GUI.py
+"""
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+from collections import deque
+
+from hosi.frames import Frame
+from hosi.parser import FRAME_START
+
+logger = logging.getLogger("hosi.serial")
+logger.propagate = False
+FORMAT = "[%(asctime)s] %(levelname)s %(message)s"
+
+
+def isSpectrum(item):
+	return isinstance(item, Frame) or (item[:1] in FRAME_START and item.count(",") > 5)
+
+
+def summary(item):
+	"""Header fields and number of counts of a spectrum line or frame"""
+	if isinstance(item, Frame):
+		fields = (item.pan, item.tilt, item.darkLight, item.intTime, item.satN)
+		n = len(item.counts)
+	else:
+		fields = item.split(",", 5)[:5]
+		n = item.count(",") - 4
+	return "pan=%s tilt=%s darkLight=%s intTime=%s satN=%s n=%d" % (*fields, n)
+
+
+def logPath(folder="./logs"):
+	t = time.localtime()
+	return folder + "/" + str(t.tm_year) + "-" + str(t.tm_mon) + "-" + str(t.tm_mday) + "_" + time.strftime("%H-%M-%S", t) + "_serial.log"
+
+
+class SerialLog:
+	"""Logs serial traffic through the "hosi.serial" logger and keeps the last ringSize items"""
+
+	def __init__(self, ringSize=2000, maxPerSecond=50):
+		self.ring = deque(maxlen=ringSize) # (time, direction, line or Frame)
+		self.maxPerSecond = maxPerSecond # 0: no limit
+		self.windowStart = 0.0
+		self.windowCount = 0
+		self.suppressed = 0 # spectrum records dropped by the rate limit in the current second
+		self.handlers = []
+		self.listeners = []
+
+	def configure(self, level="WARNING", path=None, fileLevel="DEBUG"):
+		"""Console records at level and up; with path, also a background file sink at fileLevel"""
+		self.close()
+		console = logging.StreamHandler(sys.stdout)
+		console.setLevel(level)
+		console.setFormatter(logging.Formatter(FORMAT, "%H:%M:%S"))
+		self._addHandler(console)
+		if path:
+			self.addFile(path, fileLevel)
+		return self
+
+	def addFile(self, path, level="DEBUG"):
+		"""Write records to path from a QueueListener thread"""
+		folder = os.path.dirname(path)
+		if folder:
+			os.makedirs(folder, exist_ok=True)
+		q = queue.SimpleQueue()
+		fileHandler = logging.FileHandler(path)
+		fileHandler.setFormatter(logging.Formatter(FORMAT))
+		listener = logging.handlers.QueueListener(q, fileHandler)
+		listener.start()
+		self.listeners.append(listener)
+		handler = logging.handlers.QueueHandler(q)
+		handler.setLevel(level)
+		self._addHandler(handler)
+
+	def _addHandler(self, handler):
+		logger.addHandler(handler)
+		self.handlers.append(handler)
+		logger.setLevel(min(h.level for h in self.handlers))
+
+	def close(self):
+		if self.suppressed:
+			logger.info("%d spectrum log records suppressed (limit %d/s)", self.suppressed, self.maxPerSecond)
+			self.suppressed = 0
+		for handler in self.handlers:
+			logger.removeHandler(handler)
+		for listener in self.listeners:
+			listener.stop() # flushes the queued records
+			for handler in listener.handlers:
+				handler.close()
+		self.handlers = []
+		self.listeners = []
+		logger.setLevel(logging.WARNING)
+
+	def log(self, item, direction="IN"):
+		"""Record a line (or Frame) sent ("OUT") or received ("IN")"""
+		self.ring.append((time.time(), direction, item))
+		if not logger.isEnabledFor(logging.INFO):
+			return
+		if not isSpectrum(item):
+			logger.info("%s: %s", direction, item)
+		elif self._allow():
+			if logger.isEnabledFor(logging.DEBUG):
+				logger.debug("%s: %s", direction, item)
+			else:
+				logger.info("%s: %s", direction, summary(item))
+
+	def error(self, message):
+		self.ring.append((time.time(), "ERR", message))
+		logger.error("%s", message)
+
+	def _allow(self):
+		now = time.monotonic()
+		if now - self.windowStart >= 1.0:
+			if self.suppressed:
+				logger.info("%d spectrum log records suppressed (limit %d/s)", self.suppressed, self.maxPerSecond)
+			self.windowStart = now
+			self.windowCount = 0
+			self.suppressed = 0
+		if self.maxPerSecond and self.windowCount >= self.maxPerSecond:
+			self.suppressed += 1
+			return False
+		self.windowCount += 1
+		return True
+
+	def dump(self, path):
+		"""Write the ring buffer (full lines) to path, oldest first; returns path"""
+		folder = os.path.dirname(path)
+		if folder:
+			os.makedirs(folder, exist_ok=True)
+		with open(path, "w") as f:
+			for t, direction, item in list(self.ring):
+				f.write(time.strftime("%H:%M:%S", time.localtime(t)) + ("%.3f" % (t % 1))[1:] + " " + direction + ": " + str(item) + "\n")
+		return path
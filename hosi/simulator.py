@@ -0,0 +1,528 @@
+"""Simulated HOSI scanner speaking the HOSI_Scanner.ino serial protocol.
+
+SimulatedScanner is a stand-in for the serial.Serial object (write/read/readline/in_waiting/close)
+backed by a thread that runs a port of the firmware's command loop against a synthetic scene: the
+"h," echo, darkLight 0/1/2 frames with prevIntTime/prevSatN from the same auto-exposure loop,
+boxcar-summed counts, fewer pan positions at high tilt (panoSteps/panoSpaces), the "x" at the end
+of a scan, "stop", "newline" (newline-terminated commands) and "bin" (binary frames, hosi.frames).
+Time is kept on a virtual clock (integration, read-out, motor moves, shutter, serial transmission
+and Serial.readString's 1 s timeout, which terminated mode avoids), so the stream, including when
+the periodic dark measurements fall, is the same at any speed. speed scales the clock to wall time: 1 is real time,
+10 ten times faster and 0 as fast as possible.
+
+    python -m hosi.simulator --speed 20    # serve it on a pty for the GUI or python -m hosi scan
+"""
+import argparse
+import os
+import queue
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+import numpy as np
+
+from hosi.frames import encodeFrame
+
+N_SITES = 288
+SAT_VAL = 998 # over-exposure value
+MIN_INT_TIME = 50 # microseconds
+INT_STEP = 400
+PANO_STEPS = (913, 959, 988, 1005)
+PANO_SPACES = (2, 4, 8, 16)
+READOUT = 0.033 # seconds to clock out and digitise the 288 pixels (analogRead ~112 us each)
+SHUTTER_TIME = 0.1
+MAX_SPEED = 500.0 # stepper steps/s
+ACCELERATION = 5000.0 # steps/s^2
+TERM_TIMEOUT = 0.05 # Serial timeout in terminated-command mode
+
+
+class Scene:
+	"""Synthetic scene: expected counts per microsecond on each sensor pixel for a pan/tilt direction.
+
+	A brightness pattern over pan and tilt (brighter towards the top, with a few soft patches)
+	times a mix of three broad spectra, plus a fixed-pattern dark offset. Deterministic for a seed.
+	"""
+
+	def __init__(self, seed=0, pixels=N_SITES, brightness=0.02):
+		rng = np.random.default_rng(seed)
+		x = np.linspace(0, 1, pixels)
+		self.spectra = np.array([
+			np.exp(-0.5*((x-0.35)/0.12)**2), # green-ish
+			np.exp(-0.5*((x-0.75)/0.15)**2) + 0.3*np.exp(-0.5*((x-0.45)/0.1)**2), # vegetation-like
+			0.3 + 0.7*x*(1-x)*4, # broad
+		])
+		self.patches = rng.uniform(-512, 1024, (6, 2)) # pan, tilt centres
+		self.patchSpectra = rng.integers(0, 3, 6)
+		self.brightness = brightness
+		self.darkOffset = 90 + rng.normal(0, 4, pixels)
+		self.darkCurrent = 2E-5 * (1 + rng.uniform(0, 1, pixels)) # counts per microsecond
+		self.noise = 2.0
+		self.rng = np.random.default_rng(seed + 1)
+
+	def rate(self, pan, tilt):
+		"""Signal counts per microsecond for each pixel, looking at pan, tilt (steps)"""
+		level = 0.3 + 0.7 * min(max(tilt, 0), 1024) / 1024 # sky brighter than ground
+		mix = np.array([0.5, 0.3, 0.2])
+		for (pc, tc), s in zip(self.patches, self.patchSpectra):
+			w = np.exp(-((pan-pc)**2 + (tilt-tc)**2) / (2*150.0**2))
+			mix[s] += 2 * w
+		return self.brightness * level * (mix @ self.spectra) / mix.sum()
+
+	def read(self, rate, intTime):
+		"""One exposure of intTime microseconds (rate None: shutter closed) as analogRead values"""
+		v = self.darkOffset + self.darkCurrent * intTime + self.rng.normal(0, self.noise, len(self.darkOffset))
+		if rate is not None:
+			v = v + rate * intTime
+		return np.clip(np.rint(v), 0, 1023).astype(np.int64)
+
+
+def moveTime(steps):
+	"""Seconds for an AccelStepper move of steps with the firmware's speed and acceleration"""
+	steps = abs(steps)
+	if steps == 0:
+		return 0.0
+	if steps < MAX_SPEED**2 / ACCELERATION: # never reaches full speed
+		return 2 * (steps / ACCELERATION) ** 0.5
+	return steps / MAX_SPEED + MAX_SPEED / ACCELERATION
+
+
+def toFloat(s):
+	"""Arduino String.toFloat(): leading number, 0 if there is none"""
+	s = s.strip()
+	for end in range(len(s), 0, -1):
+		try:
+			return float(s[:end])
+		except ValueError:
+			pass
+	return 0.0
+
+
+class _Stopped(Exception):
+	pass
+
+
+class SimulatedScanner:
+	"""Serial-port stand-in running the scanner firmware against a synthetic scene.
+
+	Until "newline" switches to newline-terminated commands, each write() is one command, as the GUI
+	sends them (the firmware reads a command with Serial.readString, i.e. everything arriving before
+	its 1 s timeout, which is also charged to the clock). After it, commands are split on newlines and
+	read without waiting.
+	"""
+
+	def __init__(self, unitNumber=9, speed=1.0, seed=0, scene=None, timeout=1.0, readTimeout=1.0, baudrate=115200):
+		self.unitNumber = unitNumber
+		self.speed = speed
+		self.scene = scene if scene is not None else Scene(seed)
+		self.timeout = timeout # for read()/readline(), like serial.Serial
+		self.readTimeout = readTimeout # Serial.readString timeout in the firmware
+		self.baudrate = baudrate
+		self.clock = 0.0 # virtual seconds since power-up
+		self.framesSent = 0
+		self.bytesSent = 0
+		self.commandsDone = 0
+		self.is_open = True
+		self.port = "sim://"
+
+		# firmware state
+		self.hyperVals = [0] * 9
+		self.panVal = 0
+		self.tiltVal = 0
+		self.panPos = 0
+		self.tiltPos = 0
+		self.darkLight = 1
+		self.manIntTime = 0
+		self.maxIntTime = 3000000
+		self.boxcar = 1
+		self.darkRepeat = 30000
+		self.shutterOpen = False
+		self.stopRequested = False
+		self.termMode = False
+		self.binMode = False
+
+		self._commands = queue.Queue()
+		self._pending = "" # received, not yet read by the firmware
+		self._out = bytearray()
+		self._outLock = threading.Condition()
+		self._closed = threading.Event()
+		self._wall0 = time.monotonic()
+		self._clock0 = 0.0
+		self._thread = threading.Thread(target=self._run, name="SimulatedScanner", daemon=True)
+		self._thread.start()
+
+	@classmethod
+	def fromUrl(cls, url, **kwargs):
+		"""SimulatedScanner for a "sim://?speed=10&seed=1&unit=9" port name"""
+		query = parse_qs(urlparse(url).query)
+		for key, name, conv in (("speed", "speed", float), ("seed", "seed", int), ("unit", "unitNumber", int)):
+			if key in query:
+				kwargs[name] = conv(query[key][-1])
+		scanner = cls(**kwargs)
+		scanner.port = url
+		return scanner
+
+	#------------------------ serial.Serial interface ------------------------
+
+	def write(self, data):
+		if not self.is_open:
+			raise OSError("simulated port is closed")
+		if isinstance(data, str):
+			data = data.encode()
+		self._commands.put(bytes(data).decode("ascii", "replace"))
+		return len(data)
+
+	@property
+	def in_waiting(self):
+		with self._outLock:
+			return len(self._out)
+
+	def read(self, size=1):
+		end = None if self.timeout is None else time.monotonic() + self.timeout
+		with self._outLock:
+			while len(self._out) < size and self.is_open:
+				wait = None if end is None else end - time.monotonic()
+				if wait is not None and wait <= 0:
+					break
+				self._outLock.wait(wait)
+			data = bytes(self._out[:size])
+			del self._out[:size]
+		return data
+
+	def readline(self):
+		end = None if self.timeout is None else time.monotonic() + self.timeout
+		with self._outLock:
+			while b"\n" not in self._out and self.is_open:
+				wait = None if end is None else end - time.monotonic()
+				if wait is not None and wait <= 0:
+					break
+				self._outLock.wait(wait)
+			n = self._out.find(b"\n") + 1 or len(self._out)
+			data = bytes(self._out[:n])
+			del self._out[:n]
+		return data
+
+	def reset_input_buffer(self):
+		with self._outLock:
+			self._out.clear()
+
+	def flush(self):
+		pass
+
+	def close(self):
+		self.is_open = False
+		self._closed.set()
+		self._commands.put(None)
+		with self._outLock:
+			self._outLock.notify_all()
+
+	#------------------------ virtual time ------------------------
+
+	def _wait(self, seconds):
+		"""Advance the virtual clock, sleeping so it keeps pace with speed x wall time"""
+		self.clock += seconds
+		if self.speed and self.speed > 0:
+			delay = self._wall0 + (self.clock - self._clock0) / self.speed - time.monotonic()
+			if delay > 0.002:
+				self._closed.wait(delay)
+		if self._closed.is_set():
+			raise _Stopped()
+
+	def millis(self):
+		return int(self.clock * 1000)
+
+	def _print(self, text):
+		self._write(text.encode())
+
+	def _write(self, data):
+		self._wait(len(data) * 10 / self.baudrate) # 8N1
+		with self._outLock:
+			self._out += data
+			self._outLock.notify_all()
+		self.bytesSent += len(data)
+
+	def _println(self, text):
+		self._print(text + "\r\n")
+
+	def _readCommand(self, block=True):
+		"""The firmware's readCommand(): the next command, or None if nothing has arrived (block=False).
+
+		Without terminated mode, Serial.readString returns what arrived (one write) after its timeout;
+		in terminated mode a line is returned as soon as its newline is in, a partial line after
+		TERM_TIMEOUT.
+		"""
+		while not (self.termMode and "\n" in self._pending):
+			if self._pending and not self.termMode:
+				break
+			try:
+				chunk = self._commands.get(block=block and not self._pending)
+			except queue.Empty:
+				if not self._pending:
+					return None
+				self._wait(TERM_TIMEOUT) # unterminated line
+				break
+			if chunk is None:
+				raise _Stopped()
+			if not self._pending:
+				# the first command after idling restarts the wall clock reference
+				self._wall0 = time.monotonic()
+				self._clock0 = self.clock
+			self._pending += chunk
+		if self.termMode and "\n" in self._pending:
+			cmd, self._pending = self._pending.split("\n", 1)
+		else:
+			cmd, self._pending = self._pending, ""
+			if not self.termMode:
+				self._wait(self.readTimeout) # readString returns after its timeout
+		return cmd.strip()
+
+	def _available(self):
+		"""Serial.available() + readCommand() during a scan: returns the command or None"""
+		return self._readCommand(block=False)
+
+	#------------------------ firmware ------------------------
+
+	def _run(self):
+		try:
+			while True:
+				self._command(self._readCommand())
+				self.commandsDone += 1
+				self._wait(0.01) # delay(10) at the end of loop()
+		except _Stopped:
+			pass
+
+	def _pan(self, pv):
+		self._wait(moveTime(pv - self.panPos))
+		self.panPos = pv
+
+	def _tilt(self, tv):
+		self._wait(moveTime(tv - self.tiltPos))
+		self.tiltPos = tv
+
+	def _shutter(self, isOpen):
+		self.shutterOpen = isOpen
+		self._wait(SHUTTER_TIME)
+
+	def _readSpectrometer(self, intTime, rate):
+		self._wait(intTime / 1E6 + READOUT)
+		counts = self.scene.read(rate if self.shutterOpen else None, intTime)
+		return counts, int(np.count_nonzero(counts > SAT_VAL))
+
+	def _radianceMeasure(self):
+		rate = self.scene.rate(self.panPos, self.tiltPos)
+		if self.manIntTime == 0: # auto exposure, with the firmware's two alternating buffers
+			buf = [np.zeros(N_SITES, dtype=np.int64)] * 2
+			loc = 0
+			buf[loc], satN = self._readSpectrometer(MIN_INT_TIME, rate)
+			prevSatN = satN
+			prevIntTime = MIN_INT_TIME
+			intTime = INT_STEP
+			if satN > 0:
+				loc ^= 1
+			while satN == 0 and intTime < self.maxIntTime:
+				loc ^= 1
+				buf[loc], satN = self._readSpectrometer(intTime, rate)
+				if satN == 0:
+					prevSatN = satN
+					prevIntTime = intTime
+					intTime *= 2
+			loc ^= 1 # back to the last unsaturated read (or the one before, if maxIntTime ended the loop)
+			data = buf[loc]
+		else:
+			data, satN = self._readSpectrometer(self.manIntTime, rate)
+			prevSatN = satN
+			prevIntTime = self.manIntTime
+		sums = np.add.reduceat(data, np.arange(0, N_SITES, self.boxcar)) if self.boxcar > 1 else data
+		if self.binMode:
+			self._write(encodeFrame(self.panVal, self.tiltVal, self.darkLight, prevIntTime, prevSatN, sums, wide=self.boxcar * 1023 > 0xFFFF))
+		else:
+			self._print(str(self.panVal) + "," + str(self.tiltVal) + "," + str(self.darkLight) + "," + str(prevIntTime) + "," + str(prevSatN) + "," + ",".join(map(str, sums.tolist())) + "\n")
+		self.framesSent += 1
+		self._wait(0.001)
+
+	def _darkMeasure(self):
+		self._shutter(False)
+		self.darkLight = 0
+		tl = self.manIntTime
+		self.manIntTime = MIN_INT_TIME
+		self._radianceMeasure()
+		i = INT_STEP
+		while i <= self.maxIntTime:
+			if self.stopRequested:
+				return
+			self.manIntTime = i
+			self._radianceMeasure()
+			i *= 2
+		self._shutter(True)
+		self.manIntTime = tl
+		self.darkLight = 1
+
+	def _startMeasure(self):
+		self._pan(0)
+		self._shutter(False)
+		self.darkLight = 2
+		self._radianceMeasure()
+		self._shutter(True)
+		self.darkLight = 1
+
+	def _checkStop(self):
+		cmd = self._available()
+		if cmd == "stop":
+			self.stopRequested = True
+		return self.stopRequested
+
+	def _command(self, arg):
+		if arg == "stop":
+			self.stopRequested = True
+			self._println("Stop requested")
+			self._pan(0)
+			self._tilt(0)
+			self._shutter(False)
+			self._println("Returned to origin and closed shutter")
+		elif arg == "newline":
+			self.termMode = True
+			self._println("newline:1")
+		elif arg == "bin":
+			self.binMode = True
+			self._println("bin:1")
+		elif arg == "ascii":
+			self.binMode = False
+			self._println("bin:0")
+		elif arg.startswith("t"):
+			self.manIntTime = min(int(toFloat(arg.replace("t", ""))), self.maxIntTime)
+			self._println("int. time: " + str(self.manIntTime) + "ms")
+		elif arg.startswith("p"):
+			v = int(toFloat(arg.replace("p", "")))
+			self._pan(v)
+			self._println("pan: " + str(v))
+		elif arg.startswith("l"):
+			v = int(toFloat(arg.replace("l", "")))
+			self._tilt(v)
+			self._println("tilt: " + str(v))
+		elif arg.startswith("s"): # (this also catches "shutter", as in the firmware)
+			angle = int(toFloat(arg.replace("s", "")))
+			if 0 <= angle <= 180:
+				self._println("Servo angle set to: " + str(angle))
+				self._wait(SHUTTER_TIME)
+			else:
+				self._println("Invalid servo angle (0-180)")
+		elif arg.startswith("r"):
+			self._radianceMeasure()
+		elif arg == "open":
+			self._shutter(True)
+		elif arg == "close":
+			self._shutter(False)
+		elif arg.startswith("h"):
+			self._hyperspec(arg.replace("h", ""))
+
+	def _hyperspec(self, arg):
+		self.stopRequested = False
+		fields = arg.split(",")
+		for i, v in enumerate(fields[:-1][:9]): # only values followed by a comma are read
+			self.hyperVals[i] = int(toFloat(v))
+		hv = self.hyperVals
+		self._println("h," + str(self.unitNumber) + "," + ",".join(str(v) for v in hv))
+		self._wait(0.005)
+		self.maxIntTime = hv[6]
+		self.boxcar = max(hv[7], 1)
+		self.darkRepeat = hv[8]
+		self._pan(0)
+
+		self._startMeasure()
+		self._darkMeasure()
+		eDR = self.millis() + self.darkRepeat
+		self.tiltVal = hv[3]
+		while self.tiltVal <= hv[4] and hv[5] > 0:
+			if self.stopRequested or self._checkStop():
+				break
+			if self.millis() >= eDR:
+				self._darkMeasure()
+				if self.stopRequested:
+					break
+				eDR = self.millis() + self.darkRepeat
+			self._tilt(self.tiltVal)
+			self._pan(hv[0] - 10) # overshoot to take up the gear backlash
+
+			panShift = 1
+			panStart = 0
+			for steps, spaces in zip(PANO_STEPS, PANO_SPACES): # fewer pan positions at high elevations
+				if self.tiltVal >= steps:
+					panShift = spaces
+					panStart = spaces // 2
+			panShift *= hv[2]
+			panStart *= hv[2]
+			self.panVal = hv[0] + panStart
+			while self.panVal <= hv[1] and panShift > 0:
+				if self.stopRequested or self._checkStop():
+					break
+				self._pan(self.panVal)
+				self._radianceMeasure()
+				self.panVal += panShift
+			self.tiltVal += hv[5]
+
+		if not self.stopRequested:
+			self._pan(0)
+			self._darkMeasure()
+		self._pan(0)
+		self._tilt(0)
+		self._shutter(False)
+		self._println("x")
+		self._println("Scan completed - returned to origin and closed shutter")
+
+
+def servePty(scanner, commandGap=0.05):
+	"""Expose scanner on a new pseudo-terminal; returns the path to open as a serial port.
+
+	Bytes ending in a newline (terminated commands) are passed on straight away, newline included;
+	other bytes are grouped into one command when nothing follows for commandGap seconds (the
+	firmware's readString timeout, shortened). Runs until the scanner is closed.
+	"""
+	import pty
+	import select
+	import tty
+	master, slave = pty.openpty()
+	tty.setraw(slave)
+	path = os.ttyname(slave)
+
+	def fromHost():
+		buf = b""
+		while scanner.is_open:
+			ready, _, _ = select.select([master], [], [], commandGap)
+			if ready:
+				buf += os.read(master, 4096)
+				if buf.endswith(b"\n"):
+					scanner.write(buf)
+					buf = b""
+			elif buf:
+				scanner.write(buf)
+				buf = b""
+
+	def toHost():
+		while scanner.is_open:
+			n = max(scanner.in_waiting, 1)
+			data = scanner.read(n)
+			if data:
+				os.write(master, data)
+
+	for fn in (fromHost, toHost):
+		threading.Thread(target=fn, daemon=True).start()
+	scanner._ptySlave = slave # keep the slave end open while serving
+	return path
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(prog="python -m hosi.simulator", description="Simulated HOSI scanner on a pseudo-terminal")
+	parser.add_argument("--speed", type=float, default=1.0, help="virtual seconds per wall second (0: unthrottled)")
+	parser.add_argument("--seed", type=int, default=0)
+	parser.add_argument("--unit", type=int, default=9)
+	args = parser.parse_args(argv)
+	scanner = SimulatedScanner(args.unit, args.speed, args.seed)
+	print("Simulated scanner on " + servePty(scanner), flush=True)
+	try:
+		while True:
+			time.sleep(1)
+	except KeyboardInterrupt:
+		scanner.close()
+	return 0
+
+
+if __name__ == "__main__":
+	raise SystemExit(main())
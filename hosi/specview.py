@@ -0,0 +1,132 @@
+"""Spectrum plot with persistent artists, redrawn by blitting."""
+import numpy as np
+
+
+class SpectrumView:
+	"""The spectrum panel: one line, a peak marker and a click crosshair, all created once.
+
+	Everything that changes from pixel to pixel (line, peak, title, legend, crosshair) is an animated
+	artist drawn over a cached background of the axes, grid and tick labels. The background is only
+	re-rendered when the axis limits or labels change, or the canvas is resized. Up to trailLength
+	previous spectra can be kept as a fading overlay (used when hovering over the preview).
+	"""
+
+	def __init__(self, ax, canvas, trailLength=0):
+		self.ax = ax
+		self.canvas = canvas
+		self.figure = canvas.figure
+		self.bg = None
+		self.full = True # background needs re-rendering
+		self.reflectance = None
+		self.wavelengths = np.zeros(0)
+		self.le = np.zeros(0)
+
+		ax.set_xlabel('Wavelength (nm)', fontsize=10, fontweight='bold')
+		ax.grid(True, alpha=0.3, linestyle='-', linewidth=0.5)
+		ax.grid(True, alpha=0.2, linestyle='--', linewidth=0.3, which='minor')
+		ax.tick_params(axis='both', which='major', labelsize=9)
+		ax.tick_params(axis='both', which='minor', labelsize=8)
+		ax.minorticks_on()
+
+		self.trail = [ax.plot([], [], 'b-', linewidth=1, alpha=0.5*(1-i/trailLength), animated=True)[0] for i in range(trailLength)]
+		self.line, = ax.plot([], [], 'b-', linewidth=2, label='Spectrum', animated=True)
+		self.peak, = ax.plot([], [], 'ro', markersize=8, label='Peak', animated=True)
+		self.legend = ax.legend(loc='upper right', fontsize=9)
+		self.legend.set_animated(True)
+		self.title = ax.set_title('', fontsize=11, fontweight='bold')
+		self.title.set_animated(True)
+		self.vline = ax.axvline(x=0, color='red', linestyle='--', alpha=0.8, linewidth=2, animated=True, visible=False)
+		self.label = ax.annotate('', xy=(0, 0), xytext=(10, 10), textcoords='offset points',
+			bbox=dict(boxstyle='round,pad=0.3', facecolor='yellow', alpha=0.8),
+			fontsize=9, fontweight='bold', animated=True, visible=False)
+		self.animated = self.trail + [self.line, self.peak, self.vline, self.label, self.legend, self.title]
+		for a in self.animated: # nothing to show until a pixel is selected
+			a.set_visible(False)
+		canvas.mpl_connect('draw_event', self._onDraw)
+
+	def show(self, wavelengths, le, reflectance, x, y, trail=False):
+		"""Display spectrum le (radiance, or reflectance in %) of preview pixel x, y.
+
+		With trail the spectra shown before move down the overlay, otherwise the overlay is cleared.
+		"""
+		wavelengths = np.asarray(wavelengths, dtype=float)
+		le = np.asarray(le, dtype=float)
+		self.wavelengths = wavelengths
+		self.le = le
+		sameMode = reflectance == self.reflectance
+		if not sameMode:
+			self.reflectance = reflectance
+			if reflectance:
+				self.ax.set_ylabel('Reflectance (%)', fontsize=10, fontweight='bold')
+			else:
+				self.ax.set_ylabel('Radiance (W·sr⁻¹·m⁻²·nm⁻¹)', fontsize=10, fontweight='bold')
+			self.full = True
+		kind = 'Reflectance' if reflectance else 'Radiance'
+		self.title.set_text(f'{kind} Spectrum - Pixel ({x}, {y})')
+
+		if trail and self.trail and sameMode and self.line.get_visible():
+			for newer, older in zip(self.trail[-2::-1], self.trail[:0:-1]):
+				older.set_data(*newer.get_data())
+				older.set_visible(newer.get_visible())
+			self.trail[0].set_data(*self.line.get_data())
+			self.trail[0].set_visible(True)
+		else:
+			for a in self.trail:
+				a.set_visible(False)
+
+		# Find peak wavelength
+		peakIdx = np.argmax(le)
+		self.line.set_data(wavelengths, le)
+		self.peak.set_data([wavelengths[peakIdx]], [le[peakIdx]])
+		self.legend.get_texts()[1].set_text(f'Peak: {wavelengths[peakIdx]:.1f} nm')
+		for a in (self.line, self.peak, self.legend, self.title):
+			a.set_visible(True)
+		self.vline.set_visible(False) # the crosshair belongs to the previous pixel
+		self.label.set_visible(False)
+		self._setLimits(wavelengths, le)
+
+	def _setLimits(self, wavelengths, le):
+		xlim = (float(wavelengths.min()), float(wavelengths.max()))
+		if xlim[1] <= xlim[0]:
+			xlim = (xlim[0] - 1, xlim[0] + 1)
+		top = np.nanmax(le) if len(le) else 0
+		top = top * 1.05 if np.isfinite(top) and top > 0 else 1.0
+		curTop = self.ax.get_ylim()[1]
+		# keep the y axis while the spectrum fits and uses a fair part of it, so most pixels only need a blit
+		if self.ax.get_xlim() != xlim or top > curTop or top < curTop * 0.5 or self.ax.get_ylim()[0] != 0:
+			self.ax.set_xlim(*xlim)
+			self.ax.set_ylim(0, top)
+			self.full = True
+
+	def crosshair(self, wavelength):
+		"""Mark the band closest to wavelength; returns (band wavelength, value) or None."""
+		if len(self.le) == 0 or wavelength is None:
+			return None
+		idx = np.argmin(np.abs(self.wavelengths - wavelength))
+		wl = self.wavelengths[idx]
+		val = self.le[idx]
+		self.vline.set_xdata([wl, wl])
+		self.label.xy = (wl, val)
+		self.label.set_text(f'{wl:.1f} nm\n{val:.3e}')
+		self.vline.set_visible(True)
+		self.label.set_visible(True)
+		return wl, val
+
+	def draw(self):
+		"""Redraw: blit the animated artists, or re-render everything if the background changed."""
+		if self.full or self.bg is None:
+			self.full = False
+			self.canvas.draw() # draw_event re-captures the background
+			return
+		self.canvas.restore_region(self.bg)
+		self._drawAnimated()
+		self.canvas.blit(self.figure.bbox)
+
+	def _onDraw(self, event):
+		self.bg = self.canvas.copy_from_bbox(self.figure.bbox)
+		self._drawAnimated()
+
+	def _drawAnimated(self):
+		for a in self.animated:
+			if a.get_visible():
+				self.figure.draw_artist(a)
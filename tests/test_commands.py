@@ -0,0 +1,99 @@
+"""Command futures: replies out of order, timeouts and cancelling"""
+import pytest
+
+from hosi.commands import CommandChannel, CommandError, CommandTimeout, negotiate
+from hosi.simulator import SimulatedScanner
+
+
+class LegacyScanner(SimulatedScanner):
+	"""Firmware from before terminated commands: the request matches no command"""
+
+	def _command(self, arg):
+		if arg != "newline":
+			super()._command(arg)
+
+
+class FakeClock:
+	def __init__(self):
+		self.now = 0.0
+
+	def __call__(self):
+		return self.now
+
+
+def test_replies_out_of_order():
+	written = []
+	commands = CommandChannel(lambda text: written.append(text) or True, maxInFlight=2)
+	futures = [commands.send("l100", "tilt:", 5), commands.send("p200", "pan:", 5)]
+	assert written == ["l100", "p200"]
+	calls = []
+	def done(future):
+		# as GUI.jog: only read the results once every future is done, so nothing blocks
+		if all(f.done() for f in futures):
+			calls.append([f.exception() for f in futures])
+	for f in futures:
+		f.add_done_callback(done)
+	assert commands.feed("pan: 200")
+	assert futures[1].result(0) == "pan: 200" and not futures[0].done()
+	assert calls == []
+	assert commands.feed("tilt: 100")
+	assert calls == [[None, None]]
+	assert commands.pending() == 0
+
+
+def test_queued_until_answered():
+	written = []
+	commands = CommandChannel(lambda text: written.append(text) or True)
+	first = commands.send("l100", "tilt:", 5)
+	second = commands.send("p200", "pan:", 5)
+	assert written == ["l100"]
+	assert not commands.feed("pan: 200") # not in flight yet
+	assert commands.feed("tilt: 100")
+	assert written == ["l100", "p200"]
+	assert commands.feed("pan: 200")
+	assert first.result(0) == "tilt: 100" and second.result(0) == "pan: 200"
+
+
+def test_timeout_and_cancel():
+	clock = FakeClock()
+	written = []
+	commands = CommandChannel(lambda text: written.append(text) or True, clock=clock)
+	first = commands.send("l100", "tilt:", 1)
+	second = commands.send("p200", "pan:", 1)
+	clock.now = 0.5
+	commands.poll()
+	assert not first.done()
+	clock.now = 1.5
+	commands.poll()
+	assert isinstance(first.exception(0), CommandTimeout)
+	assert written == ["l100", "p200"] and commands.timeouts == 1
+	third = commands.send("s", "shutter:", 1)
+	commands.cancelAll("port closed")
+	for f in (second, third):
+		with pytest.raises(CommandError):
+			f.result(0)
+	assert commands.pending() == 0
+
+
+def test_failed_write():
+	commands = CommandChannel(lambda text: False)
+	with pytest.raises(CommandError):
+		commands.send("l100", "tilt:", 1).result(0)
+	assert commands.pending() == 0
+
+
+def test_negotiate():
+	sim = SimulatedScanner(speed=0, timeout=1)
+	assert negotiate(sim)
+	assert sim.termMode
+	sim.close()
+
+
+def test_negotiate_legacy_firmware():
+	sim = LegacyScanner(speed=0, timeout=0.1)
+	sim.write(b"t5000")
+	assert sim.readline().strip() == b"int. time: 5000ms"
+	assert not negotiate(sim, timeout=0.5)
+	assert not sim.termMode
+	assert sim.manIntTime == 5000 # the request must not reach the "t" command
+	sim.close()
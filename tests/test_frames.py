@@ -0,0 +1,78 @@
+"""Binary frames: decoding a mixed stream and resynchronising after corrupt frames"""
+import numpy as np
+
+from hosi.commands import negotiate
+from hosi.frames import HEADER, MAX_COUNTS, Frame, FrameDecoder, encodeFrame
+from hosi.scan import scanCommand
+from hosi.simulator import SimulatedScanner
+
+
+def frame(pan, n=20, wide=None):
+	return encodeFrame(pan, 100, 1, 2000, 0, np.arange(n) * 37, wide)
+
+
+def decodeSplit(data, size=1):
+	"""Decode data fed size bytes at a time"""
+	decoder = FrameDecoder()
+	out = []
+	for i in range(0, len(data), size):
+		out += decoder.feed(data[i:i+size])
+	return decoder, out
+
+
+def test_mixed_stream():
+	data = b"bin:1\n" + frame(-5) + b"tilt: 100\r\n" + frame(7, wide=True) + b"x\n"
+	for size in (1, 7, len(data)):
+		decoder, out = decodeSplit(data, size)
+		assert [o if isinstance(o, str) else o.pan for o in out] == ["bin:1", -5, "tilt: 100", 7, "x"]
+		assert str(out[1]) == "-5,100,1,2000,0," + ",".join(str(i * 37) for i in range(20))
+		assert np.array_equal(out[3].counts, np.arange(20) * 37)
+		assert decoder.frames == 2 and decoder.badFrames == 0
+
+
+def test_crc_failure():
+	bad = bytearray(frame(1))
+	bad[HEADER.size + 3] ^= 0x10
+	decoder, out = decodeSplit(bytes(bad) + frame(2) + b"tilt: 100\n")
+	assert [o if isinstance(o, str) else o.pan for o in out] == [2, "tilt: 100"]
+	assert decoder.badFrames == 1
+
+
+def test_lost_byte():
+	short = frame(1)
+	short = short[:HEADER.size + 5] + short[HEADER.size + 6:]
+	for data in (short + frame(2) + b"x\n", short + b"x\n" + frame(2)):
+		decoder, out = decodeSplit(data)
+		assert [o.pan for o in out if isinstance(o, Frame)] == [2]
+		assert decoder.badFrames == 1
+		assert all(o == "x" for o in out if isinstance(o, str)) # no garbage from the broken frame
+
+
+def test_bad_header():
+	bad = bytearray(frame(1))
+	bad[HEADER.size - 2:HEADER.size] = (MAX_COUNTS + 1).to_bytes(2, "little")
+	decoder, out = decodeSplit(bytes(bad) + b"\n" + frame(2) + b"x\n")
+	assert [o if isinstance(o, str) else o.pan for o in out] == [2, "x"]
+	assert decoder.badFrames == 1
+
+
+def scanItems(binary):
+	sim = SimulatedScanner(speed=0, seed=3, timeout=5)
+	assert negotiate(sim)
+	if binary:
+		sim.write(b"bin\n")
+		assert sim.readline().strip() == b"bin:1"
+	sim.write((scanCommand(-2, 2, 1, 100, 101, 1, 2000, 2, 120) + "\n").encode())
+	decoder = FrameDecoder()
+	items = []
+	while "x" not in items:
+		items += decoder.feed(sim.read(64))
+	sim.close()
+	return [str(item) for item in items[:items.index("x")]], decoder
+
+
+def test_simulated_scan():
+	lines, _ = scanItems(False)
+	items, decoder = scanItems(True)
+	assert items == lines
+	assert decoder.frames > 0 and decoder.badFrames == 0
@@ -0,0 +1,71 @@
+"""Parsing measurement lines: malformed lines are rejected, rows come from the pool"""
+import numpy as np
+
+from hosi.parser import FRAME_START, LineParser
+from hosi.scan import scanCommand
+from hosi.simulator import SimulatedScanner
+
+LENGTH = 8
+
+
+def line(*fields, counts=None):
+	counts = list(range(10, 10 + LENGTH)) if counts is None else counts
+	return ",".join(str(v) for v in list(fields) + counts)
+
+
+def test_parse():
+	parser = LineParser(LENGTH)
+	pan, tilt, darkLight, intTime, satN, row = parser.parse(line(-20, 100, 1, 2000, 3))
+	assert (pan, tilt, darkLight, intTime, satN) == (-20, 100, 1, 2000, 3)
+	assert row.dtype == np.float64 and np.array_equal(row, np.arange(10, 10 + LENGTH))
+	assert parser.values.tolist()[:5] == [-20, 100, 1, 2000, 3]
+	assert parser.parsed == 1 and parser.rejected == 0
+
+
+def test_text_lines_ignored():
+	parser = LineParser(LENGTH)
+	for text in ("", "h,9,-2,2,1,100,103,1,2000,2,120", "x", "tilt: 100", "int. time: 0ms"):
+		assert parser.parse(text) is None
+	assert parser.parsed == 0 and parser.rejected == 0
+
+
+def test_malformed_lines_rejected():
+	parser = LineParser(LENGTH)
+	bad = [
+		line(1, 100, 1, 2000, 0, counts=list(range(LENGTH - 1))), # a count short
+		line(1, 100, 1, 2000, 0, counts=list(range(LENGTH + 1))), # one too many
+		line(1, 100, 1, "2000.5", 0), # non-integer header field
+		line(1, 100, 1, 2000, 0, counts=[5] * (LENGTH - 1) + ["4a"]), # garbled count
+		line(1, 100, 1, 2000, 0, counts=[5] * (LENGTH - 2) + ["", 5]), # empty value
+		line(1, 100, 3, 2000, 0), # unknown darkLight
+	]
+	for text in bad:
+		assert parser.parse(text) is None, text
+	assert parser.rejected == len(bad) and parser.parsed == 0
+
+
+def test_rows_reused():
+	parser = LineParser(LENGTH)
+	first = parser.parse(line(0, 100, 1, 2000, 0))[5]
+	parser.release(first)
+	parser.release(first[1:]) # views are not pooled
+	second = parser.parse(line(1, 100, 1, 2000, 0))[5]
+	assert second is first and parser.pool.allocated == 1
+	third = parser.parse(line(2, 100, 1, 2000, 0))[5]
+	assert third is not first and parser.pool.allocated == 2
+
+
+def test_simulated_scan():
+	sim = SimulatedScanner(speed=0, seed=1, timeout=5)
+	sim.write(scanCommand(-2, 2, 1, 100, 101, 1, 2000, 2, 120))
+	lines = []
+	while not lines or lines[-1] != "x":
+		lines.append(sim.readline().decode().strip())
+	sim.close()
+	frames = [l for l in lines if l and l[0] in FRAME_START]
+	parser = LineParser(frames[0].count(",") - 4)
+	for l in lines:
+		result = parser.parse(l)
+		if result is not None:
+			parser.release(result[5])
+	assert parser.parsed == len(frames) > 0 and parser.rejected == 0
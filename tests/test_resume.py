@@ -0,0 +1,57 @@
+"""Resuming a scan that was cut off part way through a tilt row"""
+import os
+import numpy as np
+
+from hosi.calibration import CalibrationStore
+from hosi.scan import ScanProcessor, scanCommand
+from hosi.simulator import SimulatedScanner
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def scanLines(store, tiltStart):
+	sim = SimulatedScanner(unitNumber=store.units()[0], speed=0, seed=0, timeout=5)
+	sim.write(scanCommand(-2, 2, 1, tiltStart, 103, 1, 2000, 2, 120))
+	lines = []
+	while True:
+		line = sim.readline().decode().strip()
+		if line:
+			lines.append(line)
+		if line == "x":
+			break
+	sim.close()
+	return lines
+
+
+def test_resume_partial_row():
+	store = CalibrationStore(os.path.join(ROOT, "calibration_data.txt"), os.path.join(ROOT, "sensitivity_data.csv"))
+	full = ScanProcessor(store)
+	for line in scanLines(store, 100):
+		full.feed(line)
+
+	# interrupted after the first two lights of tilt row 101
+	scan = ScanProcessor(store)
+	lights = 0
+	for line in scanLines(store, 100):
+		row = line.split(",")
+		if len(row) > 5 and row[1] == "101" and row[2] == "1":
+			if lights == 2:
+				break
+			lights += 1
+		scan.feed(line)
+	scan.finish()
+	assert np.count_nonzero(scan.hspec[1].sum(axis=1)) == 2
+
+	scan.resume = True
+	dirty = np.zeros(scan.imLum.shape, bool)
+	def onPixels(rows, cols):
+		dirty[rows, cols] = True
+	scan.onPixels = onPixels
+	lines = scanLines(store, 101)
+	scan.feed(lines[0]) # the "h," echo clears tilt rows 101 and up
+	assert dirty[:scan.tiltDim-1].all() and not dirty[scan.tiltDim-1:].any() # plane rows are top row first
+	for line in lines[1:]:
+		scan.feed(line)
+	ratio = scan.hspec.sum(axis=2) / full.hspec.sum(axis=2)
+	assert np.allclose(ratio, 1, rtol=0.1), ratio
+	assert np.allclose(scan.imLum, full.imLum, rtol=0.1)